@@ -1,11 +1,14 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Union
 import os
 from .utils import get_chunk_hash
 from .logger import GFSLogger
 
 logger = GFSLogger.get_logger('chunk')
 
+# Anything supporting the buffer protocol; hashing, sending and writing never copy it
+Buffer = Union[bytes, bytearray, memoryview]
+
 @dataclass
 class ChunkMetadata:
     chunk_id: str
@@ -15,16 +18,23 @@ class ChunkMetadata:
     locations: List[str]  # List of chunk server addresses
 
 class Chunk:
-    def __init__(self, data: bytes, file_path: str, chunk_index: int):
+    """A chunk of a file; data may be any buffer, typically a zero-copy memoryview slice."""
+
+    def __init__(self, data: Buffer, file_path: str, chunk_index: int, chunk_id: Optional[str] = None):
         logger.debug(f"Creating new chunk for file {file_path}, index {chunk_index}")
         self.data = data
-        self.chunk_id = get_chunk_hash(data)
+        self.chunk_id = chunk_id or Chunk.make_chunk_id(data)
         self.file_path = file_path
         self.chunk_index = chunk_index
         self.size = len(data)
         self.locations = []
         logger.debug(f"Created chunk {self.chunk_id} with size {self.size} bytes")
 
+    @staticmethod
+    def make_chunk_id(data: Buffer) -> str:
+        """Derive a chunk's ID from its content, without building a Chunk."""
+        return get_chunk_hash(data)
+
     def save_to_disk(self, chunk_dir: str):
         """Save chunk data to disk."""
         logger.debug(f"Saving chunk {self.chunk_id} to directory {chunk_dir}")
@@ -1,63 +1,126 @@
+import logging
+import queue
+import select
+import selectors
 import socket
 import threading
 import time
 import os
-import toml
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
-from .utils import send_message, receive_message, find_free_port
+from .utils import (send_message, send_batch, encode_message, send_file_message, receive_message,
+                    connect_tuned, tune_socket,
+                    BufferPool, ConnectionPool, RearmQueue, new_transaction_id, payload_crc32c, payload_intact,
+                    load_config, CONTROL_SOCKET_BUFFER_SIZE)
 from .chunk import Chunk
 from .logger import GFSLogger
 import argparse
 import json
 import shutil
 
+try:
+    import liburing
+except ImportError:
+    liburing = None  # io_uring reactor unavailable; the selectors one is always there
+
+# Submission queue depth for the io_uring reactor
+IO_URING_ENTRIES = 256
+
+# Seconds a prepared chunk waits for its commit or rollback before it is discarded
+PREPARED_CHUNK_TTL = 60.0
+
 class ChunkServer:
     def __init__(self, config_path: str, server_id: str = None, space_limit_mb: int = 1024, x: float = 0, y: float = 0):
         self.logger = GFSLogger.get_logger('chunk_server')
         self.transaction_logger = GFSLogger.get_transaction_logger('chunk_server')
-        self.logger.info(f"Initializing Chunk Server with config from {config_path}")
+        self.logger.info("Initializing Chunk Server with config from %s", config_path)
         
-        self.config = toml.load(config_path)
-        self.logger.debug(f"Loaded configuration: {self.config}")
+        self.config = load_config(config_path)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Loaded configuration: %s", self.config)
         
         self.server_id = server_id or f"chunk_server_{int(time.time())}"
         self.space_limit = space_limit_mb * 1024 * 1024  # Convert MB to bytes
-        self.logger.info(f"Space limit set to {space_limit_mb}MB")
+        self.logger.info("Space limit set to %sMB", space_limit_mb)
         
-        self.port = self._get_or_create_port()
         self.host = "localhost"
+        # A server without a saved port binds port 0 and keeps whatever the
+        # kernel picked, so there is no probe socket and no window for
+        # another process to take the port before we bind it
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tune_socket(self.server_socket)
+        self.server_socket.bind((self.host, self._saved_port()))
+        self.port = self.server_socket.getsockname()[1]
+        self.server_socket.listen(5)
+        self.logger.info("Server socket initialized and listening")
         self.address = f"{self.host}:{self.port}"
-        self.logger.info(f"Chunk server {self.server_id} will run on {self.address}")
+        self.logger.info("Chunk server %s will run on %s", self.server_id, self.address)
         
         self.master_host = self.config['master']['host']
         self.master_port = self.config['master']['port']
-        self.logger.debug(f"Master server address: {self.master_host}:{self.master_port}")
+        self.logger.debug("Master server address: %s:%s", self.master_host, self.master_port)
         
         self.data_dir = os.path.join(
             self.config['chunk_server']['data_dir'],
             self.server_id
         )
         os.makedirs(self.data_dir, exist_ok=True)
-        self.logger.info(f"Created data directory at {self.data_dir}")
+        self.logger.info("Created data directory at %s", self.data_dir)
         
         self._save_server_info()
         
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        self.logger.info("Server socket initialized and listening")
+        # Heartbeats are timer driven and skipped while other master RPCs,
+        # which piggyback the same information, keep the master up to date
+        self.heartbeat_interval = self.config['chunk_server']['heartbeat_interval']
+        self._last_master_contact = 0.0
+        self._space_info_cache = (0.0, None)
+        self._hb_timer = None
+
+        # Chunk renames are group-committed: a committer thread applies every
+        # rename queued within a short window and covers them with one
+        # directory fsync instead of one per chunk
+        self._commit_queue = queue.Queue()
+        self._commit_window = 0.005
+        threading.Thread(target=self._group_commit_loop, daemon=True).start()
+
+        # Prepared-but-uncommitted chunk files and their expiry deadlines by
+        # (chunk_id, transaction_id)
+        self._prepared: Dict[tuple, tuple] = {}
+        self._prepared_lock = threading.Lock()
         
-        self.heartbeat_thread = threading.Thread(target=self._send_heartbeat)
-        self.heartbeat_thread.daemon = True
-        self.logger.debug("Created heartbeat thread")
+        # Incoming chunk payloads land in recycled buffers instead of fresh allocations
+        self._buffers = BufferPool(
+            self.config['master']['chunk_size'],
+            self.config['chunk_server'].get('buffer_pool_size', 4)
+        )
+        # Sockets to other chunk servers for re-replication copies, reused per source
+        self._pool = ConnectionPool(self.config['chunk_server'].get('conn_pool_max_size', 4))
         
         self.location = (x, y)  # Store coordinates
-        self.logger.info(f"Chunk server location set to ({x}, {y})")
+        self.logger.info("Chunk server location set to (%s, %s)", x, y)
+
+        # Command dispatch table, built once instead of walking an elif chain per message
+        self._handlers = {
+            'store_chunk': self._handle_store_chunk,
+            'store_chunk_batch': self._handle_store_chunk_batch,
+            'retrieve_chunk': self._handle_retrieve_chunk,
+            'replicate_from': self._handle_replicate_from,
+            'delete_chunk': self._handle_delete_chunk,
+            'replicate_chunk': self._handle_store_chunk,
+            'prepare_chunk': self._handle_prepare_chunk,
+            'commit_chunk': self._handle_commit_chunk,
+            'rollback_chunk': self._handle_rollback_chunk,
+            'append_chunk': self._handle_append_chunk,
+            'prepare_append': self._handle_prepare_append,
+            'commit_append': self._handle_commit_append,
+            'rollback_append': self._handle_rollback_append,
+            'check_space': self._handle_check_space,
+        }
         
         self._register_with_master()
 
-    def _get_or_create_port(self) -> int:
-        """Get existing port for server ID or create new one."""
+    def _saved_port(self) -> int:
+        """Get the port saved for this server ID, or 0 to have the kernel assign one."""
         server_info_file = os.path.join(
             self.config['chunk_server']['data_dir'],
             'server_info.json'
@@ -68,12 +131,11 @@ class ChunkServer:
                 server_info = json.load(f)
                 if self.server_id in server_info:
                     port = server_info[self.server_id]['port']
-                    self.logger.info(f"Found existing port {port} for server {self.server_id}")
+                    self.logger.info("Found existing port %s for server %s", port, self.server_id)
                     return port
         
-        port = find_free_port()
-        self.logger.info(f"Assigned new port {port} for server {self.server_id}")
-        return port
+        self.logger.info("No saved port for server %s, binding a free one", self.server_id)
+        return 0
 
     def _save_server_info(self):
         """Save server information to disk."""
@@ -103,102 +165,129 @@ class ChunkServer:
         with open(server_info_file, 'w') as f:
             json.dump(server_info, f, indent=2)
         
-        self.logger.debug(f"Saved server info for {self.server_id}")
+        self.logger.debug("Saved server info for %s", self.server_id)
 
     def _register_with_master(self):
         """Register this chunk server with the master."""
         self.logger.info("Attempting to register with master server")
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.master_host, self.master_port))
-                self.logger.debug("Connected to master server")
+            with self._connect_to_master() as s:
                 send_message(s, {
                     'command': 'register_chunk_server',
                     'address': self.address,
                     'location': self.location  # Add location info
                 })
-            self.logger.info(f"Successfully registered with master at {self.master_host}:{self.master_port}")
+                self._note_master_activity()
+            self.logger.info("Successfully registered with master at %s:%s", self.master_host, self.master_port)
         except Exception as e:
-            self.logger.error(f"Failed to register with master: {e}", exc_info=True)
+            self.logger.error("Failed to register with master: %s", e, exc_info=True)
             exit(1)
 
-    def _send_heartbeat(self):
-        """Send periodic heartbeats to master."""
-        self.logger.info("Starting heartbeat loop")
-        while True:
+    def _space_info(self) -> Dict:
+        """Space usage for heartbeats, recomputed at most once per interval."""
+        computed_at, info = self._space_info_cache
+        now = time.monotonic()
+        if info is None or now - computed_at >= self.heartbeat_interval:
+            info = {
+                'total': self.space_limit,
+                'used': self.space_limit - self.get_available_space()
+            }
+            self._space_info_cache = (now, info)
+        return info
+
+    def _with_heartbeat(self, message: Dict) -> Dict:
+        """Piggyback heartbeat information on an outgoing master RPC."""
+        message['heartbeat'] = {
+            'address': self.address,
+            'location': self.location,
+            'space_info': self._space_info()
+        }
+        self._note_master_activity()
+        return message
+
+    def _note_master_activity(self):
+        """Record that the master just heard from us."""
+        self._last_master_contact = time.monotonic()
+
+    def _schedule_heartbeat(self, delay: float):
+        """Arm the heartbeat timer to fire after delay seconds."""
+        self._hb_timer = threading.Timer(delay, self._heartbeat_tick)
+        self._hb_timer.daemon = True
+        self._hb_timer.start()
+
+    def _heartbeat_tick(self):
+        """Send a heartbeat only if the master hasn't heard from us for a full interval."""
+        self._expire_prepared()
+        idle = time.monotonic() - self._last_master_contact
+        if idle >= self.heartbeat_interval:
+            self._send_heartbeat()
+            idle = 0.0
+        self._schedule_heartbeat(self.heartbeat_interval - idle)
+
+    def _expire_prepared(self):
+        """Discard prepared chunks whose commit or rollback never arrived."""
+        now = time.monotonic()
+        with self._prepared_lock:
+            expired = [key for key, (_, deadline) in self._prepared.items() if deadline <= now]
+            stale = [(key, self._prepared.pop(key)[0]) for key in expired]
+        for (chunk_id, transaction_id), temp in stale:
             try:
-                # Calculate space usage
-                used_space = 0
-                for dirpath, dirnames, filenames in os.walk(self.data_dir):
-                    for f in filenames:
-                        fp = os.path.join(dirpath, f)
-                        used_space += os.path.getsize(fp)
-
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.connect((self.master_host, self.master_port))
-                    send_message(s, {
-                        'command': 'heartbeat',
-                        'address': self.address,
-                        'location': self.location,
-                        'space_info': {
-                            'total': self.space_limit,
-                            'used': used_space
-                        }
-                    })
-                    self.logger.debug(f"Sent heartbeat to master")
-            except Exception as e:
-                self.logger.error(f"Failed to send heartbeat: {e}")
-            
-            time.sleep(self.config['chunk_server']['heartbeat_interval'])
+                self._discard_temp_file(temp)
+            except OSError as e:
+                self.logger.error("Failed to discard expired chunk %s: %s", chunk_id, e)
+            self.logger.warning("Discarded prepared chunk %s of transaction %s: no commit within %ss",
+                                chunk_id, transaction_id, PREPARED_CHUNK_TTL)
 
-    def handle_client(self, client_socket: socket.socket, address: str):
-        """Handle client connections."""
-        self.logger.info(f"New client connection from {address}")
+    def _send_heartbeat(self):
+        """Send a single heartbeat to master."""
         try:
-            while True:
-                message = receive_message(client_socket)
-                if not message:
-                    self.logger.debug(f"Client {address} disconnected")
-                    break
+            with self._connect_to_master() as s:
+                send_message(s, {
+                    'command': 'heartbeat',
+                    'address': self.address,
+                    'location': self.location,
+                    'space_info': self._space_info()
+                })
+                self._note_master_activity()
+                self.logger.debug("Sent heartbeat to master")
+        except Exception as e:
+            self.logger.error("Failed to send heartbeat: %s", e)
+
+    def _serve_request(self, client_socket: socket.socket, address: str):
+        """Read and handle one request, then hand the connection back to the reactor."""
+        message = None
+        try:
+            message = receive_message(client_socket, self._buffers)
+            if not message:
+                self.logger.debug("Client %s disconnected", address)
+                client_socket.close()
+                return
 
-                command = message.get('command')
-                self.logger.debug(f"Received command '{command}' from {address}")
-
-                if command == 'store_chunk':
-                    self._handle_store_chunk(client_socket, message)
-                elif command == 'retrieve_chunk':
-                    self._handle_retrieve_chunk(client_socket, message)
-                elif command == 'delete_chunk':
-                    self._handle_delete_chunk(client_socket, message)
-                elif command == 'replicate_chunk':
-                    self._handle_store_chunk(client_socket, message)
-                elif command == 'prepare_chunk':
-                    self._handle_prepare_chunk(client_socket, message)
-                elif command == 'commit_chunk':
-                    self._handle_commit_chunk(client_socket, message)
-                elif command == 'rollback_chunk':
-                    self._handle_rollback_chunk(client_socket, message)
-                elif command == 'append_chunk':
-                    self._handle_append_chunk(client_socket, message)
-                elif command == 'prepare_append':
-                    self._handle_prepare_append(client_socket, message)
-                elif command == 'commit_append':
-                    self._handle_commit_append(client_socket, message)
-                elif command == 'rollback_append':
-                    self._handle_rollback_append(client_socket, message)
-                elif command == 'check_space':
-                    self._handle_check_space(client_socket, message)
+            command = message.get('command')
+            self.logger.debug("Received command '%s' from %s", command, address)
 
+            handler = self._handlers.get(command)
+            if handler:
+                handler(client_socket, message)
+            else:
+                self.logger.warning("Unknown command '%s' from %s", command, address)
         except Exception as e:
-            self.logger.error(f"Error handling client {address}: {e}", exc_info=True)
-        finally:
+            self.logger.error("Error handling client %s: %s", address, e, exc_info=True)
             client_socket.close()
-            self.logger.debug(f"Closed connection with {address}")
+            self.logger.debug("Closed connection with %s", address)
+            return
+        finally:
+            # Handlers are done with the payload once they return
+            if message:
+                self._buffers.release(message.get('data'))
+
+        # Re-arm from the reactor thread; the selector isn't safe to mutate from workers
+        self._rearmed.put(client_socket, address)
 
     def _replicate_chunk(self, chunk_data: bytes, file_path: str, chunk_index: int, 
                         replica_servers: List[str], current_replica: int = 0):
         """Handle chunk replication to other servers in the chain."""
-        self.logger.info(f"Handling replication {current_replica + 1} of chunk for {file_path}")
+        self.logger.info("Handling replication %s of chunk for %s", current_replica + 1, file_path)
         
         # Store the chunk locally first
         chunk = Chunk(chunk_data, file_path, chunk_index)
@@ -209,24 +298,213 @@ class ChunkServer:
             next_server = replica_servers[current_replica + 1]
             try:
                 with self._connect_to_chunk_server(next_server) as next_sock:
-                    self.logger.debug(f"Forwarding chunk to next server: {next_server}")
-                    send_message(next_sock, {
+                    self.logger.debug("Forwarding chunk to next server: %s", next_server)
+                    send_file_message(next_sock, {
                         'command': 'replicate_chunk',
-                        'data': chunk_data,
                         'file_path': file_path,
                         'chunk_index': chunk_index,
                         'replica_servers': replica_servers,
                         'current_replica': current_replica + 1
-                    })
+                    }, os.path.join(self.data_dir, chunk.chunk_id))
                     response = receive_message(next_sock)
                     if response['status'] != 'ok':
                         raise Exception(f"Replication failed at {next_server}")
             except Exception as e:
-                self.logger.error(f"Failed to forward chunk to {next_server}: {e}")
+                self.logger.error("Failed to forward chunk to %s: %s", next_server, e)
                 raise
         
         return chunk.chunk_id
 
+    def _write_chunk_file(self, path: str, data: bytes):
+        """Write chunk data to a new temporary file, pre-allocating its full extent first.
+
+        On Linux the file is an unnamed O_TMPFILE inode in the data directory
+        and the open fd is returned; committing links it into place, and if it
+        is never committed the kernel reclaims it, so a crash leaves no temp
+        files behind. Elsewhere the data goes to path, which is returned.
+        """
+        try:
+            fd = os.open(self.data_dir, os.O_TMPFILE | os.O_WRONLY, 0o644)
+            temp = fd
+        except (AttributeError, OSError):
+            # No O_TMPFILE support (platform or filesystem): use a named file
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            temp = path
+        try:
+            if data and hasattr(os, 'posix_fallocate'):
+                try:
+                    # One contiguous allocation instead of block-by-block extension
+                    os.posix_fallocate(fd, 0, len(data))
+                except OSError:
+                    pass  # Filesystem doesn't support fallocate, plain writes still work
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        except BaseException:
+            os.close(fd)
+            self._discard_temp_file(path if temp == fd else temp)
+            raise
+        if temp != fd:
+            os.close(fd)
+        return temp
+
+    @staticmethod
+    def _temp_file_path(temp) -> str:
+        """A path that opens a temporary file from _write_chunk_file, named or not."""
+        return f"/proc/self/fd/{temp}" if isinstance(temp, int) else temp
+
+    @staticmethod
+    def _discard_temp_file(temp):
+        """Drop an uncommitted temporary file: close an unnamed one, remove a named one."""
+        if isinstance(temp, int):
+            os.close(temp)
+        elif os.path.exists(temp):
+            os.remove(temp)
+
+    def _commit_chunk_file(self, temp, chunk_path: str, on_done=None):
+        """Make prepared data durable and atomically move it into place.
+
+        temp is a named temporary path or an unnamed file's fd from
+        _write_chunk_file, which is linked in rather than renamed.
+
+        Without on_done this blocks until the rename is durable. With it, the
+        call returns once the rename is queued and the committer thread calls
+        on_done(error) after the batch's directory fsync (error is None on success).
+        """
+        fd = temp if isinstance(temp, int) else os.open(temp, os.O_RDONLY)
+        try:
+            # Data only; the group directory sync covers the metadata we care about
+            getattr(os, 'fdatasync', os.fsync)(fd)
+        except BaseException:
+            if fd is temp:
+                os.close(fd)  # The committer would have closed it
+            raise
+        finally:
+            if fd is not temp:
+                os.close(fd)
+
+        if on_done is not None:
+            self._commit_queue.put((temp, chunk_path, on_done))
+            return
+
+        done, errors = threading.Event(), []
+
+        def finish(error):
+            if error is not None:
+                errors.append(error)
+            done.set()
+
+        self._commit_queue.put((temp, chunk_path, finish))
+        done.wait()
+        if errors:
+            raise errors[0]
+
+    def _link_into_place(self, fd: int, name: str, dir_fd: int):
+        """Link an unnamed file in as name under dir_fd, replacing any file already there."""
+        try:
+            os.link(self._temp_file_path(fd), name, dst_dir_fd=dir_fd)
+            return
+        except FileExistsError:
+            pass
+        # link() won't overwrite, and the old file may hold other bytes (appends
+        # rewrite chunks under the same ID), so link to a fresh name and rename
+        # that over it, as the named-file path does
+        temp_name = f"{name}.{new_transaction_id()}.temp"
+        os.link(self._temp_file_path(fd), temp_name, dst_dir_fd=dir_fd)
+        try:
+            os.replace(temp_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        except BaseException:
+            os.unlink(temp_name, dir_fd=dir_fd)
+            raise
+
+    def _group_commit_loop(self):
+        """Apply queued renames in batches, each made durable by a single directory fsync."""
+        while True:
+            batch = [self._commit_queue.get()]
+            deadline = time.monotonic() + self._commit_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._commit_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            errors = [None] * len(batch)
+            dir_fd = None
+            for i, (temp, chunk_path, _) in enumerate(batch):
+                try:
+                    if isinstance(temp, int):
+                        try:
+                            # A dir fd makes os.link use linkat(AT_SYMLINK_FOLLOW),
+                            # which resolves the /proc fd link to the unnamed inode
+                            if dir_fd is None:
+                                dir_fd = os.open(self.data_dir, os.O_RDONLY)
+                            self._link_into_place(temp, os.path.basename(chunk_path), dir_fd)
+                        finally:
+                            os.close(temp)
+                    else:
+                        os.replace(temp, chunk_path)
+                except OSError as e:
+                    errors[i] = e
+            if dir_fd is not None:
+                os.close(dir_fd)
+            try:
+                self._sync_data_dir()
+            except OSError as e:
+                errors = [error or e for error in errors]
+            self.logger.debug("Group-committed %s chunk renames", len(batch))
+
+            for (_, _, on_done), error in zip(batch, errors):
+                try:
+                    on_done(error)
+                except Exception as e:
+                    self.logger.error("Commit callback failed: %s", e, exc_info=True)
+
+    def _send_reply(self, client_socket: socket.socket, message: Dict):
+        """Send a reply from outside the request's worker, dropping the connection on failure."""
+        try:
+            send_message(client_socket, message)
+        except OSError as e:
+            self.logger.warning("Failed to send deferred reply: %s", e)
+            # The reactor still owns the socket; shutting it down makes it see EOF
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _sync_data_dir(self):
+        """Flush the data directory so renames inside it survive a crash."""
+        dir_fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _checksum_path(self, chunk_id: str) -> str:
+        return os.path.join(self.data_dir, f"{chunk_id}.crc32c")
+
+    def _save_checksum(self, chunk_id: str, checksum: int):
+        """Record a chunk's CRC32C next to it so reads can verify the bytes on disk."""
+        with open(self._checksum_path(chunk_id), 'w') as f:
+            f.write(f"{checksum:08x}")
+
+    def _load_checksum(self, chunk_id: str) -> Optional[int]:
+        """Return a chunk's recorded CRC32C, or None if it has none (e.g. after an append)."""
+        try:
+            with open(self._checksum_path(chunk_id)) as f:
+                return int(f.read(), 16)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _drop_checksum(self, chunk_id: str):
+        try:
+            os.remove(self._checksum_path(chunk_id))
+        except FileNotFoundError:
+            pass
+
     def get_available_space(self) -> int:
         """Get available space in bytes."""
         total_size = 0
@@ -242,28 +520,101 @@ class ChunkServer:
 
     def _handle_store_chunk(self, client_socket: socket.socket, message: Dict):
         """Handle storing a chunk and initiating replication if needed."""
+        send_message(client_socket, self._store_chunk(message))
+
+    def _handle_store_chunk_batch(self, client_socket: socket.socket, message: Dict):
+        """Handle storing several chunks sent to this primary in one request."""
+        statuses = []
+        # Chunks stored as primary are reported to the master together at the end
+        reports = []
+        payload = memoryview(message['data']) if 'data' in message else None
+        offset = 0
+        for item in message['items']:
+            item.setdefault('client_id', message.get('client_id'))
+            if payload is not None and 'data' not in item:
+                # Bodies arrive back to back in the frame payload
+                item['data'] = payload[offset:offset + item['size']]
+                offset += item['size']
+            statuses.append(self._store_chunk(item, reports))
+        if reports:
+            self._report_stored_chunks(reports, statuses)
+        send_message(client_socket, {'status': 'ok', 'statuses': statuses})
+
+    def _report_stored_chunks(self, reports: List[Dict], statuses: List[Dict]):
+        """Send the master a batch's update_file_metadata requests pipelined over one connection.
+
+        Chunks the master rejects, or never answers for because it can't be
+        reached, are dropped and their statuses turned to errors, so the
+        client stores them elsewhere. Chunks it acknowledged stay.
+        """
+        frames = [encode_message(self._with_heartbeat(reports[0]))]
+        frames += [encode_message(report) for report in reports[1:]]
+        answered = 0
+        acknowledged = set()
+        failed: Dict[str, str] = {}  # chunk_id -> error message
+        try:
+            with self._connect_to_master() as master_sock:
+                send_batch(master_sock, frames)
+                for report in reports:
+                    response = receive_message(master_sock)
+                    if response is None:
+                        raise ConnectionError("Master closed the connection mid-batch")
+                    answered += 1
+                    if response.get('status') == 'ok':
+                        acknowledged.add(report['chunk_id'])
+                    else:
+                        self.logger.warning("Master rejected metadata for chunk %s: %s",
+                                            report['chunk_id'], response.get('message'))
+                        failed[report['chunk_id']] = response.get('message') or 'metadata_rejected'
+        except Exception as e:
+            self.logger.error("Failed to report %s stored chunks to master: %s",
+                              len(reports) - answered, e)
+            for report in reports[answered:]:
+                failed[report['chunk_id']] = str(e)
+        for status in statuses:
+            message = failed.get(status.get('chunk_id'))
+            if message is not None:
+                status.update({'status': 'error', 'message': message})
+        for chunk_id in failed.keys() - acknowledged:
+            self._drop_checksum(chunk_id)
+            path = os.path.join(self.data_dir, chunk_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _store_chunk(self, message: Dict, reports: Optional[List[Dict]] = None) -> Dict:
+        """Store a chunk, replicating it if we are the primary, and return the reply.
+
+        With a reports list, the primary's update_file_metadata request is
+        appended to it for the caller to send instead of going out at once.
+        """
         try:
             chunk_id = message.get('chunk_id')
             file_path = message['file_path']
             data = message['data']
             chunk_size = len(data)
-            transaction_id = str(int(time.time() * 1000))
+            transaction_id = new_transaction_id()
+
+            if not payload_intact(message):
+                self.logger.warning("CRC32C mismatch on chunk %s of %s", chunk_id, file_path)
+                return {'status': 'error', 'message': 'crc32c_mismatch'}
+            checksum = message.get('crc32c')
+            if checksum is None:
+                checksum = payload_crc32c(data)
 
             # Check available space
             if not self.can_store_chunk(chunk_size):
-                self.logger.warning(f"Not enough space to store chunk {chunk_id} ({chunk_size} bytes)")
-                send_message(client_socket, {
+                self.logger.warning("Not enough space to store chunk %s (%s bytes)", chunk_id, chunk_size)
+                return {
                     'status': 'error',
                     'message': 'insufficient_space',
                     'available_space': self.get_available_space()
-                })
-                return
+                }
 
             GFSLogger.log_transaction(
                 self.transaction_logger,
                 transaction_id,
                 "START",
-                f"Primary received store request for chunk {chunk_id} of {file_path}"
+                "Primary received store request for chunk %s of %s", chunk_id, file_path
             )
 
             # If this is the primary server (not part of replication chain)
@@ -271,11 +622,11 @@ class ChunkServer:
                 # Get replica locations from master
                 available_replicas = []  # Initialize the list here
                 with self._connect_to_master() as master_sock:
-                    send_message(master_sock, {
+                    send_message(master_sock, self._with_heartbeat({
                         'command': 'get_replica_locations',
                         'excluding': self.address,
                         'client_id': message.get('client_id')
-                    })
+                    }))
                     response = receive_message(master_sock)
                     potential_replicas = response['locations']
                     
@@ -291,74 +642,81 @@ class ChunkServer:
                                 if response['status'] == 'ok':
                                     available_replicas.append(replica)
                         except Exception as e:
-                            self.logger.warning(f"Failed to check space on {replica}: {e}")
+                            self.logger.warning("Failed to check space on %s: %s", replica, e)
 
                 GFSLogger.log_transaction(
                     self.transaction_logger,
                     transaction_id,
                     "PREPARE",
-                    f"Found {len(available_replicas)} replicas with sufficient space"
+                    "Found %s replicas with sufficient space", len(available_replicas)
                 )
 
                 # Store locally first
                 temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
                 final_path = os.path.join(self.data_dir, chunk_id)
+                temp = None
                 
                 try:
                     # Write to temporary file first
-                    with open(temp_path, 'wb') as f:
-                        f.write(data)
+                    temp = self._write_chunk_file(temp_path, data)
                     
-                    # Try to replicate to available servers
+                    # Try to replicate to available servers, streaming from the temp file
                     successful_replicas = []
                     for replica in available_replicas:
                         try:
                             with self._connect_to_chunk_server(replica) as replica_sock:
-                                send_message(replica_sock, {
+                                send_file_message(replica_sock, {
                                     'command': 'store_chunk',
-                                    'data': data,
                                     'file_path': file_path,
                                     'chunk_id': chunk_id,
+                                    'crc32c': checksum,
                                     'replica_servers': True
-                                })
+                                }, self._temp_file_path(temp))
                                 response = receive_message(replica_sock)
                                 if response['status'] == 'ok':
                                     successful_replicas.append(replica)
                         except Exception as e:
-                            self.logger.error(f"Failed to replicate to {replica}: {e}")
+                            self.logger.error("Failed to replicate to %s: %s", replica, e)
 
                     # Move temporary file to final location
-                    os.replace(temp_path, final_path)
+                    self._save_checksum(chunk_id, checksum)
+                    committing, temp = temp, None
+                    self._commit_chunk_file(committing, final_path)
                     successful_servers = [self.address] + successful_replicas
 
                     # Update master with actual locations and pending replication status
-                    with self._connect_to_master() as master_sock:
-                        send_message(master_sock, {
-                            'command': 'update_file_metadata',
-                            'file_path': file_path,
-                            'chunk_id': chunk_id,
-                            'chunk_locations': successful_servers,
-                            'chunk_size': chunk_size,
-                            'pending_replication': True
-                        })
+                    report = {
+                        'command': 'update_file_metadata',
+                        'file_path': file_path,
+                        'chunk_id': chunk_id,
+                        'chunk_index': message.get('chunk_index'),
+                        'chunk_locations': successful_servers,
+                        'chunk_size': chunk_size,
+                        'pending_replication': True
+                    }
+                    if reports is not None:
+                        reports.append(report)
+                    else:
+                        with self._connect_to_master() as master_sock:
+                            send_message(master_sock, self._with_heartbeat(report))
 
                     GFSLogger.log_transaction(
                         self.transaction_logger,
                         transaction_id,
                         "SUCCESS",
-                        f"Stored chunk with {len(successful_replicas)} replicas"
+                        "Stored chunk with %s replicas", len(successful_replicas)
                     )
 
-                    send_message(client_socket, {
+                    return {
                         'status': 'ok',
                         'chunk_id': chunk_id,
                         'replicas': len(successful_replicas)
-                    })
+                    }
 
                 except Exception as e:
                     # Cleanup on failure
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
+                    if temp is not None:
+                        self._discard_temp_file(temp)
                     if os.path.exists(final_path):
                         os.remove(final_path)
                     raise
@@ -366,57 +724,115 @@ class ChunkServer:
             else:
                 # We are a replica
                 chunk = Chunk(data, file_path, message.get('chunk_index', 0))
+                self._save_checksum(chunk.chunk_id, checksum)
                 chunk.save_to_disk(self.data_dir)
-                send_message(client_socket, {
+                return {
                     'status': 'ok',
                     'chunk_id': chunk.chunk_id
-                })
+                }
 
         except Exception as e:
-            self.logger.error(f"Failed to store/replicate chunk: {e}", exc_info=True)
-            send_message(client_socket, {
+            self.logger.error("Failed to store/replicate chunk: %s", e, exc_info=True)
+            return {
                 'status': 'error',
                 'message': str(e)
-            })
+            }
 
     def _handle_retrieve_chunk(self, client_socket: socket.socket, message: Dict):
         """Handle retrieving a chunk."""
+        data = None
         try:
             chunk_id = message['chunk_id']
-            self.logger.info(f"Retrieving chunk: {chunk_id}")
+            self.logger.info("Retrieving chunk: %s", chunk_id)
             
-            data = Chunk.load_from_disk(self.data_dir, chunk_id)
-            self.logger.debug(f"Loaded chunk {chunk_id} from disk, size: {len(data)} bytes")
+            data = self._read_chunk(chunk_id)
+            self.logger.debug("Loaded chunk %s from disk, size: %s bytes", chunk_id, len(data))
+
+            # Verify against the checksum taken on write before serving the bytes
+            checksum = payload_crc32c(data)
+            stored = self._load_checksum(chunk_id)
+            if stored is not None and stored != checksum:
+                raise Exception(f"Chunk {chunk_id} failed its CRC32C check on disk")
             
             send_message(client_socket, {
                 'status': 'ok',
-                'data': data
+                'data': data,
+                'crc32c': checksum
             })
-            self.logger.info(f"Successfully sent chunk {chunk_id} to client")
+            self.logger.info("Successfully sent chunk %s to client", chunk_id)
         except Exception as e:
-            self.logger.error(f"Failed to retrieve chunk: {e}", exc_info=True)
+            self.logger.error("Failed to retrieve chunk: %s", e, exc_info=True)
             send_message(client_socket, {
                 'status': 'error',
                 'message': str(e)
             })
+        finally:
+            self._buffers.release(data)
+
+    def _read_chunk(self, chunk_id: str):
+        """Read a whole chunk file, into a pooled buffer when it fits one.
+
+        A pooled read returns a memoryview to hand back with
+        self._buffers.release(); anything else comes back as plain bytes.
+        """
+        with open(os.path.join(self.data_dir, chunk_id), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            buf = self._buffers.acquire(size)
+            if buf is None:
+                return f.read()
+            view = memoryview(buf)[:size]
+            try:
+                if f.readinto(view) != size:
+                    raise IOError(f"Chunk {chunk_id} changed size while being read")
+            except BaseException:
+                self._buffers.release(view)
+                raise
+            return view
+
+    def _handle_replicate_from(self, client_socket: socket.socket, message: Dict):
+        """Copy a chunk straight from another chunk server, so re-replication never routes data via the master."""
+        chunk_id = message['chunk_id']
+        source = message['source']
+        response = None
+        try:
+            response = self._pool.rpc(source, {'command': 'retrieve_chunk', 'chunk_id': chunk_id}, self._buffers)
+            if response is None or response['status'] != 'ok':
+                reason = response.get('message') if response else 'connection closed'
+                reply = {'status': 'error', 'message': f"Source {source} could not serve chunk {chunk_id}: {reason}"}
+            else:
+                reply = self._store_chunk({
+                    'chunk_id': chunk_id,
+                    'file_path': message['file_path'],
+                    'data': response['data'],
+                    'crc32c': response.get('crc32c'),
+                    'replica_servers': True
+                })
+        except Exception as e:
+            self.logger.error("Failed to replicate chunk %s from %s: %s", chunk_id, source, e)
+            reply = {'status': 'error', 'message': str(e)}
+        finally:
+            if response:
+                self._buffers.release(response.get('data'))
+        send_message(client_socket, reply)
 
     def _handle_delete_chunk(self, client_socket: socket.socket, message: Dict):
         """Handle deleting a chunk."""
         try:
             chunk_id = message['chunk_id']
-            self.logger.info(f"Deleting chunk: {chunk_id}")
+            self.logger.info("Deleting chunk: %s", chunk_id)
             
             chunk_path = os.path.join(self.data_dir, chunk_id)
+            self._drop_checksum(chunk_id)
             if os.path.exists(chunk_path):
                 os.remove(chunk_path)
-                self.logger.debug(f"Deleted chunk file: {chunk_path}")
+                self.logger.debug("Deleted chunk file: %s", chunk_path)
             else:
-                self.logger.warning(f"Chunk file not found: {chunk_path}")
+                self.logger.warning("Chunk file not found: %s", chunk_path)
             
             send_message(client_socket, {'status': 'ok'})
-            self.logger.info(f"Successfully processed delete request for chunk {chunk_id}")
+            self.logger.info("Successfully processed delete request for chunk %s", chunk_id)
         except Exception as e:
-            self.logger.error(f"Failed to delete chunk: {e}", exc_info=True)
+            self.logger.error("Failed to delete chunk: %s", e, exc_info=True)
             send_message(client_socket, {
                 'status': 'error',
                 'message': str(e)
@@ -430,14 +846,15 @@ class ChunkServer:
             offset = message['offset']
             file_path = message['file_path']
             
-            self.logger.info(f"Appending to chunk {chunk_id} at offset {offset}")
+            self.logger.info("Appending to chunk %s at offset %s", chunk_id, offset)
             
-            # Load existing chunk
+            # Load existing chunk; its recorded checksum no longer applies
             chunk_path = os.path.join(self.data_dir, chunk_id)
+            self._drop_checksum(chunk_id)
             
             # If the file doesn't exist, create it with the data
             if not os.path.exists(chunk_path):
-                self.logger.debug(f"Chunk file doesn't exist, creating new file")
+                self.logger.debug("Chunk file doesn't exist, creating new file")
                 with open(chunk_path, 'wb') as f:
                     f.write(data)
                 new_offset = len(data)
@@ -450,22 +867,22 @@ class ChunkServer:
                     
                     # Verify offset
                     if offset != current_size:
-                        self.logger.warning(f"Offset mismatch: expected {current_size}, got {offset}")
+                        self.logger.warning("Offset mismatch: expected %s, got %s", current_size, offset)
                     
                     # Write new data at the end
                     f.write(data)
                     new_offset = f.tell()
             
-            self.logger.debug(f"New offset after append: {new_offset}")
+            self.logger.debug("New offset after append: %s", new_offset)
             
             # If this is the primary, propagate to replicas
             if 'replica_servers' not in message:
                 # Get replica locations from master
                 with self._connect_to_master() as master_sock:
-                    send_message(master_sock, {
+                    send_message(master_sock, self._with_heartbeat({
                         'command': 'get_replica_locations',
                         'excluding': self.address
-                    })
+                    }))
                     response = receive_message(master_sock)
                     replica_servers = response['locations']
                 
@@ -485,7 +902,7 @@ class ChunkServer:
                             if response['status'] != 'ok':
                                 raise Exception(f"Replica append failed at {replica}")
                     except Exception as e:
-                        self.logger.error(f"Failed to propagate append to replica {replica}: {e}")
+                        self.logger.error("Failed to propagate append to replica %s: %s", replica, e)
             
             send_message(client_socket, {
                 'status': 'ok',
@@ -493,7 +910,7 @@ class ChunkServer:
             })
             
         except Exception as e:
-            self.logger.error(f"Failed to append to chunk: {e}", exc_info=True)
+            self.logger.error("Failed to append to chunk: %s", e, exc_info=True)
             send_message(client_socket, {
                 'status': 'error',
                 'message': str(e)
@@ -509,9 +926,12 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "PREPARE",
-                f"Received prepare request for chunk {chunk_id}"
+                "Received prepare request for chunk %s", chunk_id
             )
             
+            if not payload_intact(message):
+                raise Exception("crc32c_mismatch")
+
             temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
             chunk_path = os.path.join(self.data_dir, chunk_id)
             
@@ -519,7 +939,7 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "PREPARE",
-                f"Creating temporary file at {temp_path}"
+                "Creating temporary file at %s", temp_path
             )
             
             try:
@@ -528,7 +948,7 @@ class ChunkServer:
                         self.transaction_logger,
                         transaction_id,
                         "PREPARE",
-                        f"Copying existing data from {chunk_path}"
+                        "Copying existing data from %s", chunk_path
                     )
                     with open(chunk_path, 'rb') as src, open(temp_path, 'wb') as dst:
                         dst.write(src.read())
@@ -565,7 +985,7 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "PREPARE",
-                f"Prepare phase failed: {str(e)}"
+                "Prepare phase failed: %s", e
             )
             send_message(client_socket, {
                 'status': 'error',
@@ -582,7 +1002,7 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "COMMIT",
-                f"Received commit request for chunk {chunk_id}"
+                "Received commit request for chunk %s", chunk_id
             )
             
             temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
@@ -595,27 +1015,39 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "COMMIT",
-                f"Committing changes from {temp_path} to {chunk_path}"
+                "Committing changes from %s to %s", temp_path, chunk_path
             )
-            os.replace(temp_path, chunk_path)
-            
-            GFSLogger.log_transaction(
-                self.transaction_logger,
-                transaction_id,
-                "COMMIT",
-                "Commit completed successfully"
-            )
-            send_message(client_socket, {
-                'status': 'ok',
-                'message': 'committed'
-            })
+
+            # The appended chunk no longer matches the checksum taken on write
+            self._drop_checksum(chunk_id)
+
+            # Ack only once the group commit has made the rename durable
+            def reply(error):
+                if error is None:
+                    GFSLogger.log_transaction(
+                        self.transaction_logger,
+                        transaction_id,
+                        "COMMIT",
+                        "Commit completed successfully"
+                    )
+                    self._send_reply(client_socket, {'status': 'ok', 'message': 'committed'})
+                else:
+                    GFSLogger.log_transaction(
+                        self.transaction_logger,
+                        transaction_id,
+                        "COMMIT",
+                        "Commit failed: %s", error
+                    )
+                    self._send_reply(client_socket, {'status': 'error', 'message': str(error)})
+
+            self._commit_chunk_file(temp_path, chunk_path, reply)
             
         except Exception as e:
             GFSLogger.log_transaction(
                 self.transaction_logger,
                 transaction_id,
                 "COMMIT",
-                f"Commit failed: {str(e)}"
+                "Commit failed: %s", e
             )
             send_message(client_socket, {
                 'status': 'error',
@@ -628,7 +1060,7 @@ class ChunkServer:
             chunk_id = message['chunk_id']
             transaction_id = message['transaction_id']
             
-            self.logger.info(f"Rolling back append for chunk {chunk_id}, transaction {transaction_id}")
+            self.logger.info("Rolling back append for chunk %s, transaction %s", chunk_id, transaction_id)
             
             temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
             
@@ -639,10 +1071,10 @@ class ChunkServer:
                 'status': 'ok',
                 'message': 'rolled back'
             })
-            self.logger.debug(f"Successfully rolled back append for transaction {transaction_id}")
+            self.logger.debug("Successfully rolled back append for transaction %s", transaction_id)
             
         except Exception as e:
-            self.logger.error(f"Failed to rollback append: {e}", exc_info=True)
+            self.logger.error("Failed to rollback append: %s", e, exc_info=True)
             send_message(client_socket, {
                 'status': 'error',
                 'message': str(e)
@@ -655,9 +1087,14 @@ class ChunkServer:
             data = message['data']
             chunk_size = len(data)
 
+            if not payload_intact(message):
+                self.logger.warning("CRC32C mismatch preparing chunk %s", chunk_id)
+                send_message(client_socket, {'status': 'error', 'message': 'crc32c_mismatch'})
+                return
+
             # Check available space
             if not self.can_store_chunk(chunk_size):
-                self.logger.warning(f"Not enough space to prepare chunk {chunk_id} ({chunk_size} bytes)")
+                self.logger.warning("Not enough space to prepare chunk %s (%s bytes)", chunk_id, chunk_size)
                 send_message(client_socket, {
                     'status': 'error',
                     'message': 'insufficient_space',
@@ -672,19 +1109,21 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "PREPARE",
-                f"Received prepare request for chunk {chunk_id} from primary"
+                "Received prepare request for chunk %s from primary", chunk_id
             )
             
             # Create temporary file
             temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
             try:
-                with open(temp_path, 'wb') as f:
-                    f.write(data)
+                temp = self._write_chunk_file(temp_path, data)
+                with self._prepared_lock:
+                    self._prepared[(chunk_id, transaction_id)] = (
+                        temp, time.monotonic() + PREPARED_CHUNK_TTL)
                 GFSLogger.log_transaction(
                     self.transaction_logger,
                     transaction_id,
                     "PREPARE",
-                    f"✅ Successfully prepared chunk {chunk_id}"
+                    "✅ Successfully prepared chunk %s", chunk_id
                 )
                 send_message(client_socket, {
                     'status': 'ok',
@@ -700,7 +1139,7 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "PREPARE",
-                f"❌ Failed to prepare chunk: {e}"
+                "❌ Failed to prepare chunk: %s", e
             )
             send_message(client_socket, {
                 'status': 'error',
@@ -717,35 +1156,44 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "COMMIT",
-                f"Received commit request for chunk {chunk_id}"
+                "Received commit request for chunk %s", chunk_id
             )
             
-            temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
             chunk_path = os.path.join(self.data_dir, chunk_id)
+            with self._prepared_lock:
+                temp, _ = self._prepared.pop((chunk_id, transaction_id), (None, None))
             
-            if not os.path.exists(temp_path):
+            if temp is None:
                 raise Exception("No prepared data found for commit")
             
-            # Atomic rename of temp file to final chunk file
-            os.replace(temp_path, chunk_path)
-            
-            GFSLogger.log_transaction(
-                self.transaction_logger,
-                transaction_id,
-                "COMMIT",
-                f"✅ Successfully committed chunk {chunk_id}"
-            )
-            send_message(client_socket, {
-                'status': 'ok',
-                'message': 'committed'
-            })
+            # Atomic rename of temp file to final chunk file, acked once the
+            # group commit has made it durable
+            def reply(error):
+                if error is None:
+                    GFSLogger.log_transaction(
+                        self.transaction_logger,
+                        transaction_id,
+                        "COMMIT",
+                        "✅ Successfully committed chunk %s", chunk_id
+                    )
+                    self._send_reply(client_socket, {'status': 'ok', 'message': 'committed'})
+                else:
+                    GFSLogger.log_transaction(
+                        self.transaction_logger,
+                        transaction_id,
+                        "COMMIT",
+                        "❌ Failed to commit chunk: %s", error
+                    )
+                    self._send_reply(client_socket, {'status': 'error', 'message': str(error)})
+
+            self._commit_chunk_file(temp, chunk_path, reply)
             
         except Exception as e:
             GFSLogger.log_transaction(
                 self.transaction_logger,
                 transaction_id,
                 "COMMIT",
-                f"❌ Failed to commit chunk: {e}"
+                "❌ Failed to commit chunk: %s", e
             )
             send_message(client_socket, {
                 'status': 'error',
@@ -762,17 +1210,19 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "ROLLBACK",
-                f"Received rollback request for chunk {chunk_id}"
+                "Received rollback request for chunk %s", chunk_id
             )
             
-            temp_path = os.path.join(self.data_dir, f"{chunk_id}.{transaction_id}.temp")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # An unnamed prepared file just needs closing; the kernel frees it
+            with self._prepared_lock:
+                temp, _ = self._prepared.pop((chunk_id, transaction_id), (None, None))
+            if temp is not None:
+                self._discard_temp_file(temp)
                 GFSLogger.log_transaction(
                     self.transaction_logger,
                     transaction_id,
                     "ROLLBACK",
-                    f"✅ Successfully rolled back chunk {chunk_id}"
+                    "✅ Successfully rolled back chunk %s", chunk_id
                 )
             
             send_message(client_socket, {
@@ -785,7 +1235,7 @@ class ChunkServer:
                 self.transaction_logger,
                 transaction_id,
                 "ROLLBACK",
-                f"❌ Failed to rollback chunk: {e}"
+                "❌ Failed to rollback chunk: %s", e
             )
             send_message(client_socket, {
                 'status': 'error',
@@ -806,42 +1256,159 @@ class ChunkServer:
 
     def run(self):
         """Run the chunk server."""
-        self.logger.info(f"Starting chunk server on {self.host}:{self.port}")
-        self.heartbeat_thread.start()
+        self.logger.info("Starting chunk server on %s:%s", self.host, self.port)
+        self._schedule_heartbeat(0)
+
+        # A single reactor thread watches every idle connection; when one turns
+        # readable it is handed to a worker for exactly one request, then
+        # re-armed, so requests on a connection stay ordered
+        executor = ThreadPoolExecutor(
+            max_workers=self.config['chunk_server'].get('max_workers', 32),
+            thread_name_prefix='chunk-worker'
+        )
+        self._rearmed = RearmQueue()
+
+        ring = None
+        if self.config['chunk_server'].get('io_backend') == 'io_uring':
+            ring = self._create_ring()
         
         try:
-            while True:
-                client_socket, address = self.server_socket.accept()
-                self.logger.info(f"Accepted connection from {address}")
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
-                self.logger.debug(f"Started client handler thread for {address}")
+            if ring is not None:
+                self._run_io_uring(ring, executor)
+            else:
+                self._run_selector(executor)
         except KeyboardInterrupt:
             self.logger.info("Shutting down chunk server...")
             self.server_socket.close()
         except Exception as e:
-            self.logger.error(f"Unexpected error in chunk server: {e}", exc_info=True)
+            self.logger.error("Unexpected error in chunk server: %s", e, exc_info=True)
             self.server_socket.close()
+        finally:
+            executor.shutdown(wait=False)
+            self._pool.close()
+            self._rearmed.close()
+
+    def _run_selector(self, executor: ThreadPoolExecutor):
+        """Reactor loop on selectors (epoll on Linux)."""
+        wakeup_r = self._rearmed.wakeup
+        selector = selectors.DefaultSelector()
+        selector.register(self.server_socket, selectors.EVENT_READ)
+        selector.register(wakeup_r, selectors.EVENT_READ)
+        try:
+            while True:
+                for key, _ in selector.select():
+                    sock = key.fileobj
+                    if sock is self.server_socket:
+                        client_socket, address = self.server_socket.accept()
+                        self.logger.info("Accepted connection from %s", address)
+                        selector.register(client_socket, selectors.EVENT_READ, address)
+                    elif sock is wakeup_r:
+                        for client_socket, address in self._rearmed.drain():
+                            selector.register(client_socket, selectors.EVENT_READ, address)
+                    else:
+                        selector.unregister(sock)
+                        executor.submit(self._serve_request, sock, key.data)
+        finally:
+            selector.close()
+
+    def _create_ring(self):
+        """Set up an io_uring instance, or return None to fall back to selectors."""
+        if liburing is None:
+            self.logger.warning("io_backend is io_uring but liburing isn't installed; using selectors")
+            return None
+        ring = liburing.Ring()
+        try:
+            liburing.io_uring_queue_init(IO_URING_ENTRIES, ring, 0)
+        except OSError as e:
+            self.logger.warning("io_uring unavailable (%s); using selectors", e)
+            return None
+        return ring
+
+    @staticmethod
+    def _ring_sqe(ring):
+        """Get a submission queue entry, flushing the queue first if it is full."""
+        sqe = liburing.io_uring_get_sqe(ring)
+        while sqe is None:
+            liburing.io_uring_submit(ring)
+            sqe = liburing.io_uring_get_sqe(ring)
+        return sqe
+
+    def _run_io_uring(self, ring, executor: ThreadPoolExecutor):
+        """Reactor loop on io_uring: one multishot accept plus a one-shot POLLIN per idle connection.
+
+        Completions are awaited on a registered eventfd rather than inside the
+        ring, whose wait call would hold the GIL and stall the workers.
+        """
+        accept_token, wakeup_token = 0, 1
+        wakeup_r = self._rearmed.wakeup
+        idle = {}  # fd -> (socket, address), each with a POLLIN armed
+        event_fd = os.eventfd(0)
+        liburing.io_uring_register_eventfd(ring, event_fd)
+        cqe = liburing.Cqe()
+
+        def arm_accept():
+            sqe = self._ring_sqe(ring)
+            liburing.io_uring_prep_multishot_accept(sqe, self.server_socket.fileno())
+            liburing.io_uring_sqe_set_data64(sqe, accept_token)
+
+        def arm_poll(fd: int, token: int):
+            sqe = self._ring_sqe(ring)
+            liburing.io_uring_prep_poll_add(sqe, fd, select.POLLIN)
+            liburing.io_uring_sqe_set_data64(sqe, token)
+
+        def watch(client_socket: socket.socket, address):
+            fd = client_socket.fileno()
+            idle[fd] = (client_socket, address)
+            arm_poll(fd, fd + 2)
+
+        self.logger.info("Serving connections with io_uring")
+        arm_accept()
+        arm_poll(wakeup_r.fileno(), wakeup_token)
+        try:
+            while True:
+                liburing.io_uring_submit(ring)
+                os.eventfd_read(event_fd)
+                while ready := liburing.io_uring_cq_ready(ring):
+                    liburing.io_uring_peek_cqe(ring, cqe)
+                    for i in range(ready):
+                        entry = cqe[i]
+                        token, result, flags = entry.user_data, entry.res, entry.flags
+                        if token == accept_token:
+                            if result >= 0:
+                                client_socket = socket.socket(fileno=result)
+                                address = client_socket.getpeername()
+                                self.logger.info("Accepted connection from %s", address)
+                                watch(client_socket, address)
+                            else:
+                                self.logger.warning("io_uring accept failed: %s", os.strerror(-result))
+                            if not flags & liburing.IORING_CQE_F_MORE:
+                                arm_accept()  # The kernel ended the multishot accept
+                        elif token == wakeup_token:
+                            for client_socket, address in self._rearmed.drain():
+                                watch(client_socket, address)
+                            arm_poll(wakeup_r.fileno(), wakeup_token)
+                        else:
+                            # Readable, hung up or failed: the worker finds out which
+                            client_socket, address = idle.pop(token - 2)
+                            executor.submit(self._serve_request, client_socket, address)
+                    liburing.io_uring_cq_advance(ring, ready)
+        finally:
+            liburing.io_uring_queue_exit(ring)
+            os.close(event_fd)
 
     def _connect_to_master(self) -> socket.socket:
         """Connect to the master server."""
-        self.logger.debug(f"Connecting to master at {self.master_host}:{self.master_port}")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((self.master_host, self.master_port))
+        self.logger.debug("Connecting to master at %s:%s", self.master_host, self.master_port)
+        s = connect_tuned((self.master_host, self.master_port),
+                          CONTROL_SOCKET_BUFFER_SIZE, CONTROL_SOCKET_BUFFER_SIZE)
         self.logger.debug("Connected to master server")
         return s
 
     def _connect_to_chunk_server(self, address: str) -> socket.socket:
         """Connect to another chunk server."""
-        host, port = address.split(':')
-        self.logger.debug(f"Connecting to chunk server at {address}")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((host, int(port)))
-        self.logger.debug(f"Connected to chunk server at {address}")
+        self.logger.debug("Connecting to chunk server at %s", address)
+        s = connect_tuned(address)
+        self.logger.debug("Connected to chunk server at %s", address)
         return s
 
 if __name__ == "__main__":
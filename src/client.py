@@ -1,12 +1,34 @@
 import socket
 import os
-from typing import List, Dict, Optional
-import toml
-from .utils import send_message, receive_message
+import mmap
+from typing import Any, List, Dict, Optional, Tuple
+from .utils import (send_framed, send_file_message, send_file_ranges, receive_message,
+                    ConnectionPool, BufferPool,
+                    connect_tuned, socket_buffer_sizes, encode_message, new_transaction_id,
+                    payload_crc32c, payload_intact, load_config)
 from .chunk import Chunk
+from .file_manager import FileMetadata
+from .io_uring_backend import UringReceiver
 from .logger import GFSLogger
 import random
+import threading
 import time
+from contextlib import contextmanager
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, FIRST_EXCEPTION
+
+# Upper bound on chunks transferred concurrently by a single upload or download
+MAX_TRANSFER_WORKERS = 32
+# Chunks bound for one primary are coalesced into store_chunk_batch requests up to this size
+STORE_BATCH_BYTES = 64 * 1024 * 1024
+# Seconds a fetched chunk server list is reused before asking the master again
+SERVERS_CACHE_TTL = 2.0
+# How long file metadata (chunk list and locations) is reused for reads when the
+# master grants no lease, and how many files are kept
+METADATA_CACHE_TTL = 10.0
+METADATA_CACHE_SIZE = 10000
+# Seconds between client heartbeats to the master
+CLIENT_HEARTBEAT_INTERVAL = 30
 
 class GFSClient:
     def __init__(self, config_path: str, client_id: str = None, x: float = 0, y: float = 0):
@@ -14,7 +36,7 @@ class GFSClient:
         self.transaction_logger = GFSLogger.get_transaction_logger('client')
         self.logger.info(f"Initializing GFS Client with config from {config_path}")
         
-        self.config = toml.load(config_path)
+        self.config = load_config(config_path)
         self.master_host = self.config['master']['host']
         self.master_port = self.config['master']['port']
         self.chunk_size = self.config['client']['upload_chunk_size']
@@ -25,81 +47,196 @@ class GFSClient:
         self.client_id = client_id or f"client_{int(time.time())}"
         self.logger.info(f"Client {self.client_id} location set to ({x}, {y})")
         
+        # Kernel socket buffer sizes for every connection this client opens
+        self._sndbuf, self._rcvbuf = socket_buffer_sizes(self.config['client'])
+
+        # Reply payloads (downloaded chunks above all) can be received through
+        # io_uring, one submission per payload, where liburing is available
+        receiver = None
+        if self.config['client'].get('io_backend') == 'io_uring':
+            receiver = UringReceiver.create()
+
+        # Sockets to the master and chunk servers are reused across RPCs
+        self._pool = ConnectionPool(self.config['client'].get('conn_pool_max_size', 8),
+                                    self._sndbuf, self._rcvbuf, receiver)
+
+        # Downloaded chunk payloads land in recycled buffers
+        self._buffers = BufferPool(self.chunk_size, 4)
+
+        # Recently fetched chunk server list as (fetched_at, servers)
+        self._servers_cache: Optional[Tuple[float, List[str]]] = None
+        self._servers_fetch_lock = threading.Lock()
+
+        # Recently fetched file metadata as path -> (fetched_at, lease, metadata), least recently used first
+        self._metadata_cache: OrderedDict = OrderedDict()
+        self._metadata_cache_lock = threading.Lock()
+
+        # Long-lived workers for per-replica RPC fan-out, so an append's prepare,
+        # commit and rollback phases don't each spawn and join fresh threads
+        self._rpc_executor = ThreadPoolExecutor(max_workers=MAX_TRANSFER_WORKERS, thread_name_prefix='gfs-rpc')
+
+        # Stores in flight per chunk server, so parallel uploads pick the least-loaded primary
+        self._in_flight: Dict[str, int] = {}
+        self._in_flight_lock = threading.Lock()
+
         # Register with master
         self._register_with_master()
 
     def _register_with_master(self):
         """Register client with master server."""
         try:
-            with self._connect_to_master() as master_sock:
-                send_message(master_sock, {
-                    'command': 'register_client',
-                    'client_id': self.client_id,
-                    'location': self.location
-                })
-                response = receive_message(master_sock)
-                if response['status'] != 'ok':
-                    raise Exception(f"Failed to register with master: {response.get('message')}")
+            response = self._master_rpc({
+                'command': 'register_client',
+                'client_id': self.client_id,
+                'location': self.location
+            })
+            if response['status'] != 'ok':
+                raise Exception(f"Failed to register with master: {response.get('message')}")
         except Exception as e:
             self.logger.error(f"Failed to register with master: {e}")
             raise
 
     def _send_heartbeat(self):
-        """Send periodic heartbeats to master."""
-        while True:
-            try:
-                with self._connect_to_master() as master_sock:
-                    send_message(master_sock, {
-                        'command': 'client_heartbeat',
-                        'client_id': self.client_id,
-                        'location': self.location
-                    })
-            except Exception as e:
-                self.logger.error(f"Failed to send heartbeat: {e}")
-            time.sleep(30)  # Send client heartbeat every 30 seconds
+        """Send a heartbeat to master over the pooled connection, then schedule the next one."""
+        try:
+            self._master_rpc({
+                'command': 'client_heartbeat',
+                'client_id': self.client_id,
+                'location': self.location
+            })
+        except Exception as e:
+            self.logger.error(f"Failed to send heartbeat: {e}")
+        # Re-arm a timer rather than parking a thread in a sleep loop
+        self._heartbeat_timer = threading.Timer(CLIENT_HEARTBEAT_INTERVAL, self._send_heartbeat)
+        self._heartbeat_timer.daemon = True
+        self._heartbeat_timer.start()
+
+    def _master_rpc(self, message: Dict) -> Dict:
+        """Send a request to the master over a pooled connection and return the reply."""
+        return self._pool.rpc((self.master_host, self.master_port), message)
+
+    def _chunk_server_rpc(self, address: str, message: Any) -> Dict:
+        """Send a request (a dict or an encoded frame) to a chunk server over a pooled connection."""
+        return self._pool.rpc(address, message)
 
     def _connect_to_master(self) -> socket.socket:
         """Connect to the master server."""
         self.logger.debug(f"Connecting to master at {self.master_host}:{self.master_port}")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((self.master_host, self.master_port))
+        s = connect_tuned((self.master_host, self.master_port), self._sndbuf, self._rcvbuf)
         self.logger.debug("Connected to master server")
         return s
 
     def _connect_to_chunk_server(self, address: str) -> socket.socket:
         """Connect to a chunk server."""
-        host, port = address.split(':')
         self.logger.debug(f"Connecting to chunk server at {address}")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((host, int(port)))
+        s = connect_tuned(address, self._sndbuf, self._rcvbuf)
         self.logger.debug(f"Connected to chunk server at {address}")
         return s
 
     def _get_available_chunk_servers(self) -> List[str]:
-        """Get list of available chunk servers from master."""
-        self.logger.debug("Getting available chunk servers from master")
-        with self._connect_to_master() as master_sock:
-            send_message(master_sock, {'command': 'get_chunk_servers'})
-            response = receive_message(master_sock)
+        """Get list of available chunk servers from master.
+
+        Concurrent callers that miss the cache share a single master request.
+        """
+        cache = self._servers_cache
+        if cache and time.monotonic() - cache[0] < SERVERS_CACHE_TTL:
+            return cache[1]
+
+        with self._servers_fetch_lock:
+            # Another thread may have refreshed the list while we waited
+            cache = self._servers_cache
+            if cache and time.monotonic() - cache[0] < SERVERS_CACHE_TTL:
+                return cache[1]
+
+            self.logger.debug("Getting available chunk servers from master")
+            response = self._master_rpc({'command': 'get_chunk_servers'})
             servers = response.get('servers', [])
             self.logger.debug(f"Available chunk servers: {servers}")
             if not servers:
                 raise Exception("No chunk servers available")
+            self._servers_cache = (time.monotonic(), servers)
             return servers
 
-    def _store_chunk_with_fallback(self, chunk: Chunk, available_servers: List[str]) -> Optional[str]:
-        """Try to store chunk on available servers, handling space constraints."""
+    def _get_file_metadata(self, gfs_path: str, max_age: Optional[float] = None):
+        """Get a file's metadata, reusing a cached copy while the master's lease on it lasts.
+
+        max_age, if given, further limits how old a cached copy may be.
+        """
+        now = time.monotonic()
+        with self._metadata_cache_lock:
+            cached = self._metadata_cache.get(gfs_path)
+            if cached:
+                fetched_at, lease, metadata = cached
+                if now - fetched_at < (lease if max_age is None else min(lease, max_age)):
+                    self._metadata_cache.move_to_end(gfs_path)
+                    return metadata
+
+        self.logger.debug(f"Requesting metadata for {gfs_path}")
+        response = self._master_rpc({
+            'command': 'get_file_metadata',
+            'file_path': gfs_path
+        })
+        if response['status'] != 'ok':
+            raise Exception(f"Failed to get file metadata: {response.get('message')}")
+        metadata = response['metadata']
+        if isinstance(metadata, dict):
+            # Sent as JSON; rebuild the dataclass the rest of the client expects
+            metadata = FileMetadata(**metadata)
+        self.logger.debug(f"Received metadata: {metadata}")
+        with self._metadata_cache_lock:
+            if metadata is None:
+                self._metadata_cache.pop(gfs_path, None)
+            else:
+                self._metadata_cache[gfs_path] = (now, response.get('lease', METADATA_CACHE_TTL), metadata)
+                self._metadata_cache.move_to_end(gfs_path)
+                if len(self._metadata_cache) > METADATA_CACHE_SIZE:
+                    self._metadata_cache.popitem(last=False)
+        return metadata
+
+    def _forget_file_metadata(self, gfs_path: str):
+        """Drop a file's cached metadata after this client changes the file."""
+        with self._metadata_cache_lock:
+            self._metadata_cache.pop(gfs_path, None)
+
+    def _servers_by_load(self, servers: List[str]) -> List[str]:
+        """Order servers by this client's in-flight transfers to each, breaking ties randomly."""
+        with self._in_flight_lock:
+            return sorted(servers, key=lambda server: (self._in_flight.get(server, 0), random.random()))
+
+    @contextmanager
+    def _in_flight_to(self, server: str):
+        """Count a transfer against server for as long as the block runs."""
+        with self._in_flight_lock:
+            self._in_flight[server] = self._in_flight.get(server, 0) + 1
+        try:
+            yield
+        finally:
+            with self._in_flight_lock:
+                self._in_flight[server] -= 1
+
+    def _store_chunk_with_fallback(self, chunk: Chunk, available_servers: List[str],
+                                   source_path: Optional[str] = None) -> Optional[str]:
+        """Try to store chunk on available servers, handling space constraints.
+
+        When source_path is given the chunk bytes are streamed from that local
+        file with sendfile instead of being copied out of chunk.data.
+        """
         for server in available_servers:
             try:
-                with self._connect_to_chunk_server(server) as chunk_sock:
-                    send_message(chunk_sock, {
+                with self._in_flight_to(server), self._pool.connection(server) as chunk_sock:
+                    header = {
                         'command': 'store_chunk',
-                        'data': chunk.data,
                         'file_path': chunk.file_path,
                         'chunk_index': chunk.chunk_index,
                         'chunk_id': chunk.chunk_id,
-                        'client_id': self.client_id
-                    })
+                        'client_id': self.client_id,
+                        'crc32c': payload_crc32c(chunk.data)
+                    }
+                    if source_path:
+                        send_file_message(chunk_sock, header, source_path,
+                                          chunk.chunk_index * self.chunk_size, chunk.size)
+                    else:
+                        send_framed(chunk_sock, header, chunk.data)
                     response = receive_message(chunk_sock)
                     
                     if response['status'] == 'ok':
@@ -110,6 +247,8 @@ class GFSClient:
                         continue
                     
             except Exception as e:
+                # The server may be gone; ask the master afresh next time
+                self._servers_cache = None
                 continue
                 
         return None
@@ -118,198 +257,392 @@ class GFSClient:
         """Upload a file to GFS."""
         self.logger.info(f"Starting upload of {local_path} to GFS path {gfs_path}")
         
-        # Check for available chunk servers
-        available_servers = self._get_available_chunk_servers()
-        self.logger.info(f"Found {len(available_servers)} available chunk servers")
-        
-        if not available_servers:
-            error_msg = "No chunk servers available for upload"
-            self.logger.error(error_msg)
-            raise Exception(error_msg)
-        
-        # Read file and split into chunks
+        # Map the file instead of reading it: chunks are zero-copy windows onto
+        # the page cache, used for hashing and small batches, while single
+        # chunks are sent straight from the file with sendfile
         with open(local_path, 'rb') as f:
-            data = f.read()
-        total_size = len(data)
-        self.logger.debug(f"Read {total_size} bytes from {local_path}")
-        
-        chunks = []
-        chunk_ids = []
-        for i in range(0, len(data), self.chunk_size):
-            chunk_data = data[i:i + self.chunk_size]
-            chunk = Chunk(chunk_data, gfs_path, len(chunks))
-            chunks.append(chunk)
-            chunk_ids.append(chunk.chunk_id)
-        self.logger.info(f"Split file into {len(chunks)} chunks")
-
-        # Store chunks through primary servers
-        for chunk in chunks:
-            # Get all available servers
-            available_servers = self._get_available_chunk_servers()
-            if not available_servers:
-                raise Exception("No chunk servers available")
+            total_size = os.fstat(f.fileno()).st_size
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if total_size else None
+        view = memoryview(mm) if mm is not None else memoryview(b'')
+        self.logger.debug(f"Uploading {total_size} bytes from {local_path}")
 
-            # Try to store chunk on any available server
-            success_server = self._store_chunk_with_fallback(chunk, available_servers)
-            
-            if not success_server:
-                self.logger.error(f"Failed to store chunk {chunk.chunk_id} on any server")
-                raise Exception(f"No servers available with sufficient space for chunk {chunk.chunk_id}")
+        try:
+            # Derive every chunk ID up front; a single upload_begin then registers
+            # the whole file (replacing any previous version) and returns the
+            # primary the master picked for each chunk
+            chunk_ids = self._plan_chunk_ids(view)
+            response = self._master_rpc({
+                'command': 'upload_begin',
+                'file_path': gfs_path,
+                'total_size': total_size,
+                'chunk_ids': chunk_ids,
+                'client_id': self.client_id
+            })
+            if response['status'] != 'ok':
+                raise Exception(f"Failed to begin upload of {gfs_path}: {response.get('message')}")
+            available_servers = response['servers']
+            self._servers_cache = (time.monotonic(), available_servers)
+            self.logger.info(f"Found {len(available_servers)} available chunk servers")
+
+            self._send_chunks(view, gfs_path, chunk_ids, response['assignments'],
+                              available_servers, local_path)
+        finally:
+            self._forget_file_metadata(gfs_path)
+            try:
+                view.release()
+                if mm is not None:
+                    mm.close()
+            except BufferError:
+                # A failed store's traceback can still hold a chunk window;
+                # the mapping is then closed when that is collected
+                pass
+
+        self.logger.info(f"Uploaded {local_path} as {len(chunk_ids)} chunks")
+
+    def _send_chunks(self, view: memoryview, gfs_path: str, chunk_ids: List[str], assignments: List[str],
+                     available_servers: List[str], local_path: str):
+        """Group chunks into batches per assigned primary and send the batches concurrently."""
+        batch_size = max(1, STORE_BATCH_BYTES // self.chunk_size)
+        # Every primary gets at least one batch, so small files still fan out
+        num_batches = max(1, -(-len(view) // (self.chunk_size * batch_size)), len(set(assignments)))
+        max_workers = min(MAX_TRANSFER_WORKERS, num_batches)
+        batches: Dict[str, List[Chunk]] = {}
+        pending = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for chunk_index, (chunk_id, primary) in enumerate(zip(chunk_ids, assignments)):
+                    start = chunk_index * self.chunk_size
+                    batch = batches.setdefault(primary, [])
+                    batch.append(Chunk(view[start:start + self.chunk_size], gfs_path, chunk_index, chunk_id))
+                    if len(batch) < batch_size:
+                        continue
+
+                    pending.add(executor.submit(self._store_chunk_batch, batches.pop(primary),
+                                                available_servers, local_path, primary))
+                    if len(pending) >= max_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+
+                while batches:
+                    primary, batch = batches.popitem()
+                    pending.add(executor.submit(self._store_chunk_batch, batch,
+                                                available_servers, local_path, primary))
+                # Fail fast: the first failed batch cancels whatever hasn't started
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        future.result()
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                for batch in batches.values():
+                    for chunk in batch:
+                        chunk.data.release()
 
-            self.logger.info(f"Successfully stored chunk {chunk.chunk_id} on server {success_server}")
+    def _plan_chunk_ids(self, view: memoryview) -> List[str]:
+        """Hash a file's contents chunk by chunk, keeping only the resulting IDs.
+
+        hashlib releases the GIL while digesting large buffers, so the chunks
+        are hashed on a thread pool and the SHA-256 work spreads across cores.
+        """
+        slices = [view[start:start + self.chunk_size] for start in range(0, len(view), self.chunk_size)]
+        try:
+            if len(slices) <= 1:
+                return [Chunk.make_chunk_id(chunk_data) for chunk_data in slices]
+            workers = min(len(slices), os.cpu_count() or 1, MAX_TRANSFER_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(Chunk.make_chunk_id, slices))
+        finally:
+            for chunk_data in slices:
+                chunk_data.release()
+
+    def _store_chunk_batch(self, chunks: List[Chunk], available_servers: List[str],
+                           source_path: Optional[str] = None, primary: Optional[str] = None):
+        """Send a batch of chunks to one primary, falling back per chunk on failure.
+
+        The primary defaults to the least-loaded server. With source_path the
+        bodies are streamed from that file with sendfile, one range per chunk.
+        """
+        if len(chunks) == 1:
+            self._store_one_chunk(chunks[0], available_servers, source_path, primary)
+            return
+
+        primary = primary or self._servers_by_load(available_servers)[0]
+        statuses = []
+        try:
+            # Chunk bodies go out back to back as one payload, never joined in
+            # user space; each item's size tells the primary where to split it
+            header = {
+                'command': 'store_chunk_batch',
+                'client_id': self.client_id,
+                'items': [{
+                    'size': chunk.size,
+                    'file_path': chunk.file_path,
+                    'chunk_index': chunk.chunk_index,
+                    'chunk_id': chunk.chunk_id,
+                    'crc32c': payload_crc32c(chunk.data)
+                } for chunk in chunks]
+            }
+            with self._in_flight_to(primary), self._pool.connection(primary) as sock:
+                if source_path:
+                    send_file_ranges(sock, header, source_path,
+                                     [(chunk.chunk_index * self.chunk_size, chunk.size) for chunk in chunks])
+                else:
+                    send_framed(sock, header, [chunk.data for chunk in chunks])
+                response = receive_message(sock)
+                if response is None:
+                    raise ConnectionError(f"Connection to {primary} closed without a reply")
+                if response['status'] == 'ok':
+                    statuses = response['statuses']
+        except Exception as e:
+            self.logger.warning(f"Batch store to {primary} failed: {e}")
+            self._servers_cache = None
+
+        for i, chunk in enumerate(chunks):
+            if i < len(statuses) and statuses[i]['status'] == 'ok':
+                self.logger.info(f"Successfully stored chunk {chunk.chunk_id} on server {primary}")
+            else:
+                self._store_one_chunk(chunk, available_servers, source_path)
+
+    def _store_one_chunk(self, chunk: Chunk, available_servers: List[str],
+                         source_path: Optional[str] = None, primary: Optional[str] = None) -> str:
+        """Store a chunk on primary if given, then on the servers with the fewest in-flight stores."""
+        servers = self._servers_by_load([server for server in available_servers if server != primary])
+        if primary:
+            servers.insert(0, primary)
+        success_server = self._store_chunk_with_fallback(chunk, servers, source_path)
+
+        if not success_server:
+            self.logger.error(f"Failed to store chunk {chunk.chunk_id} on any server")
+            raise Exception(f"No servers available with sufficient space for chunk {chunk.chunk_id}")
+
+        self.logger.info(f"Successfully stored chunk {chunk.chunk_id} on server {success_server}")
+        return success_server
 
     def download_file(self, gfs_path: str, local_path: str):
         """Download a file from GFS."""
         self.logger.info(f"Starting download of {gfs_path} to {local_path}")
         
-        # Get file metadata from master
-        with self._connect_to_master() as master_sock:
-            self.logger.debug(f"Requesting metadata for {gfs_path}")
-            send_message(master_sock, {
-                'command': 'get_file_metadata',
-                'file_path': gfs_path
-            })
-            response = receive_message(master_sock)
-            metadata = response['metadata']
-            self.logger.debug(f"Received metadata: {metadata}")
-
-        # Download chunks
-        chunks_data = []
-        for chunk_id in metadata.chunk_ids:
-            self.logger.debug(f"Processing chunk {chunk_id}")
-            
-            # Get chunk locations from master
-            with self._connect_to_master() as master_sock:
-                self.logger.debug("Requesting chunk locations from master")
-                send_message(master_sock, {
-                    'command': 'get_chunk_locations',
-                    'file_path': gfs_path,
-                    'chunk_id': chunk_id
-                })
-                response = receive_message(master_sock)
-                self.logger.debug(f"Received chunk locations: {response['locations']}")
+        # The metadata carries every chunk's locations, so a download costs at
+        # most one master round-trip, and none while the cached copy is fresh
+        metadata = self._get_file_metadata(gfs_path)
+        if metadata is None:
+            raise Exception(f"File {gfs_path} not found")
+        try:
+            self._download_chunks(metadata, local_path)
+        except Exception as e:
+            # Cached locations may be stale: chunks can move or be replaced
+            self.logger.warning(f"Download of {gfs_path} failed ({e}), retrying with fresh metadata")
+            metadata = self._get_file_metadata(gfs_path, max_age=0)
+            if metadata is None:
+                raise Exception(f"File {gfs_path} not found")
+            self._download_chunks(metadata, local_path)
+        
+        self.logger.info(f"Successfully downloaded {gfs_path} to {local_path}")
+
+    def _download_chunks(self, metadata, local_path: str):
+        """Fetch every chunk in the metadata into local_path, removing the file on failure."""
+        locations = metadata.chunk_locations
 
-            # Try to download from available locations
-            chunk_data = None
-            for server_address in response['locations']:
+        # Chunk sizes from the metadata give every chunk's offset in the output,
+        # so workers can write their chunk in place as soon as it arrives
+        sizes = [metadata.chunk_offsets.get(chunk_id) for chunk_id in metadata.chunk_ids]
+        max_workers = min(MAX_TRANSFER_WORKERS, max(1, len(metadata.chunk_ids)))
+        try:
+            if None not in sizes:
+                fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
                 try:
-                    self.logger.debug(f"Attempting to retrieve chunk from {server_address}")
-                    with self._connect_to_chunk_server(server_address) as chunk_sock:
-                        send_message(chunk_sock, {
-                            'command': 'retrieve_chunk',
-                            'chunk_id': chunk_id
-                        })
-                        response = receive_message(chunk_sock)
-                        if response['status'] == 'ok':
-                            chunk_data = response['data']
-                            self.logger.debug(f"Successfully retrieved chunk from {server_address}")
-                            break
-                except Exception as e:
-                    self.logger.error(f"Failed to retrieve chunk from {server_address}: {e}")
-
-            if chunk_data is None:
-                error_msg = f"Failed to retrieve chunk {chunk_id}"
-                self.logger.error(error_msg)
-                raise Exception(error_msg)
-            
-            chunks_data.append(chunk_data)
+                    os.ftruncate(fd, sum(sizes))
+                    offset = 0
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = []
+                        for chunk_id, size in zip(metadata.chunk_ids, sizes):
+                            futures.append(executor.submit(
+                                self._fetch_chunk_into, fd, offset, size, chunk_id, locations.get(chunk_id, [])
+                            ))
+                            offset += size
+                        for future in futures:
+                            future.result()
+                finally:
+                    os.close(fd)
+            else:
+                # Sizes unknown (older metadata): keep up to max_workers fetches in
+                # flight ahead of the chunk being appended to the file
+                with open(local_path, 'wb') as f, ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    in_flight = deque()
+                    for chunk_id in metadata.chunk_ids:
+                        in_flight.append(executor.submit(self._fetch_chunk, chunk_id, locations.get(chunk_id, [])))
+                        if len(in_flight) >= max_workers:
+                            data = in_flight.popleft().result()
+                            f.write(data)
+                            self._buffers.release(data)
+                    while in_flight:
+                        data = in_flight.popleft().result()
+                        f.write(data)
+                        self._buffers.release(data)
+        except Exception:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
 
-        # Write chunks to local file
-        self.logger.debug(f"Writing {len(chunks_data)} chunks to {local_path}")
-        with open(local_path, 'wb') as f:
-            for chunk_data in chunks_data:
-                f.write(chunk_data)
-        
-        self.logger.info(f"Successfully downloaded {gfs_path} to {local_path}")
+    def _fetch_chunk_into(self, fd: int, offset: int, size: int, chunk_id: str, locations: List[str]):
+        """Retrieve a chunk and write it at its offset in the output file."""
+        data = self._fetch_chunk(chunk_id, locations)
+        try:
+            if len(data) != size:
+                raise Exception(f"Chunk {chunk_id} has {len(data)} bytes, metadata says {size}")
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+            view.release()
+        finally:
+            self._buffers.release(data)
+
+    def _fetch_chunk(self, chunk_id: str, locations: List[str]) -> bytes:
+        """Retrieve a chunk from the first of its replicas that has it.
+
+        The result may be a pooled buffer; release it to self._buffers when done.
+        """
+        self.logger.debug(f"Processing chunk {chunk_id}")
+
+        # Try the replicas this client is busiest with last, so parallel
+        # fetches spread over every replica instead of all hitting the first
+        for server_address in self._servers_by_load(locations):
+            try:
+                self.logger.debug(f"Attempting to retrieve chunk from {server_address}")
+                with self._in_flight_to(server_address):
+                    chunk_response = self._pool.rpc(server_address, {
+                        'command': 'retrieve_chunk',
+                        'chunk_id': chunk_id
+                    }, self._buffers)
+                if chunk_response['status'] == 'ok':
+                    if not payload_intact(chunk_response):
+                        self._buffers.release(chunk_response['data'])
+                        self.logger.error(f"Chunk {chunk_id} from {server_address} failed its CRC32C check")
+                        continue
+                    self.logger.debug(f"Successfully retrieved chunk from {server_address}")
+                    return chunk_response['data']
+            except Exception as e:
+                self.logger.error(f"Failed to retrieve chunk from {server_address}: {e}")
+
+        error_msg = f"Failed to retrieve chunk {chunk_id}"
+        self.logger.error(error_msg)
+        raise Exception(error_msg)
 
-    def list_files(self) -> List[str]:
-        """List all files in GFS."""
+    def list_files(self, prefix: Optional[str] = None) -> List[str]:
+        """List all files in GFS, or only those whose path starts with prefix."""
         self.logger.info("Listing all files in GFS")
-        with self._connect_to_master() as master_sock:
-            send_message(master_sock, {'command': 'list_files'})
-            response = receive_message(master_sock)
-            files = response['files']
-            self.logger.debug(f"Retrieved file list: {files}")
-            return files
+        message = {'command': 'list_files'}
+        if prefix:
+            message['prefix'] = prefix
+        response = self._master_rpc(message)
+        files = response['files']
+        self.logger.debug(f"Retrieved file list: {files}")
+        return files
 
     def append_to_file(self, gfs_path: str, data: bytes):
         """Append data to a file in GFS."""
         self.logger.info(f"Starting append operation to {gfs_path}")
         
-        # Get file metadata from master
-        with self._connect_to_master() as master_sock:
-            send_message(master_sock, {
-                'command': 'get_file_metadata',
-                'file_path': gfs_path
-            })
-            response = receive_message(master_sock)
-            if response['status'] != 'ok':
-                raise Exception(f"Failed to get file metadata: {response.get('message')}")
-            
-            metadata = response['metadata']
+        # Appends need the current last-chunk offset, never a cached one
+        metadata = self._get_file_metadata(gfs_path, max_age=0)
             
         # If file doesn't exist, create it
         if not metadata:
             self.logger.debug(f"File {gfs_path} doesn't exist, creating new file")
-            self.upload_file_from_bytes(data, gfs_path)
+            self._store_new_chunks(data, gfs_path, 0)
             return
         
-        # Get last chunk information
+        # Fill the last chunk first, then spill the rest into new chunks
         last_chunk_id = metadata.last_chunk_id
         last_chunk_offset = metadata.last_chunk_offset
+        view = memoryview(data)
+        first_fill = min(len(view), max(0, self.chunk_size - last_chunk_offset)) if last_chunk_id else 0
         
-        # Check if we need a new chunk
-        if last_chunk_offset + len(data) > self.chunk_size:
-            self.logger.debug("Data exceeds chunk size, creating new chunk")
-            # Create new chunk with the data
-            chunk_index = len(metadata.chunk_ids)
-            self.upload_file_from_bytes(data, gfs_path, chunk_index)
-        else:
-            # Append to existing chunk
-            self.logger.debug(f"Appending to existing chunk {last_chunk_id}")
-            self._append_to_chunk(gfs_path, last_chunk_id, data, last_chunk_offset)
-
-    def _append_to_chunk(self, file_path: str, chunk_id: str, data: bytes, offset: int):
+        if first_fill:
+            self.logger.debug(f"Appending {first_fill} bytes to existing chunk {last_chunk_id}")
+            self._append_to_chunk(gfs_path, last_chunk_id, view[:first_fill], last_chunk_offset,
+                                  metadata.chunk_locations.get(last_chunk_id, []))
+        if first_fill < len(view):
+            self.logger.debug("Data exceeds chunk size, creating new chunks")
+            self._store_new_chunks(view[first_fill:], gfs_path, len(metadata.chunk_ids))
+
+    def _store_new_chunks(self, data, gfs_path: str, first_index: int):
+        """Store data as new chunks of gfs_path starting at first_index, in batches per primary."""
+        available_servers = self._get_available_chunk_servers()
+        view = memoryview(data)
+        chunks = [
+            Chunk(view[off:off + self.chunk_size], gfs_path, first_index + i)
+            for i, off in enumerate(range(0, max(1, len(view)), self.chunk_size))
+        ]
+        batch_size = max(1, STORE_BATCH_BYTES // self.chunk_size)
+        try:
+            for start in range(0, len(chunks), batch_size):
+                self._store_chunk_batch(chunks[start:start + batch_size], available_servers)
+        finally:
+            self._forget_file_metadata(gfs_path)
+            # Drop the slices so the caller's buffer is free to resize or unmap
+            for chunk in chunks:
+                chunk.data.release()
+        self.logger.info(f"Stored {len(chunks)} new chunks of {gfs_path}")
+
+    def _append_to_chunk(self, file_path: str, chunk_id: str, data: bytes, offset: int,
+                         locations: List[str]):
         """Append data to an existing chunk using two-phase commit."""
-        # Get chunk locations
-        with self._connect_to_master() as master_sock:
-            send_message(master_sock, {
-                'command': 'get_chunk_locations',
-                'file_path': file_path,
-                'chunk_id': chunk_id
-            })
-            response = receive_message(master_sock)
-            locations = response['locations']
-        
         if not locations:
             raise Exception(f"No locations found for chunk {chunk_id}")
         
         # Execute two-phase commit
         success = self._two_phase_append(file_path, chunk_id, data, offset, locations)
         
-        if success:
-            # Update master with new offset
-            new_offset = offset + len(data)
-            with self._connect_to_master() as master_sock:
-                send_message(master_sock, {
+        try:
+            if success:
+                # Update master with new offset
+                new_offset = offset + len(data)
+                self._master_rpc({
                     'command': 'update_chunk_offset',
                     'file_path': file_path,
                     'chunk_id': chunk_id,
                     'offset': new_offset
                 })
-        else:
-            raise Exception("Failed to append data: two-phase commit failed")
+            else:
+                raise Exception("Failed to append data: two-phase commit failed")
+        finally:
+            self._forget_file_metadata(file_path)
 
     def _two_phase_append(self, file_path: str, chunk_id: str, data: bytes, offset: int, 
                          locations: List[str]) -> bool:
-        """Execute two-phase commit protocol for append operation."""
-        transaction_id = str(int(time.time() * 1000))
+        """Execute two-phase commit protocol for append operation.
+
+        The primary prepares first; the replicas then prepare, commit or roll
+        back concurrently, so each phase costs one round-trip, not one per replica.
+        Each phase's request is encoded once and the same frame goes to every server.
+        """
+        transaction_id = new_transaction_id()
+        prepare = encode_message({
+            'command': 'prepare_append',
+            'chunk_id': chunk_id,
+            'data': data,
+            'crc32c': payload_crc32c(data),
+            'offset': offset,
+            'transaction_id': transaction_id
+        })
+        rollback = encode_message({
+            'command': 'rollback_append',
+            'chunk_id': chunk_id,
+            'transaction_id': transaction_id
+        })
         
         GFSLogger.log_transaction(
             self.transaction_logger,
             transaction_id,
             "START",
-            f"Starting transaction for chunk {chunk_id}"
+            "Starting transaction for chunk %s", chunk_id
         )
         
         primary_server = locations[0]
@@ -319,9 +652,10 @@ class GFSClient:
             self.transaction_logger,
             transaction_id,
             "PREPARE",
-            f"Primary: {primary_server}, Replicas: {replica_servers}"
+            "Primary: %s, Replicas: %s", primary_server, replica_servers
         )
         
+        prepared_servers = []
         try:
             # Phase 1: Prepare
             GFSLogger.log_transaction(
@@ -330,92 +664,17 @@ class GFSClient:
                 "PREPARE",
                 "📝 PHASE 1: PREPARE - Starting prepare phase"
             )
-            prepared_servers = []
             
             # Prepare primary
-            try:
-                with self._connect_to_chunk_server(primary_server) as primary_sock:
-                    GFSLogger.log_transaction(
-                        self.transaction_logger,
-                        transaction_id,
-                        "PREPARE",
-                        f"Sending prepare request to primary {primary_server}"
-                    )
-                    send_message(primary_sock, {
-                        'command': 'prepare_append',
-                        'chunk_id': chunk_id,
-                        'data': data,
-                        'offset': offset,
-                        'transaction_id': transaction_id
-                    })
-                    response = receive_message(primary_sock)
-                    if response['status'] == 'ok':
-                        prepared_servers.append(primary_server)
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "PREPARE",
-                            f"✅ Primary {primary_server} prepared successfully"
-                        )
-                    else:
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "PREPARE",
-                            f"❌ Primary {primary_server} failed to prepare"
-                        )
-                        raise Exception(f"Primary server failed to prepare: {response.get('message')}")
-            except Exception as e:
-                GFSLogger.log_transaction(
-                    self.transaction_logger,
-                    transaction_id,
-                    "PREPARE",
-                    f"Failed to prepare primary: {e}"
-                )
+            if not self._prepare_append_on(primary_server, "Primary", prepare, transaction_id):
                 return False
+            prepared_servers.append(primary_server)
             
-            # Prepare replicas
-            for replica in replica_servers:
-                try:
-                    with self._connect_to_chunk_server(replica) as replica_sock:
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "PREPARE",
-                            f"Sending prepare request to replica {replica}"
-                        )
-                        send_message(replica_sock, {
-                            'command': 'prepare_append',
-                            'chunk_id': chunk_id,
-                            'data': data,
-                            'offset': offset,
-                            'transaction_id': transaction_id
-                        })
-                        response = receive_message(replica_sock)
-                        if response['status'] == 'ok':
-                            prepared_servers.append(replica)
-                            GFSLogger.log_transaction(
-                                self.transaction_logger,
-                                transaction_id,
-                                "PREPARE",
-                                f"✅ Replica {replica} prepared successfully"
-                            )
-                        else:
-                            GFSLogger.log_transaction(
-                                self.transaction_logger,
-                                transaction_id,
-                                "PREPARE",
-                                f"❌ Replica {replica} failed to prepare"
-                            )
-                            raise Exception(f"Replica server failed to prepare: {response.get('message')}")
-                except Exception as e:
-                    GFSLogger.log_transaction(
-                        self.transaction_logger,
-                        transaction_id,
-                        "PREPARE",
-                        f"Failed to prepare replica {replica}: {e}"
-                    )
-                    break
+            # Prepare replicas, stopping early once any of them fails
+            prepared_servers += self._fan_out(
+                replica_servers, self._prepare_append_on, "Replica", prepare, transaction_id,
+                fail_fast=True
+            )
             
             # Phase 2: Commit or Rollback
             if len(prepared_servers) == len(locations):
@@ -426,39 +685,14 @@ class GFSClient:
                     "COMMIT",
                     "📝 PHASE 2: COMMIT - All servers prepared, starting commit phase"
                 )
-                committed_servers = []
-                
-                for server in prepared_servers:
-                    try:
-                        with self._connect_to_chunk_server(server) as server_sock:
-                            GFSLogger.log_transaction(
-                                self.transaction_logger,
-                                transaction_id,
-                                "COMMIT",
-                                f"Sending commit request to {server}"
-                            )
-                            send_message(server_sock, {
-                                'command': 'commit_append',
-                                'chunk_id': chunk_id,
-                                'transaction_id': transaction_id
-                            })
-                            response = receive_message(server_sock)
-                            if response['status'] == 'ok':
-                                committed_servers.append(server)
-                                GFSLogger.log_transaction(
-                                    self.transaction_logger,
-                                    transaction_id,
-                                    "COMMIT",
-                                    f"✅ Server {server} committed successfully"
-                                )
-                    except Exception as e:
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "COMMIT",
-                            f"Failed to commit on server {server}: {e}"
-                        )
-                        break
+                commit = encode_message({
+                    'command': 'commit_append',
+                    'chunk_id': chunk_id,
+                    'transaction_id': transaction_id
+                })
+                committed_servers = self._fan_out(
+                    prepared_servers, self._commit_append_on, commit, transaction_id
+                )
                 
                 success = len(committed_servers) == len(locations)
                 if success:
@@ -485,34 +719,7 @@ class GFSClient:
                     "ROLLBACK",
                     "⚠️ Not all servers prepared, initiating rollback"
                 )
-                for server in prepared_servers:
-                    try:
-                        with self._connect_to_chunk_server(server) as server_sock:
-                            GFSLogger.log_transaction(
-                                self.transaction_logger,
-                                transaction_id,
-                                "ROLLBACK",
-                                f"Sending rollback request to {server}"
-                            )
-                            send_message(server_sock, {
-                                'command': 'rollback_append',
-                                'chunk_id': chunk_id,
-                                'transaction_id': transaction_id
-                            })
-                            GFSLogger.log_transaction(
-                                self.transaction_logger,
-                                transaction_id,
-                                "ROLLBACK",
-                                f"✅ Rollback successful on {server}"
-                            )
-                    except Exception as e:
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "ROLLBACK",
-                            f"Failed to rollback on server {server}: {e}"
-                        )
-                
+                self._fan_out(prepared_servers, self._rollback_append_on, rollback, transaction_id)
                 return False
                 
         except Exception as e:
@@ -520,31 +727,116 @@ class GFSClient:
                 self.transaction_logger,
                 transaction_id,
                 "ROLLBACK",
-                f"Two-phase commit failed: {e}",
-                exc_info=True
+                "Two-phase commit failed: %s", e
             )
             # Attempt rollback
-            for server in prepared_servers:
-                try:
-                    with self._connect_to_chunk_server(server) as server_sock:
-                        GFSLogger.log_transaction(
-                            self.transaction_logger,
-                            transaction_id,
-                            "ROLLBACK",
-                            f"Sending rollback request to {server}"
-                        )
-                        send_message(server_sock, {
-                            'command': 'rollback_append',
-                            'chunk_id': chunk_id,
-                            'transaction_id': transaction_id
-                        })
-                except Exception as rollback_error:
-                    GFSLogger.log_transaction(
-                        self.transaction_logger,
-                        transaction_id,
-                        "ROLLBACK",
-                        f"Failed to rollback on server {server}: {rollback_error}"
-                    )
+            self._fan_out(prepared_servers, self._rollback_append_on, rollback, transaction_id)
+            return False
+
+    def _fan_out(self, servers: List[str], call, *args, fail_fast: bool = False) -> List[str]:
+        """Run call(server, *args) for every server concurrently and return those it succeeded on.
+
+        With fail_fast, calls that haven't started yet are cancelled after the first failure.
+        """
+        if not servers:
+            return []
+        succeeded = []
+        futures = {self._rpc_executor.submit(call, server, *args): server for server in servers}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue  # Never ran, so there's nothing of it to undo
+            if future.result():
+                succeeded.append(futures[future])
+            elif fail_fast:
+                for pending in futures:
+                    pending.cancel()
+        return succeeded
+
+    def _prepare_append_on(self, server: str, role: str, request: List, transaction_id: str) -> bool:
+        """Send one server the prepare request of an append; role labels it in the transaction log."""
+        try:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "PREPARE",
+                "Sending prepare request to %s %s", role.lower(), server
+            )
+            response = self._chunk_server_rpc(server, request)
+            if response['status'] != 'ok':
+                GFSLogger.log_transaction(
+                    self.transaction_logger,
+                    transaction_id,
+                    "PREPARE",
+                    "❌ %s %s failed to prepare", role, server
+                )
+                raise Exception(f"{role} server failed to prepare: {response.get('message')}")
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "PREPARE",
+                "✅ %s %s prepared successfully", role, server
+            )
+            return True
+        except Exception as e:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "PREPARE",
+                "Failed to prepare %s %s: %s", role.lower(), server, e
+            )
+            return False
+
+    def _commit_append_on(self, server: str, request: List, transaction_id: str) -> bool:
+        """Send one server the commit request of a prepared append."""
+        try:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "COMMIT",
+                "Sending commit request to %s", server
+            )
+            response = self._chunk_server_rpc(server, request)
+            if response['status'] == 'ok':
+                GFSLogger.log_transaction(
+                    self.transaction_logger,
+                    transaction_id,
+                    "COMMIT",
+                    "✅ Server %s committed successfully", server
+                )
+                return True
+        except Exception as e:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "COMMIT",
+                "Failed to commit on server %s: %s", server, e
+            )
+        return False
+
+    def _rollback_append_on(self, server: str, request: List, transaction_id: str) -> bool:
+        """Send one server the rollback request of a prepared append."""
+        try:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "ROLLBACK",
+                "Sending rollback request to %s", server
+            )
+            self._chunk_server_rpc(server, request)
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "ROLLBACK",
+                "✅ Rollback successful on %s", server
+            )
+            return True
+        except Exception as e:
+            GFSLogger.log_transaction(
+                self.transaction_logger,
+                transaction_id,
+                "ROLLBACK",
+                "Failed to rollback on server %s: %s", server, e
+            )
             return False
 
     def upload_file_from_bytes(self, data: bytes, gfs_path: str, chunk_index: int = 0):
@@ -565,6 +857,7 @@ class GFSClient:
         
         # Store chunk
         success_server = self._store_chunk_with_fallback(chunk, available_servers)
+        self._forget_file_metadata(gfs_path)
         
         if not success_server:
             self.logger.error(f"Failed to store chunk {chunk.chunk_id} on any server")
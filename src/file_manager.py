@@ -1,16 +1,35 @@
+import atexit
+import copy
+import itertools
+import logging
 import os
-from typing import List, Dict, Set
-import json
-from dataclasses import dataclass, asdict
+import sys
+import time
+from typing import List, Dict, Optional, Set, Tuple
+import orjson
+from dataclasses import dataclass, fields
 import threading
 from .logger import GFSLogger
 
-@dataclass
+# Default for how long mutations are coalesced before they are appended to the metadata log
+FLUSH_DELAY = 0.1
+# Number of changes that ends a coalescing window early, so bursts don't pile
+# up a whole interval's worth of records behind the flusher
+FLUSH_BATCH = 256
+# Log size, and record count, past which it is folded into a fresh snapshot
+METADATA_LOG_LIMIT = 16 * 1024 * 1024
+METADATA_LOG_RECORDS = 100000
+# Number of lock shards guarding per-file metadata (a power of two)
+METADATA_LOCK_SHARDS = 64
+# Slotted metadata objects are smaller and quicker for orjson to walk (Python 3.10+)
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
 class FileMetadata:
     file_path: str
     total_size: int
     chunk_ids: List[str]
-    chunk_locations: Dict[str, List[str]]  # chunk_id -> list of chunk server addresses
+    chunk_locations: Dict[str, Tuple[str, ...]]  # chunk_id -> chunk server addresses
     chunk_offsets: Dict[str, int]  # chunk_id -> offset within chunk
     last_chunk_id: str  # ID of the last chunk for appends
     last_chunk_offset: int  # Current offset in the last chunk
@@ -19,6 +38,61 @@ class FileMetadata:
     def __post_init__(self):
         if self.pending_replication is None:
             self.pending_replication = {}
+        self.chunk_locations = {chunk_id: _replica_set(locations)
+                                for chunk_id, locations in self.chunk_locations.items()}
+
+
+# Distinct replica sets seen so far; chunks placed on the same servers share
+# one tuple. Cleared if it ever grows past REPLICA_SET_CACHE entries
+_replica_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+REPLICA_SET_CACHE = 65536
+
+
+def _replica_set(locations) -> Tuple[str, ...]:
+    """Store a chunk's locations as a tuple of interned addresses.
+
+    Every file repeats the same few server addresses, so interning shares one
+    string per server, and a tuple has no spare capacity to carry. Loading a
+    large catalog mostly hits the cache, skipping the interning entirely.
+    """
+    key = tuple(locations)
+    shared = _replica_sets.get(key)
+    if shared is None:
+        if len(_replica_sets) >= REPLICA_SET_CACHE:
+            _replica_sets.clear()
+        shared = _replica_sets.setdefault(key, tuple(map(sys.intern, key)))
+    return shared
+
+# On disk a FileMetadata is a row of its field values in this order, so the
+# field names are written once per snapshot rather than once per file
+METADATA_FIELDS = tuple(field.name for field in fields(FileMetadata))
+
+
+def _metadata_from_row(row, names=METADATA_FIELDS) -> FileMetadata:
+    """Rebuild FileMetadata from a packed row, or from a keyed dict written by older versions."""
+    if isinstance(row, dict):
+        return FileMetadata(**row)
+    if names is METADATA_FIELDS:
+        return FileMetadata(*row)
+    return FileMetadata(**dict(zip(names, row)))
+
+def _snapshot(metadata: FileMetadata) -> FileMetadata:
+    """Copy metadata deeply enough that later in-place updates don't show through."""
+    snapshot = copy.copy(metadata)
+    snapshot.chunk_ids = list(metadata.chunk_ids)
+    # Location tuples are never mutated, only replaced, so they can be shared
+    snapshot.chunk_locations = dict(metadata.chunk_locations)
+    snapshot.chunk_offsets = dict(metadata.chunk_offsets)
+    snapshot.pending_replication = dict(metadata.pending_replication)
+    return snapshot
+
+def _append_to(metadata: FileMetadata, chunk_id: str, size: int):
+    """Add a chunk holding size bytes to the end of a file's metadata."""
+    metadata.chunk_ids.append(chunk_id)
+    metadata.chunk_offsets[chunk_id] = size
+    metadata.last_chunk_id = chunk_id
+    metadata.last_chunk_offset = size
+    metadata.total_size += size
 
 class FileManager:
     def __init__(self, metadata_dir: str, config: Dict):
@@ -26,46 +100,333 @@ class FileManager:
         self.logger.info(f"Initializing FileManager with metadata directory: {metadata_dir}")
         
         self.metadata_dir = metadata_dir
-        self.metadata_lock = threading.Lock()
+        # Files hash onto a fixed set of reentrant locks, so work on unrelated
+        # files runs in parallel; the files dict itself is only ever touched by
+        # single GIL-atomic operations. A file's FileMetadata is updated in
+        # place under its lock, so whole-file readers copy it under the lock;
+        # a chunk's locations are a tuple replaced whole, so reading one
+        # takes no lock
+        self._shard_locks = [threading.RLock() for _ in range(METADATA_LOCK_SHARDS)]
         self.files: Dict[str, FileMetadata] = {}
+        # Per file, the metadata object it was built for and chunk_id -> first
+        # index in its chunk list; entries are checked before use and rebuilt
+        # when stale, so mutations elsewhere never have to maintain them
+        self._chunk_positions: Dict[str, Tuple[FileMetadata, Dict[str, int]]] = {}
+        # Per file, the metadata object, the total_size record_chunk last
+        # derived from its chunk offsets, and how many slots of the chunk list
+        # hold each chunk id; used while the object and size still match
+        self._summed_sizes: Dict[str, Tuple[FileMetadata, int, Dict[str, int]]] = {}
+        # Changes whenever a path is added to or dropped from files, so callers
+        # can cache anything derived from the file listing
+        self._namespace_versions = itertools.count(1)
+        self.namespace_version = 0
+        # Per file, a number that changes each time its metadata is marked
+        # changed, so callers can cache anything derived from one file
+        self._file_version_counter = itertools.count(1)
+        self._file_versions: Dict[str, int] = {}
+        # When each file was last marked changed; files untouched since startup
+        # count as changed at startup
+        self._file_changed_at: Dict[str, float] = {}
+        self._started_at = time.time()
         self.config = config
-        self.logger.debug(f"Initialized with config: {config}")
+        self.logger.debug("Initialized with config: %s", config)
+
+        # Persistence is a snapshot (metadata.json) plus an append-only log of
+        # whole-file records (metadata.log), each tagged with a sequence number
+        self._snapshot_file = os.path.join(metadata_dir, 'metadata.json')
+        self._log_path = os.path.join(metadata_dir, 'metadata.log')
+        self._seq = 0
+        self._log_records = 0
+        # Log records are handed to the OS on every flush but only fsynced once
+        # this many have accumulated ([master] metadata_fsync_batch); explicit
+        # flush() calls, such as at shutdown, always fsync
+        self._fsync_batch = max(1, config['master'].get('metadata_fsync_batch', 1))
+        self._unsynced = 0
+        # Indented snapshots with named fields for reading by hand
+        # ([master] metadata_pretty); larger and slower to write
+        self._pretty = config['master'].get('metadata_pretty', False)
+        # Each file's packed metadata row as of its last log record, so
+        # compaction only encodes files it has never seen rather than all
+        self._serialized: Dict[str, bytes] = {}
         self._load_metadata()
+        self._log_file = open(self._log_path, 'ab')
+
+        # Mutations only mark their file dirty, in a set per lock shard guarded
+        # by the shard lock they already hold; a flusher thread logs every
+        # dirty file at most once per [master] metadata_flush_interval seconds
+        # however many changes piled up
+        self._dirty = threading.Event()
+        self._dirty_shards: List[Set[str]] = [set() for _ in range(METADATA_LOCK_SHARDS)]
+        # Chunks appended to a file since it was last logged, per shard likewise.
+        # A file that only grew is logged as just those chunks rather than its
+        # whole row; any other change folds them into a full record
+        self._append_shards: List[Dict[str, List[Tuple[str, int]]]] = [{} for _ in range(METADATA_LOCK_SHARDS)]
+        self._write_lock = threading.Lock()
+        self._flush_interval = config['master'].get('metadata_flush_interval', FLUSH_DELAY)
+        # Changes marked since the dirty sets were last taken; approximate, as
+        # it only decides when to cut a window short
+        self._pending_changes = 0
+        self._flush_now = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
 
     def _load_metadata(self):
-        """Load metadata from disk."""
+        """Load the snapshot from disk, then replay the log written since."""
         self.logger.info("Loading metadata from disk")
         os.makedirs(self.metadata_dir, exist_ok=True)
-        metadata_file = os.path.join(self.metadata_dir, 'metadata.json')
         
-        if os.path.exists(metadata_file):
-            self.logger.debug(f"Reading metadata from {metadata_file}")
-            with open(metadata_file, 'r') as f:
-                data = json.load(f)
+        if os.path.exists(self._snapshot_file):
+            self.logger.debug("Reading metadata from %s", self._snapshot_file)
+            with open(self._snapshot_file, 'rb') as f:
+                data = orjson.loads(f.read())
+            if isinstance(data.get('seq'), int) and 'files' in data:
+                self._seq, data = data['seq'], data['files']
+            if isinstance(data, list):
+                names = tuple(data[0]) if data else METADATA_FIELDS
+                if names == METADATA_FIELDS:
+                    names = METADATA_FIELDS
+                self.files = {}
+                for row in data[1:]:
+                    metadata = _metadata_from_row(row, names)
+                    self.files[metadata.file_path] = metadata
+            else:
                 self.files = {
-                    path: FileMetadata(**metadata)
+                    path: _metadata_from_row(metadata)
                     for path, metadata in data.items()
                 }
             self.logger.info(f"Loaded metadata for {len(self.files)} files")
         else:
             self.logger.info("No existing metadata file found, starting fresh")
 
-    def _save_metadata(self):
-        """Save metadata to disk."""
-        self.logger.debug("Saving metadata to disk")
-        metadata_file = os.path.join(self.metadata_dir, 'metadata.json')
-        with open(metadata_file, 'w') as f:
-            json.dump({
-                path: asdict(metadata)
-                for path, metadata in self.files.items()
-            }, f, indent=2)
-        self.logger.debug(f"Saved metadata for {len(self.files)} files")
+        if os.path.exists(self._log_path):
+            self._replay_log()
+
+    def _replay_log(self):
+        """Apply log records newer than the snapshot, dropping a torn final record."""
+        with open(self._log_path, 'rb') as f:
+            log = f.read()
+        good_length = replayed = 0
+        for line in log.splitlines(keepends=True):
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                break
+            good_length += len(line)
+            self._log_records += 1
+            if record['seq'] <= self._seq:
+                continue
+            self._seq = record['seq']
+            if record['op'] == 'put':
+                self.files[record['path']] = _metadata_from_row(record['metadata'])
+            elif record['op'] == 'append':
+                metadata = self.files.get(record['path'])
+                if metadata is not None:
+                    for chunk_id, size in record['chunks']:
+                        _append_to(metadata, chunk_id, size)
+            else:
+                self.files.pop(record['path'], None)
+            replayed += 1
+        if good_length < len(log):
+            self.logger.warning(f"Discarding {len(log) - good_length} bytes of torn metadata log")
+            os.truncate(self._log_path, good_length)
+        self.logger.info(f"Replayed {replayed} metadata log records")
+
+    @staticmethod
+    def _shard(file_path: str) -> int:
+        return hash(file_path) & (METADATA_LOCK_SHARDS - 1)
+
+    def _lock(self, file_path: str) -> threading.RLock:
+        """Return the lock shard guarding a file's metadata."""
+        return self._shard_locks[self._shard(file_path)]
+
+    def _save_metadata(self, file_path: str = None):
+        """Mark a file's metadata (all files if none given) as changed for the flusher thread."""
+        if file_path is None:
+            for path in list(self.files):
+                self._save_metadata(path)
+            return
+        shard = self._shard(file_path)
+        with self._shard_locks[shard]:
+            # The full record will cover any appends still pending
+            self._append_shards[shard].pop(file_path, None)
+            self._dirty_shards[shard].add(file_path)
+            self._mark_changed(file_path)
+        self._wake_flusher()
+
+    def _mark_changed(self, file_path: str):
+        """Give a file a new version and change time; called with its shard lock held."""
+        self._file_versions[file_path] = next(self._file_version_counter)
+        self._file_changed_at[file_path] = time.time()
+
+    def _wake_flusher(self):
+        self._pending_changes += 1
+        if self._pending_changes >= FLUSH_BATCH:
+            self._flush_now.set()
+        self._dirty.set()
+
+    def file_version(self, file_path: str) -> int:
+        """Return the current version of a file's metadata; read it before the metadata it guards."""
+        return self._file_versions.get(file_path, 0)
+
+    def file_changed_at(self, file_path: str) -> float:
+        """Return when a file's metadata last changed (startup time if not since)."""
+        return self._file_changed_at.get(file_path, self._started_at)
+
+    def _take_dirty_paths(self) -> Tuple[Set[str], Dict[str, List[Tuple[str, int]]]]:
+        """Collect and reset every shard's dirty set and pending appends."""
+        # Clear first: a file marked after its shard is swapped sets the event again
+        self._dirty.clear()
+        self._flush_now.clear()
+        self._pending_changes = 0
+        paths = set()
+        appends = {}
+        for shard, lock in enumerate(self._shard_locks):
+            if self._dirty_shards[shard] or self._append_shards[shard]:
+                with lock:
+                    paths |= self._dirty_shards[shard]
+                    self._dirty_shards[shard] = set()
+                    appends.update(self._append_shards[shard])
+                    self._append_shards[shard] = {}
+        return paths, appends
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._dirty.wait()
+            if self._closed:
+                return
+            self._flush_now.wait(self._flush_interval)
+            try:
+                self.flush(durable=False)
+            except Exception as e:
+                self.logger.error(f"Failed to flush metadata: {e}", exc_info=True)
+
+    def flush(self, durable: bool = True):
+        """Append pending metadata changes to the log, fsyncing it now if durable.
+
+        Otherwise the fsync waits for a full metadata_fsync_batch of records.
+        """
+        with self._write_lock:
+            if self._log_file.closed:
+                return
+            paths, appends = self._take_dirty_paths()
+            if not paths and not appends:
+                if durable and self._unsynced:
+                    os.fsync(self._log_file.fileno())
+                    self._unsynced = 0
+                return
+            records = []
+            for path in paths:
+                self._seq += 1
+                shard = self._shard(path)
+                with self._shard_locks[shard]:
+                    metadata = self.files.get(path)
+                    encoded = None if metadata is None else self._encode_row(metadata)
+                    # Chunks appended since the sets were taken are in this row
+                    self._append_shards[shard].pop(path, None)
+                if encoded is None:
+                    self._serialized.pop(path, None)
+                    records.append(b'{"seq":%d,"op":"del","path":%s}\n' % (self._seq, self._encode(path)))
+                else:
+                    self._serialized[path] = encoded
+                    records.append(b'{"seq":%d,"op":"put","path":%s,"metadata":%s}\n'
+                                   % (self._seq, self._encode(path), encoded))
+            for path, chunks in appends.items():
+                self._seq += 1
+                # The cached row is now behind; compaction encodes the file afresh
+                self._serialized.pop(path, None)
+                records.append(b'{"seq":%d,"op":"append","path":%s,"chunks":%s}\n'
+                               % (self._seq, self._encode(path), self._encode(chunks)))
+            self._log_file.write(b''.join(records))
+            self._log_file.flush()
+            self._log_records += len(records)
+            self._unsynced += len(records)
+            if durable or self._unsynced >= self._fsync_batch:
+                os.fsync(self._log_file.fileno())
+                self._unsynced = 0
+            self.logger.debug("Logged metadata for %s files", len(records))
+
+            if self._log_file.tell() > METADATA_LOG_LIMIT or self._log_records > METADATA_LOG_RECORDS:
+                self._compact()
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        """Compact JSON encoding of a path or FileMetadata; orjson serialises dataclasses natively."""
+        return orjson.dumps(value)
+
+    @staticmethod
+    def _encode_row(metadata: FileMetadata) -> bytes:
+        """Encode FileMetadata as a JSON array of its field values, in METADATA_FIELDS order."""
+        return orjson.dumps([getattr(metadata, name) for name in METADATA_FIELDS])
+
+    def close(self):
+        """Stop the flusher thread, then make every pending change durable and close the log."""
+        if self._closed:
+            return
+        self._closed = True
+        self._dirty.set()
+        self._flush_now.set()
+        self._flusher.join()
+        self.flush()
+        self._log_file.close()
+
+    def _compact(self):
+        """Fold the log into a fresh snapshot, then empty the log (caller holds _write_lock).
+
+        Files already logged reuse their cached encoding; only files loaded
+        from the previous snapshot and never changed since are encoded here.
+        """
+        files = [self._encode(METADATA_FIELDS)]
+        for path, metadata in list(self.files.items()):
+            encoded = self._serialized.get(path)
+            if encoded is None:
+                shard = self._shard(path)
+                with self._shard_locks[shard]:
+                    encoded = self._serialized[path] = self._encode_row(metadata)
+                    # Appends not logged yet are in this row, so replaying them
+                    # on top would add them twice; log a full record instead
+                    if self._append_shards[shard].pop(path, None) is not None:
+                        self._dirty_shards[shard].add(path)
+                        self._dirty.set()
+            files.append(encoded)
+        # files is a header row of field names followed by one row per file
+        snapshot = b'{"seq":%d,"files":[%s]}' % (self._seq, b','.join(files))
+        if self._pretty:
+            rows = orjson.loads(snapshot)['files'][1:]
+            snapshot = orjson.dumps({'seq': self._seq,
+                                     'files': {row[0]: dict(zip(METADATA_FIELDS, row)) for row in rows}},
+                                    option=orjson.OPT_INDENT_2)
+        temp_file = self._snapshot_file + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self._snapshot_file)
+        # The rename must be durable before the log it replaces is emptied,
+        # or a crash could bring back the old snapshot with no log to replay
+        self._sync_metadata_dir()
+        # Records the snapshot already covers are skipped by sequence number on
+        # replay, so a crash before this truncate loses nothing
+        os.ftruncate(self._log_file.fileno(), 0)
+        self._log_file.seek(0)
+        self._log_records = self._unsynced = 0
+        self.logger.info(f"Compacted metadata log into a snapshot of {len(files) - 1} files")
+
+    def _sync_metadata_dir(self):
+        """Flush the metadata directory so the snapshot rename survives a crash."""
+        dir_fd = os.open(self.metadata_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
     def add_file(self, file_path: str, total_size: int, chunk_ids: List[str]):
         """Add a new file to the metadata."""
-        self.logger.info(f"Adding new file: {file_path}")
+        self.logger.info("Adding new file: %s", file_path)
         
-        with self.metadata_lock:
+        with self._lock(file_path):
+            is_new = file_path not in self.files
             self.files[file_path] = FileMetadata(
                 file_path=file_path,
                 total_size=total_size,
@@ -75,85 +436,205 @@ class FileManager:
                 last_chunk_id=chunk_ids[-1] if chunk_ids else None,
                 last_chunk_offset=total_size % self.config['master']['chunk_size']
             )
-            self._save_metadata()
-            self.logger.info(f"Successfully added file {file_path}")
+            if is_new:
+                self.namespace_version = next(self._namespace_versions)
+            self._save_metadata(file_path)
+            self.logger.info("Successfully added file %s", file_path)
 
     def update_file_metadata(self, file_path: str, chunk_id: str, locations: List[str], size: int):
         """Update file metadata with new chunk information."""
-        with self.metadata_lock:
+        with self._lock(file_path):
             if file_path not in self.files:
                 self.add_file(file_path, size, [chunk_id])
             else:
                 metadata = self.files[file_path]
                 if chunk_id not in metadata.chunk_ids:
                     metadata.chunk_ids.append(chunk_id)
-                metadata.chunk_locations[chunk_id] = locations
+                    self._summed_sizes.pop(file_path, None)
+                metadata.chunk_locations[chunk_id] = _replica_set(locations)
                 metadata.total_size += size
                 metadata.last_chunk_id = chunk_id
                 metadata.last_chunk_offset = size
-            self._save_metadata()
+            self._save_metadata(file_path)
+
+    def append_chunk(self, file_path: str, chunk_id: str, size: int):
+        """Append a chunk holding size bytes to the end of a file, creating the file if needed."""
+        shard = self._shard(file_path)
+        with self._shard_locks[shard]:
+            metadata = self.files.get(file_path)
+            if metadata is None:
+                self.add_file(file_path, size, [chunk_id])
+                return
+            _append_to(metadata, chunk_id, size)
+            self._summed_sizes.pop(file_path, None)
+            # Logged as just this chunk unless a full record is already due
+            if file_path not in self._dirty_shards[shard]:
+                self._append_shards[shard].setdefault(file_path, []).append((chunk_id, size))
+            self._mark_changed(file_path)
+        self._wake_flusher()
+
+    def record_chunk(self, file_path: str, chunk_id: str, chunk_index: int,
+                     locations: List[str], size: int, pending_replicas: int = 0):
+        """Place a stored chunk at its index in the file, creating the file if needed.
+
+        A positive pending_replicas marks the chunk as still needing that many
+        more copies, in the same locked update and metadata save.
+        """
+        with self._lock(file_path):
+            metadata = self.files.get(file_path)
+            if metadata is None:
+                metadata = FileMetadata(
+                    file_path=file_path,
+                    total_size=0,
+                    chunk_ids=[],
+                    chunk_locations={},
+                    chunk_offsets={},
+                    last_chunk_id=None,
+                    last_chunk_offset=0
+                )
+                self.files[file_path] = metadata
+                self.namespace_version = next(self._namespace_versions)
+
+            # Chunks of one upload may arrive out of order, so pad up to the index
+            if chunk_index is None:
+                chunk_index = len(metadata.chunk_ids)
+            if chunk_index >= len(metadata.chunk_ids):
+                metadata.chunk_ids.extend([None] * (chunk_index + 1 - len(metadata.chunk_ids)))
+            # total_size is the sum of the offsets of every slot in the chunk
+            # list. It is adjusted by this slot's change in O(1) while the
+            # per-id slot counts are current, and re-summed otherwise, such as
+            # the first time a file is recorded into after add_file
+            summed = self._summed_sizes.get(file_path)
+            if summed is None or summed[0] is not metadata or summed[1] != metadata.total_size:
+                counts = {}
+                for cid in metadata.chunk_ids:
+                    if cid is not None:
+                        counts[cid] = counts.get(cid, 0) + 1
+                total = sum(metadata.chunk_offsets.get(cid, 0) * count for cid, count in counts.items())
+            else:
+                total, counts = summed[1], summed[2]
+            offsets = metadata.chunk_offsets
+            replaced = metadata.chunk_ids[chunk_index]
+            if replaced is not None:
+                total -= offsets.get(replaced, 0)
+                counts[replaced] -= 1
+            # Every other slot holding this id takes the new size too
+            total += (size - offsets.get(chunk_id, 0)) * counts.get(chunk_id, 0) + size
+            counts[chunk_id] = counts.get(chunk_id, 0) + 1
+            metadata.chunk_ids[chunk_index] = chunk_id
+            metadata.chunk_locations[chunk_id] = _replica_set(locations)
+            offsets[chunk_id] = size
+            metadata.total_size = total
+            self._summed_sizes[file_path] = (metadata, total, counts)
+            metadata.last_chunk_id = metadata.chunk_ids[-1]
+            metadata.last_chunk_offset = metadata.chunk_offsets.get(metadata.last_chunk_id, 0)
+            if pending_replicas > 0:
+                metadata.pending_replication[chunk_id] = pending_replicas
+            self._save_metadata(file_path)
+            return metadata
 
     def update_chunk_locations(self, file_path: str, chunk_id: str, locations: List[str]):
         """Update the locations of a chunk."""
-        self.logger.debug(f"Updating chunk locations for {file_path}, chunk: {chunk_id}")
-        self.logger.debug(f"New locations: {locations}")
+        self.logger.debug("Updating chunk locations for %s, chunk: %s", file_path, chunk_id)
+        self.logger.debug("New locations: %s", locations)
         
-        with self.metadata_lock:
+        with self._lock(file_path):
             if file_path in self.files:
-                self.files[file_path].chunk_locations[chunk_id] = locations
-                self._save_metadata()
+                self.files[file_path].chunk_locations[chunk_id] = _replica_set(locations)
+                self._save_metadata(file_path)
                 self.logger.debug("Successfully updated chunk locations")
             else:
                 self.logger.warning(f"Attempted to update locations for non-existent file: {file_path}")
 
-    def get_chunk_locations(self, file_path: str, chunk_id: str) -> List[str]:
+    def get_chunk_locations(self, file_path: str, chunk_id: str) -> Tuple[str, ...]:
         """Get the locations of a chunk."""
-        self.logger.debug(f"Getting chunk locations for {file_path}, chunk: {chunk_id}")
-        with self.metadata_lock:
-            if file_path in self.files:
-                locations = self.files[file_path].chunk_locations.get(chunk_id, [])
-                self.logger.debug(f"Found locations: {locations}")
-                return locations
+        self.logger.debug("Getting chunk locations for %s, chunk: %s", file_path, chunk_id)
+        metadata = self.files.get(file_path)
+        if metadata is not None:
+            locations = metadata.chunk_locations.get(chunk_id, ())
+            self.logger.debug("Found locations: %s", locations)
+            return locations
+        self.logger.warning(f"Requested locations for non-existent file: {file_path}")
+        return ()
+
+    def get_chunk_locations_bulk(self, file_path: str, chunk_ids: List[str]) -> Dict[str, Tuple[str, ...]]:
+        """Get the locations of several chunks of a file in one call."""
+        self.logger.debug("Getting locations for %s chunks of %s", len(chunk_ids), file_path)
+        metadata = self.files.get(file_path)
+        if metadata is None:
             self.logger.warning(f"Requested locations for non-existent file: {file_path}")
-            return []
+            return {}
+        locations = metadata.chunk_locations
+        return {chunk_id: locations.get(chunk_id, ()) for chunk_id in chunk_ids}
+
+    def _chunk_index(self, file_path: str, metadata: FileMetadata, chunk_id: str) -> int:
+        """Return the index of chunk_id in a file's chunk list in O(1), rebuilding the position map if stale.
+
+        Caller holds the file's lock. Raises ValueError if the chunk is not in the file.
+        """
+        cached = self._chunk_positions.get(file_path)
+        if cached is not None and cached[0] is metadata:
+            index = cached[1].get(chunk_id)
+            if index is not None and index < len(metadata.chunk_ids) and metadata.chunk_ids[index] == chunk_id:
+                return index
+        positions = {}
+        for index, cid in enumerate(metadata.chunk_ids):
+            positions.setdefault(cid, index)
+        self._chunk_positions[file_path] = (metadata, positions)
+        if chunk_id not in positions:
+            raise ValueError(f"Chunk {chunk_id} is not part of {file_path}")
+        return positions[chunk_id]
 
-    def list_files(self) -> List[str]:
-        """List all files in the system."""
+    def list_files(self, prefix: Optional[str] = None) -> List[str]:
+        """List all files in the system, or only those whose path starts with prefix."""
         self.logger.debug("Listing all files")
-        with self.metadata_lock:
-            files = list(self.files.keys())
-            self.logger.debug(f"Found {len(files)} files: {files}")
-            return files
-
-    def get_file_metadata(self, file_path: str) -> FileMetadata:
-        """Get metadata for a specific file."""
-        self.logger.debug(f"Getting metadata for file: {file_path}")
-        with self.metadata_lock:
+        files = list(self.files)
+        if prefix:
+            files = [path for path in files if path.startswith(prefix)]
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Found %s files: %r", len(files), files)
+        return files
+
+    def get_file_metadata(self, file_path: str) -> Optional[FileMetadata]:
+        """Get a consistent copy of a file's metadata, or None if there is no such file."""
+        self.logger.debug("Getting metadata for file: %s", file_path)
+        with self._lock(file_path):
             metadata = self.files.get(file_path)
-            if metadata:
-                self.logger.debug(f"Found metadata: {metadata}")
-            else:
-                self.logger.warning(f"No metadata found for file: {file_path}")
-            return metadata
+            if metadata is not None:
+                metadata = _snapshot(metadata)
+        if metadata:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Found metadata: %r", metadata)
+        else:
+            self.logger.warning(f"No metadata found for file: {file_path}")
+        return metadata
+
+    def settle_replication(self, file_path: str, chunk_id: str):
+        """Mark a chunk as no longer needing more replicas."""
+        with self._lock(file_path):
+            metadata = self.files.get(file_path)
+            if metadata is not None and metadata.pending_replication.pop(chunk_id, None) is not None:
+                self._save_metadata(file_path)
 
     def update_chunk_offset(self, file_path: str, chunk_id: str, offset: int):
         """Update the offset of a chunk."""
-        self.logger.debug(f"Updating offset for chunk {chunk_id} in file {file_path} to {offset}")
-        with self.metadata_lock:
+        self.logger.debug("Updating offset for chunk %s in file %s to %s", chunk_id, file_path, offset)
+        with self._lock(file_path):
             if file_path in self.files:
                 # Update the chunk's offset
                 self.files[file_path].chunk_offsets[chunk_id] = offset
+                self._summed_sizes.pop(file_path, None)
                 
                 # If this is the last chunk, update the last_chunk_offset
                 if chunk_id == self.files[file_path].last_chunk_id:
                     self.files[file_path].last_chunk_offset = offset
                 
                 # Update total file size
-                chunk_index = self.files[file_path].chunk_ids.index(chunk_id)
+                chunk_index = self._chunk_index(file_path, self.files[file_path], chunk_id)
                 total_size = chunk_index * self.config['master']['chunk_size'] + offset
                 self.files[file_path].total_size = total_size
                 
-                self._save_metadata()
-                self.logger.debug(f"Updated offsets and total size for {file_path}")
+                self._save_metadata(file_path)
+                self.logger.debug("Updated offsets and total size for %s", file_path)
             else:
                 self.logger.warning(f"Attempted to update offset for non-existent file: {file_path}")
\ No newline at end of file
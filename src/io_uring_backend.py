@@ -0,0 +1,83 @@
+import os
+import socket
+import threading
+from typing import Optional
+from .logger import GFSLogger
+
+try:
+    import liburing
+except ImportError:
+    liburing = None  # Receives fall back to the plain recv_into loop
+
+logger = GFSLogger.get_logger('io_uring_backend')
+
+# Each thread only ever has one receive outstanding
+RING_ENTRIES = 4
+
+
+class _ThreadRing:
+    """One thread's io_uring instance plus the eventfd its completions are signalled on."""
+
+    def __init__(self):
+        self.ring = liburing.Ring()
+        liburing.io_uring_queue_init(RING_ENTRIES, self.ring, 0)
+        self.event_fd = os.eventfd(0)
+        liburing.io_uring_register_eventfd(self.ring, self.event_fd)
+        self.cqe = liburing.Cqe()
+
+    def __del__(self):
+        liburing.io_uring_queue_exit(self.ring)
+        os.close(self.event_fd)
+
+
+class UringReceiver:
+    """Receives whole frame payloads with a single io_uring MSG_WAITALL request each.
+
+    The kernel keeps filling the buffer until the payload is complete, so a
+    multi-megabyte chunk costs one submission instead of a Python loop of
+    recv_into calls. Completions are awaited on an eventfd, which releases
+    the GIL, rather than inside the ring. Rings are per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @staticmethod
+    def create() -> Optional['UringReceiver']:
+        """Return a receiver, or None if liburing or io_uring itself is unavailable."""
+        if liburing is None:
+            logger.warning("io_backend is io_uring but liburing isn't installed; using sockets")
+            return None
+        try:
+            _ThreadRing()
+        except OSError as e:
+            logger.warning(f"io_uring unavailable ({e}); using sockets")
+            return None
+        return UringReceiver()
+
+    def _ring(self) -> _ThreadRing:
+        ring = getattr(self._local, 'ring', None)
+        if ring is None:
+            ring = self._local.ring = _ThreadRing()
+        return ring
+
+    def recv_exact(self, sock: socket.socket, length: int, buf: bytearray = None) -> Optional[bytearray]:
+        """Receive exactly length bytes, into buf if it is exactly that size, else a new buffer.
+
+        Returns the filled buffer, or None if the peer closed the connection first.
+        """
+        if buf is None or len(buf) != length:
+            buf = bytearray(length)
+        if not length:
+            return buf
+        ring = self._ring()
+        sqe = liburing.io_uring_get_sqe(ring.ring)
+        liburing.io_uring_prep_recv(sqe, sock.fileno(), buf, socket.MSG_WAITALL)
+        liburing.io_uring_submit(ring.ring)
+        os.eventfd_read(ring.event_fd)
+        liburing.io_uring_peek_cqe(ring.ring, ring.cqe)
+        result = ring.cqe[0].res
+        liburing.io_uring_cq_advance(ring.ring, 1)
+        if result < 0:
+            raise OSError(-result, os.strerror(-result))
+        return buf if result == length else None
@@ -1,12 +1,40 @@
+import atexit
 import logging
 import os
 import sys
+import threading
+import time
+import traceback
+from collections import deque
 from datetime import datetime
+from logging.handlers import MemoryHandler
 from colorama import init, Fore, Style, Back
 
 # Initialize colorama for Windows compatibility
 init(autoreset=True)
 
+TRANSACTION_COLORS = {
+    'START': Back.WHITE + Fore.BLACK,
+    'PREPARE': Back.MAGENTA + Fore.WHITE,
+    'COMMIT': Back.BLUE + Fore.WHITE,
+    'ROLLBACK': Back.RED + Fore.WHITE,
+    'REPLICATE': Back.YELLOW + Fore.BLACK,
+}
+
+_last_stamp = (None, '')
+
+
+def _timestamp(created: float) -> str:
+    """Format a record time as 'YYYY-mm-dd HH:MM:SS.mmm', reusing the seconds part within a second."""
+    global _last_stamp
+    second = int(created)
+    cached_second, prefix = _last_stamp
+    if second != cached_second:
+        prefix = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        _last_stamp = (second, prefix)
+    return f"{prefix}.{int((created - second) * 1000):03d}"
+
+
 class ColoredFormatter(logging.Formatter):
     """Custom formatter with colors"""
     COLORS = {
@@ -16,11 +44,7 @@ class ColoredFormatter(logging.Formatter):
         'ERROR': Fore.RED,
         'CRITICAL': Fore.RED + Style.BRIGHT,
         # Custom levels for transaction stages
-        'START': Back.WHITE + Fore.BLACK,
-        'PREPARE': Back.MAGENTA + Fore.WHITE,
-        'COMMIT': Back.BLUE + Fore.WHITE,
-        'ROLLBACK': Back.RED + Fore.WHITE,
-        'REPLICATE': Back.YELLOW + Fore.BLACK,
+        **TRANSACTION_COLORS,
     }
 
     def format(self, record):
@@ -30,8 +54,8 @@ class ColoredFormatter(logging.Formatter):
         else:
             color = self.COLORS.get(record.levelname, '')
 
-        # Format timestamp
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        # Stamp with the record's own creation time rather than reading the clock again
+        timestamp = _timestamp(record.created)
         
         # Create the colored message
         colored_msg = (
@@ -42,43 +66,148 @@ class ColoredFormatter(logging.Formatter):
         
         return colored_msg
 
+class TransactionLogRing:
+    """Bounded ring of pending transaction log records, drained by one background writer.
+
+    Pushing is a single deque append, so commit paths never wait on log I/O;
+    when the ring is full the oldest records are dropped rather than blocking.
+    """
+    COLORS = TRANSACTION_COLORS
+
+    def __init__(self, capacity: int = 8192, batch_size: int = 128, flush_interval: float = 0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._records = deque(maxlen=capacity)
+        self._writer = None
+        self._start_lock = threading.Lock()
+
+    def push(self, logger: logging.Logger, transaction_id: str, phase: str, message: str, args: tuple = ()):
+        """Queue a record for the writer thread, starting it on first use; message % args is formatted there."""
+        self._records.append((time.time(), logger, transaction_id, phase, message, args))
+        if self._writer is None:
+            self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='transaction-log', daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write out every queued record, batch_size records per write."""
+        while self._records:
+            batch = []
+            while self._records and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._records.popleft())
+                except IndexError:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                # A bad record (say, message % args not matching) or a failing
+                # stream costs this batch, not the writer thread
+                sys.stderr.write(f"--- Transaction log error, {len(batch)} records dropped ---\n")
+                traceback.print_exc()
+
+    def _write(self, batch):
+        """Print a batch to the console and hand it to each logger's (buffered) file handlers."""
+        lines = []
+        by_logger = {}
+        for created, logger, transaction_id, phase, message, args in batch:
+            record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, args or None, None,
+                                       extra={'transaction_id': transaction_id, 'phase': phase})
+            timestamp = _timestamp(created)
+            lines.append(
+                f"{self.COLORS.get(phase, '')}[{timestamp}] "
+                f"Transaction {transaction_id} - {phase}: "
+                f"{record.getMessage()}{Style.RESET_ALL}\n"
+            )
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            by_logger.setdefault(logger, []).append(record)
+
+        sys.stdout.write(''.join(lines))
+        sys.stdout.flush()
+        for logger, records in by_logger.items():
+            for handler in logger.handlers:
+                for record in records:
+                    handler.handle(record)
+
+
+class BufferedFileHandlers:
+    """Wraps file handlers in MemoryHandlers so log lines reach disk in batches.
+
+    A buffer is written out when it fills, on any ERROR record, every
+    flush_interval seconds from one background thread, and at exit.
+    """
+
+    def __init__(self, capacity: int = 1024, flush_interval: float = 1.0):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._handlers = []
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def wrap(self, handler: logging.Handler) -> MemoryHandler:
+        buffered = MemoryHandler(self.capacity, flushLevel=logging.ERROR, target=handler)
+        buffered.setLevel(handler.level)
+        with self._lock:
+            self._handlers.append(buffered)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='log-flush', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+        return buffered
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        for handler in list(self._handlers):
+            try:
+                handler.flush()
+            except Exception:
+                # One failing file costs its buffered lines, not the flusher
+                # thread or the other files
+                sys.stderr.write(f"--- Log flush error for {handler.target} ---\n")
+                traceback.print_exc()
+
+
+# Debug output on the RPC paths is verbose enough to show up in profiles, so it
+# is off unless asked for, e.g. GFS_LOG_LEVEL=DEBUG
+LOG_LEVEL = os.environ.get('GFS_LOG_LEVEL', 'INFO').upper()
+
+
 class GFSLogger:
     _loggers = {}
+    _transaction_ring = TransactionLogRing()
+    _file_buffers = BufferedFileHandlers()
 
     @staticmethod
-    def log_transaction(logger: logging.Logger, transaction_id: str, phase: str, message: str):
-        """Log a transaction event with proper formatting and colors."""
-        colors = {
-            'START': Back.WHITE + Fore.BLACK,
-            'PREPARE': Back.MAGENTA + Fore.WHITE,
-            'COMMIT': Back.BLUE + Fore.WHITE,
-            'ROLLBACK': Back.RED + Fore.WHITE,
-            'REPLICATE': Back.YELLOW + Fore.BLACK
-        }
-        
-        color = colors.get(phase, '')
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        
-        formatted_message = (
-            f"{color}[{timestamp}] "
-            f"Transaction {transaction_id} - {phase}: "
-            f"{message}{Style.RESET_ALL}"
-        )
-        
-        # Print immediately to console
-        print(formatted_message, flush=True)
-        
-        # Also log to file
-        logger.info(message, extra={
-            'transaction_id': transaction_id,
-            'phase': phase
-        })
+    def log_transaction(logger: logging.Logger, transaction_id: str, phase: str, message: str, *args):
+        """Log a transaction event with proper formatting and colors.
+
+        The record is only queued here; a background writer formats message
+        % args, prints it and appends it to the transaction log shortly
+        after. Nothing is queued when the logger has INFO disabled.
+        """
+        if logger.isEnabledFor(logging.INFO):
+            GFSLogger._transaction_ring.push(logger, transaction_id, phase, message, args)
 
     @staticmethod
     def get_logger(name: str) -> logging.Logger:
         if name not in GFSLogger._loggers:
             logger = logging.getLogger(name)
-            logger.setLevel(logging.DEBUG)
+            logger.setLevel(LOG_LEVEL)
             
             # Ensure the logger doesn't propagate to the root logger
             logger.propagate = False
@@ -107,8 +236,8 @@ class GFSLogger:
             console_handler.setLevel(logging.INFO)
             console_handler.setFormatter(ColoredFormatter())
 
-            # Add handlers to logger
-            logger.addHandler(file_handler)
+            # Add handlers to logger; file writes are batched
+            logger.addHandler(GFSLogger._file_buffers.wrap(file_handler))
             logger.addHandler(console_handler)
 
             GFSLogger._loggers[name] = logger
@@ -143,7 +272,7 @@ class GFSLogger:
                 datefmt='%Y-%m-%d %H:%M:%S'
             ))
 
-            logger.addHandler(file_handler)
+            logger.addHandler(GFSLogger._file_buffers.wrap(file_handler))
             GFSLogger._loggers[logger_name] = logger
 
         return GFSLogger._loggers[logger_name]
\ No newline at end of file
@@ -1,21 +1,31 @@
+import bisect
+import functools
+import heapq
+import logging
+import operator
+import selectors
 import socket
 import threading
 import time
-import toml
-from typing import Dict, List, Set, Tuple
+import orjson
+from typing import Dict, List, Optional, Set, Tuple
 from .file_manager import FileManager
-from .utils import send_message, receive_message
+from .utils import (send_message, send_raw, encode_message, frame_encoded_header, decode_frame,
+                    tune_socket, socket_buffer_sizes, OK_FRAME, ConnectionPool, RearmQueue, sample_excluding,
+                    load_config, CONTROL_SOCKET_BUFFER_SIZE)
 from .logger import GFSLogger
 import random
 import math
 from collections import defaultdict
-import networkx as nx
-import plotly.graph_objects as go
-from queue import PriorityQueue
+from itertools import combinations, islice
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 @dataclass
 class ServerDistance:
+    # One per client per server, so no per-instance __dict__; score is set
+    # after construction by ClientServerPriority
+    __slots__ = ('server_id', 'distance', 'space_available', 'score')
     server_id: str
     distance: float
     space_available: int
@@ -23,98 +33,192 @@ class ServerDistance:
 class LocationGraph:
     def __init__(self):
         self.nodes = {}  # id -> (x, y) coordinates
-        self.distances = defaultdict(dict)  # id -> {other_id -> distance}
+        self.distances = defaultdict(dict)  # id -> {other_id -> distance}, client <-> chunk server only
         self.node_type = {}  # id -> "client" or "chunk_server"
-        self.space_info = {}  # node_id -> {total: int, used: int, available: int}
+        self.space_info: Dict[str, Tuple[int, int]] = {}  # node_id -> (total, used)
+        # Chunk server ids in the order they joined, so nearest-server queries
+        # don't have to filter clients out of every node
+        self._chunk_server_ids: Dict[str, None] = {}
+        self._client_ids: Dict[str, None] = {}
+        # Answers to get_nearest_chunk_servers, (client_id, k) -> servers, kept
+        # until a node joins, moves or leaves
+        self._nearest: Dict[Tuple[str, int], Tuple[str, ...]] = {}
+        # get_graph_data's edge list, built once per topology version: edges
+        # only change when a node joins, moves or leaves, not on heartbeats
+        self._topology_version = 0
+        self._edges: Optional[List[Dict]] = None
+        # get_graph_data encoded as JSON, with the version it was encoded at;
+        # the version moves on any change the graph view would show
+        self._version = 0
+        self._graph_json: Tuple[int, Optional[bytes]] = (-1, None)
         self.lock = threading.Lock()
 
     def add_node(self, node_id: str, location: tuple, node_type: str):
         """Add a node to the graph."""
+        location = tuple(location)
         with self.lock:
+            if self.nodes.get(node_id) == location and self.node_type.get(node_id) == node_type:
+                return  # Every heartbeat re-adds its server; the distances still hold
+            self._topology_changed()
+            if self.node_type.get(node_id, node_type) != node_type:
+                # Its distances are to nodes of the old type; start over
+                for other_id in self.distances.pop(node_id, ()):
+                    self.distances[other_id].pop(node_id, None)
             self.nodes[node_id] = location
             self.node_type[node_id] = node_type
+            if node_type == "chunk_server":
+                self._chunk_server_ids[node_id] = None
+                self._client_ids.pop(node_id, None)
+            else:
+                self._client_ids[node_id] = None
+                self._chunk_server_ids.pop(node_id, None)
             self._update_distances(node_id)
 
     def remove_node(self, node_id: str):
         """Remove a node from the graph."""
         with self.lock:
             if node_id in self.nodes:
+                self._topology_changed()
                 del self.nodes[node_id]
                 del self.node_type[node_id]
+                self._chunk_server_ids.pop(node_id, None)
+                self._client_ids.pop(node_id, None)
+                self.space_info.pop(node_id, None)
                 # Remove all distances involving this node
-                del self.distances[node_id]
-                for other_id in self.distances:
+                for other_id in self.distances.pop(node_id, ()):
                     self.distances[other_id].pop(node_id, None)
 
     def _update_distances(self, node_id: str):
-        """Update distances for a node to all other nodes."""
+        """Update distances between a node and every node of the other type."""
+        # Only client -> chunk server distances are ever looked up, so
+        # server-server and client-client pairs are never computed
         x1, y1 = self.nodes[node_id]
-        for other_id, (x2, y2) in self.nodes.items():
-            if other_id != node_id:
-                distance = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
-                self.distances[node_id][other_id] = distance
-                self.distances[other_id][node_id] = distance
+        row = self.distances[node_id]
+        distances = self.distances
+        others = self._client_ids if node_id in self._chunk_server_ids else self._chunk_server_ids
+        nodes = self.nodes
+        for other_id in others:
+            x2, y2 = nodes[other_id]
+            distance = math.hypot(x2 - x1, y2 - y1)
+            row[other_id] = distance
+            distances[other_id][node_id] = distance
+
+    def _topology_changed(self):
+        """Drop answers derived from node positions; call with the lock held."""
+        self._nearest.clear()
+        self._edges = None
+        self._topology_version += 1
+        self._version += 1
 
     def get_nearest_chunk_servers(self, client_id: str, k: int = 3) -> List[str]:
         """Get k nearest chunk servers to a client."""
         with self.lock:
             if client_id not in self.nodes:
                 return []
-            
-            # Get all chunk servers and their distances to this client
-            chunk_servers = [
-                (server_id, self.distances[client_id][server_id])
-                for server_id in self.nodes
-                if self.node_type[server_id] == "chunk_server"
-            ]
-            
-            # Sort by distance and return top k
-            chunk_servers.sort(key=lambda x: x[1])
-            return [server_id for server_id, _ in chunk_servers[:k]]
+            nearest = self._nearest.get((client_id, k))
+            if nearest is None:
+                # Keep only the k closest chunk servers rather than sorting them
+                # all; the key is a C-level lookup into this client's distances
+                nearest = tuple(heapq.nsmallest(k, self._chunk_server_ids,
+                                                key=self.distances[client_id].__getitem__))
+                self._nearest[(client_id, k)] = nearest
+            return list(nearest)
 
     def get_graph_data(self):
         """Get graph data for visualization."""
+        # Only the per-node state is copied under the lock; the O(N^2) edge
+        # list is built from the copy afterwards, and reused until a node
+        # joins, moves or leaves
         with self.lock:
-            graph_data = {
-                'nodes': [
-                    {
-                        'id': node_id,
-                        'type': self.node_type[node_id],
-                        'location': self.nodes[node_id],
-                        'space_info': self.space_info.get(node_id, {}) if self.node_type[node_id] == "chunk_server" else None
-                    }
-                    for node_id in self.nodes
-                ],
-                'edges': [
-                    {
-                        'source': source,
-                        'target': target,
-                        'distance': distance
-                    }
-                    for source, targets in self.distances.items()
-                    for target, distance in targets.items()
-                    if source < target  # Avoid duplicate edges
-                ],
-                'active_clients': [
-                    node_id for node_id in self.nodes
-                    if self.node_type[node_id] == "client"
-                ]
+            nodes = dict(self.nodes)
+            node_type = dict(self.node_type)
+            space_info = dict(self.space_info)
+            edges = self._edges
+            version = self._topology_version
+        if edges is None:
+            edges = self._build_edges(nodes)
+            with self.lock:
+                if self._topology_version == version:
+                    self._edges = edges
+        graph_data = {
+            'nodes': [
+                {
+                    'id': node_id,
+                    'type': node_type[node_id],
+                    'location': nodes[node_id],
+                    'space_info': self._space_dict(space_info.get(node_id)) if node_type[node_id] == "chunk_server" else None
+                }
+                for node_id in nodes
+            ],
+            'edges': edges,
+            'active_clients': [
+                node_id for node_id in nodes
+                if node_type[node_id] == "client"
+            ]
+        }
+        return graph_data
+
+    def get_graph_json(self) -> bytes:
+        """get_graph_data encoded as a JSON object, re-encoded only after the graph changes."""
+        with self.lock:
+            version, graph_json = self._graph_json
+            if version == self._version:
+                return graph_json
+            version = self._version
+        graph_json = orjson.dumps(self.get_graph_data())
+        with self.lock:
+            # The data may be newer than version, never older, so a racing
+            # change just costs its next caller a re-encode
+            if self._graph_json[0] < version:
+                self._graph_json = (version, graph_json)
+        return graph_json
+
+    @staticmethod
+    def _build_edges(nodes: Dict[str, Tuple[float, float]]) -> List[Dict]:
+        """Every pair of nodes once, source < target, with the distance between them."""
+        return [
+            {
+                'source': source,
+                'target': target,
+                'distance': math.hypot(nodes[target][0] - nodes[source][0],
+                                       nodes[target][1] - nodes[source][1])
             }
-            return graph_data
+            for source, target in combinations(sorted(nodes), 2)
+        ]
+
+    @staticmethod
+    def _space_dict(space: Optional[Tuple[int, int]]) -> Dict:
+        """Expand a node's (total, used) into the dict the visualization shows."""
+        if space is None:
+            return {}
+        total, used = space
+        return {'total': total, 'used': used, 'available': total - used}
 
     def update_space_info(self, node_id: str, total: int, used: int):
         """Update space information for a node."""
+        # Stored flat and only expanded for visualization, since every
+        # heartbeat lands here; most repeat the last report
+        space = (total, used)
         with self.lock:
-            self.space_info[node_id] = {
-                'total': total,
-                'used': used,
-                'available': total - used
-            }
+            if self.space_info.get(node_id) != space:
+                self.space_info[node_id] = space
+                self._version += 1
+
+# Sort key for ranking entries, evaluated in C rather than through a lambda
+_entry_score = operator.attrgetter('score')
 
 class ClientServerPriority:
     def __init__(self, config_path: str):
-        self.config = toml.load(config_path)
-        self.client_priorities: Dict[str, List[ServerDistance]] = {}
+        self.config = load_config(config_path)
+        # Each client's ranking is replaced whole and never mutated, so readers
+        # take no lock; the lock only orders concurrent writers
+        self.client_priorities: Dict[str, Tuple[ServerDistance, ...]] = {}
+        # Writers' working copy of each ranking: the scores in order (for
+        # bisecting), the entries in the same order, and each server's entry
+        self._rankings: Dict[str, Tuple[List[float], List[ServerDistance], Dict[str, ServerDistance]]] = {}
+        # Each published ranking as bare server ids, which is all
+        # get_priority_servers needs; built once per change, not per call
+        self._server_order: Dict[str, Tuple[str, ...]] = {}
         self.lock = threading.Lock()
         # Weights for the heuristic
         self.DISTANCE_WEIGHT = float(self.config['master']['distance_weight'])  # Weight for distance
@@ -139,65 +243,357 @@ class ClientServerPriority:
         return (self.DISTANCE_WEIGHT * normalized_distance + 
                 self.SPACE_WEIGHT * space_score)
 
+    def _score_server(self, client_location: Tuple[float, float], server_id: str,
+                      server: Tuple[float, float, int, int]) -> ServerDistance:
+        """Build a server's ranking entry for one client, its score set alongside."""
+        x, y, available_space, total_space = server
+        distance = math.hypot(client_location[0] - x, client_location[1] - y)
+        entry = ServerDistance(
+            server_id=server_id,
+            distance=distance,
+            space_available=available_space
+        )
+        entry.score = self._calculate_server_score(distance, available_space, total_space)
+        return entry
+
     def update_priorities(self, client_id: str, client_location: Tuple[float, float], 
                         servers: Dict[str, Tuple[float, float, int, int]]):  # (x, y, available_space, total_space)
-        """Update priority list for a client based on distance and available space."""
+        """Rebuild a client's whole priority list from every server's location and space."""
+        entries = [self._score_server(client_location, server_id, server)
+                   for server_id, server in servers.items()]
+        # Sort by combined score (lower is better), then publish the new ranking.
+        # Every entry is kept, since uploads and the graph view read the whole
+        # order and update_server re-slots servers anywhere in it
+        entries.sort(key=_entry_score)
+        scores = list(map(_entry_score, entries))
         with self.lock:
-            server_scores = []
-            for server_id, (x, y, available_space, total_space) in servers.items():
-                # Calculate distance
-                dx = client_location[0] - x
-                dy = client_location[1] - y
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                # Calculate combined score
-                score = self._calculate_server_score(distance, available_space, total_space)
-                
-                server_scores.append(ServerDistance(
-                    server_id=server_id,
-                    distance=distance,
-                    space_available=available_space
-                ))
-                
-                # Store the score for sorting
-                server_scores[-1].score = score
-            
-            # Sort by combined score (lower is better)
-            self.client_priorities[client_id] = sorted(server_scores, key=lambda x: x.score)
+            self._rankings[client_id] = (scores, entries, {entry.server_id: entry for entry in entries})
+            self._publish(client_id, entries)
+
+    def has_priorities(self, client_id: str) -> bool:
+        return client_id in self._rankings
 
-    def get_priority_servers(self, client_id: str, exclude_servers: Set[str] = None) -> List[str]:
-        """Get ordered list of servers by priority for a client."""
+    def update_server(self, client_id: str, client_location: Tuple[float, float], server_id: str,
+                      server: Tuple[float, float, int, int]):
+        """Re-rank one server in a client's priority list; the other servers keep their scores."""
+        entry = self._score_server(client_location, server_id, server)
         with self.lock:
-            if client_id not in self.client_priorities:
-                return []
+            ranking = self._rankings.get(client_id)
+            if ranking is None:
+                return
+            scores, entries, by_server = ranking
+            old = by_server.get(server_id)
+            if old is not None:
+                if old.score == entry.score:
+                    return  # Nothing moved; most heartbeats end here
+                self._unlink(scores, entries, old)
+            index = bisect.bisect_right(scores, entry.score)
+            scores.insert(index, entry.score)
+            entries.insert(index, entry)
+            by_server[server_id] = entry
+            self._publish(client_id, entries)
+
+    def _publish(self, client_id: str, entries: List[ServerDistance]):
+        """Replace the ranking readers see for a client; called with the lock held."""
+        self.client_priorities[client_id] = tuple(entries)
+        self._server_order[client_id] = tuple(entry.server_id for entry in entries)
+
+    @staticmethod
+    def _unlink(scores: List[float], entries: List[ServerDistance], entry: ServerDistance):
+        index = bisect.bisect_left(scores, entry.score)
+        while entries[index] is not entry:
+            index += 1
+        del scores[index]
+        del entries[index]
+
+    def remove_server(self, server_id: str):
+        """Drop a server from every client's priority list."""
+        with self.lock:
+            for client_id, (scores, entries, by_server) in self._rankings.items():
+                entry = by_server.pop(server_id, None)
+                if entry is not None:
+                    self._unlink(scores, entries, entry)
+                    self._publish(client_id, entries)
+
+    def remove_client(self, client_id: str):
+        """Forget a client's priority list."""
+        with self.lock:
+            self._rankings.pop(client_id, None)
+            self.client_priorities.pop(client_id, None)
+            self._server_order.pop(client_id, None)
+
+    def get_priority_servers(self, client_id: str, exclude_servers: Set[str] = None,
+                             limit: Optional[int] = None) -> List[str]:
+        """Get ordered list of servers by priority for a client, at most limit of them."""
+        order = self._server_order.get(client_id)
+        if not order:
+            return []
+        
+        if not exclude_servers:
+            return list(order[:limit])
             
-            if exclude_servers is None:
-                exclude_servers = set()
-                
-            return [s.server_id for s in self.client_priorities[client_id] 
-                   if s.server_id not in exclude_servers]
+        servers = (server_id for server_id in order if server_id not in exclude_servers)
+        return list(islice(servers, limit))
+
+# Number of lock stripes guarding chunk server liveness (a power of two)
+LIVENESS_SHARDS = 16
+# Chunks still short of replicas are retried after a jittered backoff that
+# doubles from the base up to the cap while no new work arrives (seconds)
+REPLICATION_RETRY_BASE = 1.0
+REPLICATION_RETRY_CAP = 30.0
+# Clients may reuse file metadata for a lease of this fraction of the time
+# since the file last changed, kept within [min, max] seconds: hot files get
+# short leases, settled ones long
+METADATA_LEASE_FRACTION = 0.1
+METADATA_LEASE_MIN = 1.0
+METADATA_LEASE_MAX = 30.0
+
+# Bytes a reactor reads off a readable connection per recv call
+REACTOR_READ_SIZE = 64 << 10
+# Per-call non-blocking read, leaving the socket blocking for the workers' replies
+_RECV_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+class Reactor:
+    """A selector loop over one listener and the idle connections accepted on it.
+
+    The reactor reads requests off readable connections itself, so a slow or
+    half-sent request holds no worker. Once a whole frame is in, the decoded
+    message is handed to a worker and the connection is watched again only
+    after the reply, so requests on a connection stay ordered.
+    """
+
+    def __init__(self, master: 'MasterServer', listener: socket.socket):
+        self.master = master
+        self.logger = master.logger
+        self.listener = listener
+        self.selector = selectors.DefaultSelector()
+        # Workers hand connections back through this; the selector isn't safe
+        # to mutate from other threads
+        self._rearmed = RearmQueue()
+        # Non-blocking so one readiness event can drain the whole backlog
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ)
+        self.selector.register(self._rearmed.wakeup, selectors.EVENT_READ)
+        # Bytes read past the last dispatched frame, per connection; most
+        # connections have none between requests
+        self._pending: Dict[socket.socket, bytearray] = {}
+
+    def rearm(self, client_socket: socket.socket, address):
+        """Hand a connection back to watch for its next request; called from workers."""
+        self._rearmed.put(client_socket, address)
+
+    def _accept_pending(self):
+        """Accept every connection waiting on the listener and watch it for requests."""
+        while True:
+            try:
+                client_socket, address = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # Out of descriptors and the like; back off briefly rather than
+                # spin on a listener that stays readable
+                self.logger.error(f"Failed to accept connection: {e}")
+                time.sleep(0.1)
+                return
+            # Accepted sockets inherit O_NONBLOCK on some platforms; workers read them blocking
+            client_socket.setblocking(True)
+            self.logger.info("Accepted connection from %s", address)
+            self.selector.register(client_socket, selectors.EVENT_READ, address)
+
+    def discard(self, client_socket: socket.socket):
+        """Forget a connection a worker closed instead of handing it back."""
+        self._pending.pop(client_socket, None)
+
+    def _read(self, client_socket: socket.socket, address):
+        """Take what a readable connection has sent, dispatching its next request if it is now complete."""
+        try:
+            data = client_socket.recv(REACTOR_READ_SIZE, _RECV_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.logger.debug("Client %s disconnected", address)
+            self.selector.unregister(client_socket)
+            self._pending.pop(client_socket, None)
+            client_socket.close()
+            return
+        buf = self._pending.get(client_socket)
+        if buf is None:
+            buf = self._pending[client_socket] = bytearray(data)
+        else:
+            buf += data
+        if self._dispatch(client_socket, address):
+            self.selector.unregister(client_socket)
+
+    def _close(self, client_socket: socket.socket):
+        """Stop watching a connection, whether or not it is registered, and close it."""
+        try:
+            self.selector.unregister(client_socket)
+        except (KeyError, ValueError):
+            pass  # Not registered, or already closed and so not findable
+        self._pending.pop(client_socket, None)
+        client_socket.close()
+
+    def _dispatch(self, client_socket: socket.socket, address) -> bool:
+        """Hand a connection's next complete request to a worker; False if none has fully arrived.
+
+        Requests the master answers inline are handled here on the reactor
+        thread, and any request buffered behind them is looked at next.
+        """
+        inline_handlers = self.master._inline_handlers
+        while True:
+            buf = self._pending.get(client_socket)
+            if not buf:
+                return False
+            try:
+                message, used = decode_frame(buf)
+                if message is not None and not isinstance(message, dict):
+                    raise ValueError(f"header is a {type(message).__name__}, not an object")
+            except Exception as e:
+                self.logger.error(f"Undecodable request from {address}: {e}")
+                self._close(client_socket)
+                return False
+            if message is None:
+                return False
+            del buf[:used]
+            if not buf:
+                del self._pending[client_socket]
+            handler = inline_handlers.get(message.get('command'))
+            if handler is None or 'heartbeat' in message:
+                break
+            try:
+                handler(client_socket, message)
+            except Exception as e:
+                self.logger.error(f"Error handling client {address}: {e}", exc_info=True)
+                self._close(client_socket)
+                return False
+        self.master._request_slots.acquire()
+        self.master.executor.submit(self.master.handle_client, client_socket, address, self, message)
+        return True
+
+    def run(self):
+        """Dispatch readable connections to the master's workers until the listener is closed."""
+        selector = self.selector
+        while True:
+            try:
+                events = selector.select()
+            except (OSError, ValueError):
+                if self.listener.fileno() == -1:
+                    return  # closed on shutdown
+                raise
+            for key, _ in events:
+                sock = key.fileobj
+                if sock is self.listener:
+                    self._accept_pending()
+                elif sock is self._rearmed.wakeup:
+                    for client_socket, address in self._rearmed.drain():
+                        self._guarded(self._resume, client_socket, address)
+                else:
+                    self._guarded(self._read, sock, key.data)
+
+    def _guarded(self, step, client_socket: socket.socket, address):
+        """Run one step for a connection; an error closes that connection, not the reactor."""
+        try:
+            step(client_socket, address)
+        except Exception as e:
+            self.logger.error(f"Error serving {address}: {e}", exc_info=True)
+            self._close(client_socket)
+
+    def _resume(self, client_socket: socket.socket, address):
+        """Watch a connection a worker handed back, unless its next request is already buffered."""
+        if self._dispatch(client_socket, address):
+            return
+        # _dispatch closes connections whose buffered request was bad
+        if client_socket.fileno() != -1:
+            self.selector.register(client_socket, selectors.EVENT_READ, address)
+
+    def close(self):
+        self.listener.close()
+        self.selector.close()
+        self._rearmed.close()
+
 
 class MasterServer:
     def __init__(self, config_path: str):
         self.logger = GFSLogger.get_logger('master')
         self.logger.info(f"Initializing Master Server with config from {config_path}")
         
-        self.config = toml.load(config_path)
-        self.logger.debug(f"Loaded configuration: {self.config}")
+        self.config = load_config(config_path)
+        self.logger.debug("Loaded configuration: %s", self.config)
         
         self.file_manager = FileManager("data/metadata", self.config)
-        self.chunk_servers: Dict[str, float] = {}
-        self.chunk_server_lock = threading.Lock()
+        # Encoded listings keyed by path prefix (None for everything) and
+        # namespace version, so the few prefixes clients poll aren't rescanned
+        # until a file is added or removed
+        self._listing_frame = functools.lru_cache(maxsize=256)(self._encode_listing_reply)
+        # Encoded replies for single-file reads, keyed by the file's metadata
+        # version; entries from older versions just age out of the LRU
+        self._metadata_frame = functools.lru_cache(maxsize=4096)(self._encode_metadata_reply)
+        self._locations_frame = functools.lru_cache(maxsize=4096)(self._encode_locations_reply)
+        # Live chunk servers, in the order they joined. Each address only ever
+        # joins or leaves under its liveness stripe, so heartbeats from
+        # different servers and the dead-server sweep don't queue behind each
+        # other. The location graph and client priorities each guard
+        # themselves with their own lock
+        self.chunk_servers: Dict[str, None] = {}
+        # Last heartbeat per chunk server, on the monotonic clock. A known
+        # server's entry is overwritten without any lock; a single dict store
+        # is atomic, and a write racing the sweep only leaves a stale entry
+        # that the server's next heartbeat re-registers over
+        self._last_beat: Dict[str, float] = {}
+        self._liveness_locks = [threading.Lock() for _ in range(LIVENESS_SHARDS)]
+        # Per stripe, one (expires_at, address) entry per server, soonest first.
+        # Heartbeats only update _last_beat; an entry that surfaces for a
+        # server heard from since is pushed back with its new deadline
+        self._heartbeat_expiry: List[List[Tuple[float, str]]] = [[] for _ in range(LIVENESS_SHARDS)]
+        # Live chunk server addresses as an immutable snapshot, replaced only
+        # when a server joins or is dropped, so readers need no lock or copy
+        self._server_roster: Tuple[str, ...] = ()
+        self._roster_lock = threading.Lock()
         
         self.host = self.config['master']['host']
         self.port = self.config['master']['port']
+        # Settings read on every heartbeat sweep and replication decision
+        self.replication_factor = self.config['master']['replication_factor']
+        self.heartbeat_interval = self.config['chunk_server']['heartbeat_interval']
         self.logger.info(f"Master server will run on {self.host}:{self.port}")
+        # Kernel buffers for every master socket; [master] sndbuf_mb/rcvbuf_mb
+        self._sndbuf, self._rcvbuf = socket_buffer_sizes(self.config['master'], CONTROL_SOCKET_BUFFER_SIZE)
+        # Listing and graph replies larger than this are zlib-compressed; off
+        # (0) by default, as on a fast link compressing costs more than the
+        # bytes saved
+        compress_kb = self.config['master'].get('compress_replies_over_kb', 0)
+        self._compress_over = int(compress_kb * 1024) if compress_kb > 0 else None
         
-        # Start server socket
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        self.logger.info("Server socket initialized and listening")
+        # Start server sockets. With [master] acceptors > 1 each listener binds
+        # the same port with SO_REUSEPORT and gets its own reactor thread; the
+        # kernel spreads incoming connections across them
+        acceptors = max(1, self.config['master'].get('acceptors', 1))
+        if acceptors > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            self.logger.warning("SO_REUSEPORT is not available, accepting on a single listener")
+            acceptors = 1
+        self.listeners = self._open_listeners(acceptors)
+        self.server_socket = self.listeners[0]
+        self.logger.info(f"Server socket initialized and listening ({len(self.listeners)} listener(s))")
+
+        # Requests are served by a bounded pool of reused worker threads; idle
+        # connections only cost a selector registration, not a thread
+        max_workers = self.config['master'].get('max_workers', 64)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gfs-master')
+        # Requests handed to workers and not yet finished. Once every worker is
+        # busy with one more queued each, reactors stop reading and accepting,
+        # so overload waits in the kernel rather than in the executor's queue
+        self._request_slots = threading.BoundedSemaphore(2 * max_workers)
+
+        # Replication commands to chunk servers reuse idle sockets per address
+        self._pool = ConnectionPool(self.config['master'].get('conn_pool_max_size', 4),
+                                    self._sndbuf, self._rcvbuf)
+        # Sends replication commands to a chunk's targets side by side
+        self._replication_executor = ThreadPoolExecutor(
+            max_workers=self.config['master'].get('replication_workers', 8),
+            thread_name_prefix='gfs-replicate'
+        )
         
         # Start heartbeat checker thread
         self.heartbeat_thread = threading.Thread(target=self._check_heartbeats)
@@ -206,8 +602,11 @@ class MasterServer:
         self.logger.info("Heartbeat checker thread started")
         
         # Add replication queue and its lock
-        self.replication_queue = set()  # Set of (file_path, chunk_id) tuples
+        self.replication_queue: Dict[Tuple[str, str], int] = {}  # (file_path, chunk_id) -> replicas missing
         self.replication_queue_lock = threading.Lock()
+        # Signalled when a chunk is queued, so replication starts right away
+        self._replication_ready = threading.Condition(self.replication_queue_lock)
+        self._replication_queued = False
         
         # Start background replication thread
         self.replication_thread = threading.Thread(target=self._handle_pending_replications)
@@ -216,8 +615,16 @@ class MasterServer:
         self.logger.info("Started background replication thread")
         
         self.location_graph = LocationGraph()
-        self.clients = {}  # client_id -> last_heartbeat_time
+        self.clients = {}  # client_id -> None, registered clients in order
+        # Last heartbeat per client on the monotonic clock, written without
+        # the lock for registered clients the same way as _last_beat
+        self._client_beats: Dict[str, float] = {}
         self.client_lock = threading.Lock()
+        # Clients registered since the last heartbeat, due a full ranking
+        self._clients_to_rank: Set[str] = set()
+        # Each chunk server's last reported (x, y, available, total), so
+        # heartbeats that change nothing skip re-ranking altogether
+        self._server_reports: Dict[str, Tuple[float, float, int, int]] = {}
         
         # Start client heartbeat checker thread
         self.client_heartbeat_thread = threading.Thread(target=self._check_client_heartbeats)
@@ -226,166 +633,289 @@ class MasterServer:
         
         self.client_priorities = ClientServerPriority(config_path)
 
+        # Command dispatch table, built once instead of walking an elif chain per
+        # message. Every handler takes (socket, message), so each entry is the
+        # bound method itself; those that send no reply ignore the socket
+        self._handlers = {
+            'heartbeat': self._handle_heartbeat,
+            'register_chunk_server': self._handle_register_chunk_server,
+            'get_chunk_locations': self._handle_get_chunk_locations,
+            'get_chunk_locations_bulk': self._handle_get_chunk_locations_bulk,
+            'update_chunk_locations': self._handle_update_chunk_locations,
+            'list_files': self._handle_list_files,
+            'get_file_metadata': self._handle_get_file_metadata,
+            'get_chunk_servers': self._handle_get_chunk_servers,
+            'add_file': self._handle_add_file,
+            'upload_begin': self._handle_upload_begin,
+            'get_replica_locations': self._handle_get_replica_locations,
+            'update_chunk_offset': self._handle_update_chunk_offset,
+            'add_chunk': self._handle_add_chunk,
+            'update_file_metadata': self._handle_update_file_metadata,
+            'register_client': self._handle_register_client,
+            'client_heartbeat': self._handle_client_heartbeat,
+            'get_graph_data': self._handle_get_graph_data,
+        }
+        # Commands cheap enough for the reactor thread to answer itself: no
+        # locks held for long and a reply that fits the socket buffer, so the
+        # worker hand-off and the rearm round trip would cost more than the work
+        self._inline_handlers = {
+            'client_heartbeat': self._handle_client_heartbeat,
+        }
+
+    def _heartbeat_timeout(self) -> float:
+        return self.heartbeat_interval * 2
+
+    def _touch_chunk_server(self, address: str):
+        """Record a sign of life from a chunk server."""
+        now = time.monotonic()
+        if address in self.chunk_servers:
+            self._last_beat[address] = now
+            return
+        shard = hash(address) & (LIVENESS_SHARDS - 1)
+        with self._liveness_locks[shard]:
+            self._last_beat[address] = now
+            is_new = address not in self.chunk_servers
+            if is_new:
+                self.chunk_servers[address] = None
+                heapq.heappush(self._heartbeat_expiry[shard], (now + self._heartbeat_timeout(), address))
+        if is_new:
+            self._rebuild_roster()
+
+    def _rebuild_roster(self):
+        """Republish the live server snapshot after a server joined or was dropped."""
+        with self._roster_lock:
+            self._server_roster = tuple(self.chunk_servers)
+
     def _check_heartbeats(self):
-        """Check for chunk server heartbeats and remove dead servers."""
+        """Check for chunk server heartbeats and remove dead servers.
+
+        Only servers whose deadline has passed are looked at, so a tick costs
+        O(log N) per expiry instead of a scan of every server, and the loop
+        sleeps until the next deadline rather than a fixed interval.
+        """
         self.logger.info("Starting heartbeat checking loop")
         while True:
-            current_time = time.time()
-            with self.chunk_server_lock:
-                dead_servers = [
-                    addr for addr, last_beat in self.chunk_servers.items()
-                    if current_time - last_beat > self.config['chunk_server']['heartbeat_interval'] * 2
-                ]
+            current_time = time.monotonic()
+            timeout = self._heartbeat_timeout()
+            dead_servers = []
+            next_deadline = current_time + self.heartbeat_interval
+            for lock, expiry in zip(self._liveness_locks, self._heartbeat_expiry):
+                with lock:
+                    while expiry and expiry[0][0] < current_time:
+                        _, addr = heapq.heappop(expiry)
+                        if addr not in self.chunk_servers:
+                            continue
+                        last_beat = self._last_beat[addr]
+                        if current_time - last_beat > timeout:
+                            del self.chunk_servers[addr]
+                            del self._last_beat[addr]
+                            dead_servers.append(addr)
+                        else:
+                            heapq.heappush(expiry, (last_beat + timeout, addr))
+                    if expiry:
+                        next_deadline = min(next_deadline, expiry[0][0])
+            if dead_servers:
+                self._rebuild_roster()
                 for addr in dead_servers:
                     self.logger.warning(f"Chunk server {addr} is dead, removing...")
-                    del self.chunk_servers[addr]
                     self.location_graph.remove_node(addr)
-                
-                self.logger.debug(f"Active chunk servers: {list(self.chunk_servers.keys())}")
-            time.sleep(self.config['chunk_server']['heartbeat_interval'])
+                    self.client_priorities.remove_server(addr)
+                    self._server_reports.pop(addr, None)
+                    self._pool.discard(addr)
+            
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Active chunk servers: %s", self._server_roster)
+            # Servers registering meanwhile expire no sooner than a full timeout away
+            time.sleep(max(0.05, next_deadline - time.monotonic()))
 
-    def handle_client(self, client_socket: socket.socket, address: str):
-        """Handle client connections."""
-        self.logger.info(f"New client connection from {address}")
+    def handle_client(self, client_socket: socket.socket, address: str, reactor: 'Reactor', message: Dict):
+        """Handle one request its reactor read off a connection, then hand the connection back."""
         try:
-            while True:
-                message = receive_message(client_socket)
-                if not message:
-                    self.logger.debug(f"Client {address} disconnected")
-                    break
-
-                command = message.get('command')
-                self.logger.debug(f"Received command '{command}' from {address}")
-
-                if command == 'heartbeat':
-                    self._handle_heartbeat(message)
-                elif command == 'register_chunk_server':
-                    self._handle_register_chunk_server(message)
-                elif command == 'get_chunk_locations':
-                    self._handle_get_chunk_locations(client_socket, message)
-                elif command == 'update_chunk_locations':
-                    self._handle_update_chunk_locations(message)
-                elif command == 'list_files':
-                    self._handle_list_files(client_socket)
-                elif command == 'get_file_metadata':
-                    self._handle_get_file_metadata(client_socket, message)
-                elif command == 'get_chunk_servers':
-                    self._handle_get_chunk_servers(client_socket, message)
-                elif command == 'add_file':
-                    self._handle_add_file(client_socket, message)
-                elif command == 'get_replica_locations':
-                    self._handle_get_replica_locations(client_socket, message)
-                elif command == 'update_chunk_offset':
-                    self._handle_update_chunk_offset(client_socket, message)
-                elif command == 'add_chunk':
-                    self._handle_add_chunk(client_socket, message)
-                elif command == 'update_file_metadata':
-                    self._handle_update_file_metadata(client_socket, message)
-                elif command == 'register_client':
-                    self._handle_register_client(client_socket, message)
-                elif command == 'client_heartbeat':
-                    self._handle_client_heartbeat(message)
-                elif command == 'get_graph_data':
-                    self._handle_get_graph_data(client_socket, message)
+            command = message.get('command')
+            self.logger.debug("Received command '%s' from %s", command, address)
+
+            # Chunk servers piggyback heartbeats on their regular RPCs
+            if 'heartbeat' in message:
+                self._handle_heartbeat(client_socket, message['heartbeat'])
+
+            handler = self._handlers.get(command)
+            if handler:
+                handler(client_socket, message)
+            else:
+                self.logger.warning("Unknown command '%s' from %s", command, address)
 
         except Exception as e:
             self.logger.error(f"Error handling client {address}: {e}", exc_info=True)
-        finally:
+            reactor.discard(client_socket)
             client_socket.close()
-            self.logger.debug(f"Closed connection with {address}")
+            self.logger.debug("Closed connection with %s", address)
+            return
+        finally:
+            self._request_slots.release()
+
+        reactor.rearm(client_socket, address)
 
-    def _handle_heartbeat(self, message: Dict):
+    def _open_listeners(self, acceptors: int) -> List[socket.socket]:
+        """Open the listeners, falling back to one if the port can't be shared between them."""
+        listeners = []
+        try:
+            for _ in range(acceptors):
+                listeners.append(self._listen(reuse_port=acceptors > 1))
+        except OSError as e:
+            for listener in listeners:
+                listener.close()
+            if acceptors == 1:
+                raise
+            # SO_REUSEPORT can be defined and still be refused, as by some
+            # sandboxed or emulated kernels
+            self.logger.warning(f"Could not share the port between {acceptors} listeners ({e}), "
+                                f"accepting on a single listener")
+            return [self._listen()]
+        return listeners
+
+    def _listen(self, reuse_port: bool = False) -> socket.socket:
+        """Open a tuned listening socket on the master's address."""
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if reuse_port:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # Accepted sockets inherit these buffer sizes and TCP_NODELAY
+            tune_socket(server_socket, self._sndbuf, self._rcvbuf)
+            server_socket.bind((self.host, self.port))
+            # Connections beyond the worker pool wait in the kernel's accept backlog
+            server_socket.listen(socket.SOMAXCONN)
+        except OSError:
+            server_socket.close()
+            raise
+        return server_socket
+
+    def _handle_heartbeat(self, client_socket: socket.socket, message: Dict):
         """Handle heartbeat from chunk server."""
         address = message['address']
         location = message['location']
         space_info = message.get('space_info', {})
         
-        with self.chunk_server_lock:
-            self.chunk_servers[address] = time.time()
-            self.location_graph.add_node(address, location, "chunk_server")
-            if space_info:
-                self.location_graph.update_space_info(address, 
-                    space_info['total'],
-                    space_info['used']
-                )
-            
-            # Update priorities for all clients
-            server_info = {}
-            for addr, _ in self.chunk_servers.items():
-                node = self.location_graph.nodes.get(addr)
-                space_data = self.location_graph.space_info.get(addr, {})
-                if node and space_data:
-                    available_space = space_data.get('available', 0)
-                    total_space = space_data.get('total', 0)
-                    server_info[addr] = (*node, available_space, total_space)
-            
-            for client_id in self.clients:
-                if client_id in self.location_graph.nodes:
-                    self.client_priorities.update_priorities(
-                        client_id,
-                        self.location_graph.nodes[client_id],
-                        server_info
-                    )
-
-    def _handle_register_chunk_server(self, message: Dict):
+        self._touch_chunk_server(address)
+        self.location_graph.add_node(address, location, "chunk_server")
+        if space_info:
+            self.location_graph.update_space_info(address, 
+                space_info['total'],
+                space_info['used']
+            )
+        
+        server = None
+        if space_info:
+            server = (*location, space_info['total'] - space_info['used'], space_info['total'])
+        # Most heartbeats repeat the last report; then only newly registered
+        # clients need ranking
+        changed = server is not None and self._server_reports.get(address) != server
+        if server is not None:
+            self._server_reports[address] = server
+        
+        with self.client_lock:
+            new_clients = self._clients_to_rank
+            self._clients_to_rank = set()
+            client_ids = list(self.clients) if changed else list(new_clients)
+        if not client_ids:
+            return
+        # One pass over the clients: a new or unranked client gets a full
+        # priority list built from the servers' last reports, the others only
+        # need this server re-scored
+        nodes = self.location_graph.nodes
+        has_priorities = self.client_priorities.has_priorities
+        server_info = None
+        for client_id in client_ids:
+            client_location = nodes.get(client_id)
+            if client_location is None:
+                continue
+            if client_id in new_clients or not has_priorities(client_id):
+                if server_info is None:
+                    server_info = dict(self._server_reports)
+                self.client_priorities.update_priorities(client_id, client_location, server_info)
+            elif server:
+                self.client_priorities.update_server(client_id, client_location, address, server)
+
+    def _handle_register_chunk_server(self, client_socket: socket.socket, message: Dict):
         """Handle chunk server registration with location."""
         address = message['address']
         location = message['location']
-        with self.chunk_server_lock:
-            self.chunk_servers[address] = time.time()
-            self.location_graph.add_node(address, location, "chunk_server")
-            self.logger.info(f"Registered chunk server at {address} location {location}")
+        self._touch_chunk_server(address)
+        self.location_graph.add_node(address, location, "chunk_server")
+        self.logger.info(f"Registered chunk server at {address} location {location}")
 
     def _handle_register_client(self, client_socket: socket.socket, message: Dict):
         """Handle client registration with location."""
         client_id = message['client_id']
         location = message['location']
         with self.client_lock:
-            self.clients[client_id] = time.time()
+            self.clients[client_id] = None
+            self._client_beats[client_id] = time.monotonic()
             self.location_graph.add_node(client_id, location, "client")
+            self._clients_to_rank.add(client_id)
             self.logger.info(f"Registered client {client_id} at location {location}")
-        send_message(client_socket, {'status': 'ok'})
+        send_raw(client_socket, OK_FRAME)
 
-    def _handle_client_heartbeat(self, message: Dict):
-        """Handle client heartbeat."""
+    def _handle_client_heartbeat(self, client_socket: socket.socket, message: Dict):
+        """Handle client heartbeat; the reply lets clients send it over a pooled connection."""
         client_id = message['client_id']
-        with self.client_lock:
-            self.clients[client_id] = time.time()
+        now = time.monotonic()
+        if client_id in self.clients:
+            self._client_beats[client_id] = now
+        else:
+            with self.client_lock:
+                self.clients[client_id] = None
+                self._client_beats[client_id] = now
+        send_raw(client_socket, OK_FRAME)
 
     def _check_client_heartbeats(self):
         """Check for client heartbeats and remove dead clients."""
         while True:
-            current_time = time.time()
+            current_time = time.monotonic()
             with self.client_lock:
                 dead_clients = [
-                    client_id for client_id, last_beat in self.clients.items()
-                    if current_time - last_beat > 60  # Client timeout after 60 seconds
+                    client_id for client_id in self.clients
+                    if current_time - self._client_beats[client_id] > 60  # Client timeout after 60 seconds
                 ]
                 for client_id in dead_clients:
                     self.logger.warning(f"Client {client_id} is dead, removing...")
                     del self.clients[client_id]
+                    del self._client_beats[client_id]
                     self.location_graph.remove_node(client_id)
+                    self.client_priorities.remove_client(client_id)
             time.sleep(30)
 
     def _handle_get_chunk_locations(self, client_socket: socket.socket, message: Dict):
         """Handle request for chunk locations."""
-        self.logger.debug(f"Getting chunk locations for {message['file_path']}, chunk_id: {message['chunk_id']}")
-        locations = self.file_manager.get_chunk_locations(
+        file_path, chunk_id = message['file_path'], message['chunk_id']
+        self.logger.debug("Getting chunk locations for %s, chunk_id: %s", file_path, chunk_id)
+        version = self.file_manager.file_version(file_path)
+        send_raw(client_socket, self._locations_frame(file_path, chunk_id, version))
+
+    def _encode_locations_reply(self, file_path: str, chunk_id: str, version: int):
+        locations = self.file_manager.get_chunk_locations(file_path, chunk_id)
+        self.logger.debug("Found chunk locations: %s", locations)
+        return encode_message({
+            'status': 'ok',
+            'locations': locations
+        })
+
+    def _handle_get_chunk_locations_bulk(self, client_socket: socket.socket, message: Dict):
+        """Handle request for the locations of many chunks of one file."""
+        self.logger.debug("Getting locations for %s chunks of %s", len(message['chunk_ids']), message['file_path'])
+        locations = self.file_manager.get_chunk_locations_bulk(
             message['file_path'],
-            message['chunk_id']
+            message['chunk_ids']
         )
-        self.logger.debug(f"Found chunk locations: {locations}")
         send_message(client_socket, {
             'status': 'ok',
             'locations': locations
         })
 
-    def _handle_update_chunk_locations(self, message: Dict):
+    def _handle_update_chunk_locations(self, client_socket: socket.socket, message: Dict):
         """Handle chunk location updates."""
         self.logger.debug(
-            f"Updating chunk locations for {message['file_path']}, "
-            f"chunk_id: {message['chunk_id']}, "
-            f"locations: {message['locations']}"
+            "Updating chunk locations for %s, chunk_id: %s, locations: %s",
+            message['file_path'], message['chunk_id'], message['locations']
         )
         self.file_manager.update_chunk_locations(
             message['file_path'],
@@ -393,60 +923,73 @@ class MasterServer:
             message['locations']
         )
 
-    def _handle_list_files(self, client_socket: socket.socket):
-        """Handle request to list files."""
-        files = self.file_manager.list_files()
-        self.logger.debug(f"Listing files: {files}")
-        send_message(client_socket, {
+    def _handle_list_files(self, client_socket: socket.socket, message: Dict):
+        """Handle request to list files, optionally only those under a path prefix."""
+        version = self.file_manager.namespace_version
+        send_raw(client_socket, self._listing_frame(message.get('prefix') or None, version))
+
+    def _encode_listing_reply(self, prefix: Optional[str], version: int):
+        files = self.file_manager.list_files(prefix)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Listing files: %r", files)
+        return encode_message({
             'status': 'ok',
             'files': files
-        })
+        }, self._compress_over)
 
     def _handle_get_file_metadata(self, client_socket: socket.socket, message: Dict):
         """Handle request for file metadata."""
-        self.logger.debug(f"Getting metadata for file: {message['file_path']}")
-        metadata = self.file_manager.get_file_metadata(message['file_path'])
-        self.logger.debug(f"Retrieved metadata: {metadata}")
-        send_message(client_socket, {
+        file_path = message['file_path']
+        self.logger.debug("Getting metadata for file: %s", file_path)
+        version = self.file_manager.file_version(file_path)
+        send_raw(client_socket, self._metadata_frame(file_path, version))
+
+    def _encode_metadata_reply(self, file_path: str, version: int):
+        metadata = self.file_manager.get_file_metadata(file_path)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Retrieved metadata: %r", metadata)
+        # The frame is reused until the file changes, by which time the lease
+        # it carries has only become more conservative
+        return encode_message({
             'status': 'ok',
-            'metadata': metadata
+            'metadata': metadata,
+            'lease': self._metadata_lease(file_path)
         })
 
+    def _metadata_lease(self, file_path: str) -> float:
+        """Seconds a client may cache this file's metadata, growing with the time since it last changed."""
+        age = time.time() - self.file_manager.file_changed_at(file_path)
+        return min(METADATA_LEASE_MAX, max(METADATA_LEASE_MIN, age * METADATA_LEASE_FRACTION))
+
     def _handle_get_chunk_servers(self, client_socket: socket.socket, message: Dict):
         """Handle request for available chunk servers, now considering location."""
         client_id = message.get('client_id')
         if client_id:
             # Get nearest chunk servers for this client
-            with self.chunk_server_lock:
-                nearest_servers = self.location_graph.get_nearest_chunk_servers(client_id)
-                active_servers = [
-                    server for server in nearest_servers
-                    if server in self.chunk_servers
-                ]
-                self.logger.debug(f"Returning nearest active chunk servers for {client_id}: {active_servers}")
-                send_message(client_socket, {
-                    'status': 'ok',
-                    'servers': active_servers
-                })
+            nearest_servers = self.location_graph.get_nearest_chunk_servers(client_id)
+            active_servers = [
+                server for server in nearest_servers
+                if server in self.chunk_servers
+            ]
+            self.logger.debug("Returning nearest active chunk servers for %s: %s", client_id, active_servers)
         else:
             # Fallback to original behavior if no client_id provided
-            with self.chunk_server_lock:
-                active_servers = list(self.chunk_servers.keys())
-                send_message(client_socket, {
-                    'status': 'ok',
-                    'servers': active_servers
-                })
+            active_servers = self._server_roster
+        send_message(client_socket, {
+            'status': 'ok',
+            'servers': active_servers
+        })
 
     def _handle_add_file(self, client_socket: socket.socket, message: Dict):
         """Handle adding a new file."""
         try:
-            self.logger.debug(f"Adding new file: {message['file_path']}")
+            self.logger.debug("Adding new file: %s", message['file_path'])
             self.file_manager.add_file(
                 message['file_path'],
                 message['total_size'],
                 message['chunk_ids']
             )
-            send_message(client_socket, {'status': 'ok'})
+            send_raw(client_socket, OK_FRAME)
         except Exception as e:
             self.logger.error(f"Failed to add file: {e}")
             send_message(client_socket, {
@@ -454,6 +997,41 @@ class MasterServer:
                 'message': str(e)
             })
 
+    def _handle_upload_begin(self, client_socket: socket.socket, message: Dict):
+        """Handle the start of an upload: register the file and assign a primary to each chunk."""
+        try:
+            file_path = message['file_path']
+            chunk_ids = message['chunk_ids']
+            client_id = message.get('client_id')
+
+            roster = self._server_roster
+            # Client's priority order (distance and free space) when known
+            servers = [
+                server for server in self.client_priorities.get_priority_servers(client_id)
+                if server in self.chunk_servers
+            ] if client_id else []
+            ranked = set(servers)
+            servers += [server for server in roster if server not in ranked]
+            if not servers:
+                raise Exception("No chunk servers available")
+
+            self.file_manager.add_file(file_path, message['total_size'], chunk_ids)
+
+            # Spread consecutive chunks across the servers, best-ranked first
+            assignments = [servers[i % len(servers)] for i in range(len(chunk_ids))]
+            self.logger.debug("Assigned %s chunks of %s across %s servers", len(chunk_ids), file_path, len(servers))
+            send_message(client_socket, {
+                'status': 'ok',
+                'servers': servers,
+                'assignments': assignments
+            })
+        except Exception as e:
+            self.logger.error(f"Failed to begin upload: {e}")
+            send_message(client_socket, {
+                'status': 'error',
+                'message': str(e)
+            })
+
     def _handle_get_replica_locations(self, client_socket: socket.socket, message: Dict):
         """Handle request for replica locations with priority."""
         client_id = message.get('client_id')
@@ -462,27 +1040,19 @@ class MasterServer:
         if isinstance(excluding, str):
             excluding = {excluding}
         
-        with self.chunk_server_lock:
-            if client_id:
-                # Get priority-ordered servers for this client
-                servers = self.client_priorities.get_priority_servers(client_id, excluding)
-            else:
-                # Fallback to random selection
-                servers = [s for s in self.chunk_servers.keys() if s not in excluding]
-            
-            # Select servers for replication
-            num_replicas = min(
-                self.config['master']['replication_factor'] - 1,
-                len(servers)
-            )
-            
-            # Take the first num_replicas servers from the priority list
-            selected_servers = servers[:num_replicas]
-            
-            send_message(client_socket, {
-                'status': 'ok',
-                'locations': selected_servers
-            })
+        num_replicas = self.replication_factor - 1
+        if client_id:
+            # Take the first num_replicas servers from this client's priority list
+            selected_servers = self.client_priorities.get_priority_servers(
+                client_id, excluding, limit=num_replicas)
+        else:
+            # Fallback to random selection over the live server snapshot
+            selected_servers = sample_excluding(self._server_roster, num_replicas, excluding)
+        
+        send_message(client_socket, {
+            'status': 'ok',
+            'locations': selected_servers
+        })
 
     def _handle_update_chunk_offset(self, client_socket: socket.socket, message: Dict):
         """Handle updating chunk offset."""
@@ -492,7 +1062,7 @@ class MasterServer:
                 message['chunk_id'],
                 message['offset']
             )
-            send_message(client_socket, {'status': 'ok'})
+            send_raw(client_socket, OK_FRAME)
         except Exception as e:
             self.logger.error(f"Failed to update chunk offset: {e}")
             send_message(client_socket, {
@@ -508,29 +1078,12 @@ class MasterServer:
             chunk_index = message['chunk_index']
             size = message['size']
             
-            self.logger.debug(f"Adding chunk {chunk_id} to file {file_path}")
+            self.logger.debug("Adding chunk %s to file %s", chunk_id, file_path)
             
-            with self.chunk_server_lock:
-                metadata = self.file_manager.get_file_metadata(file_path)
-                if metadata:
-                    # Update existing file
-                    metadata.chunk_ids.append(chunk_id)
-                    metadata.chunk_offsets[chunk_id] = size
-                    metadata.last_chunk_id = chunk_id
-                    metadata.last_chunk_offset = size
-                    metadata.total_size += size
-                else:
-                    # Create new file
-                    self.file_manager.add_file(
-                        file_path=file_path,
-                        total_size=size,
-                        chunk_ids=[chunk_id]
-                    )
-                
-                self.file_manager._save_metadata()
-                
-            send_message(client_socket, {'status': 'ok'})
-            self.logger.info(f"Successfully added chunk {chunk_id} to {file_path}")
+            # Only the file's own metadata lock is taken
+            self.file_manager.append_chunk(file_path, chunk_id, size)
+            send_raw(client_socket, OK_FRAME)
+            self.logger.info("Successfully added chunk %s to %s", chunk_id, file_path)
             
         except Exception as e:
             self.logger.error(f"Failed to add chunk: {e}")
@@ -540,44 +1093,48 @@ class MasterServer:
             })
 
     def _handle_pending_replications(self):
-        """Background thread to handle pending replications."""
+        """Background thread to handle pending replications.
+
+        Sleeps until a chunk is queued; chunks that could not be fully
+        replicated are retried with jittered exponential backoff.
+        """
+        backoff = REPLICATION_RETRY_BASE
         while True:
+            with self._replication_ready:
+                while not self.replication_queue:
+                    self._replication_ready.wait()
+                self._replication_queued = False
+                # Chunks missing the most replicas are the most at risk; copy them first
+                pending_replications = sorted(self.replication_queue, key=self.replication_queue.__getitem__,
+                                              reverse=True)
+            # Settled chunks leave the queue in one batch under the lock after
+            # the pass, rather than the queue being mutated unlocked mid-pass
+            settled = []
             try:
-                with self.replication_queue_lock:
-                    pending_replications = list(self.replication_queue)
-                
                 for file_path, chunk_id in pending_replications:
                     try:
                         metadata = self.file_manager.get_file_metadata(file_path)
                         if not metadata or chunk_id not in metadata.pending_replication:
-                            self.replication_queue.discard((file_path, chunk_id))
+                            settled.append((file_path, chunk_id))
                             continue
                             
                         current_replicas = len(metadata.chunk_locations.get(chunk_id, []))
                         needed_replicas = metadata.pending_replication[chunk_id]
                         
-                        if current_replicas >= self.config['master']['replication_factor']:
+                        if current_replicas >= self.replication_factor:
                             # Replication factor met
-                            metadata.pending_replication.pop(chunk_id, None)
-                            self.replication_queue.discard((file_path, chunk_id))
+                            self.file_manager.settle_replication(file_path, chunk_id)
+                            settled.append((file_path, chunk_id))
                             continue
                             
                         # Get current locations
                         current_locations = set(metadata.chunk_locations.get(chunk_id, []))
                         
-                        # Get available chunk servers
-                        with self.chunk_server_lock:
-                            available_servers = set(self.chunk_servers.keys()) - current_locations
-                            
-                        if not available_servers:
-                            continue  # No new servers available
-                            
                         # Try to replicate to new servers
                         self._replicate_to_new_servers(
                             file_path,
                             chunk_id,
                             current_locations,
-                            available_servers,
                             needed_replicas
                         )
                             
@@ -586,12 +1143,21 @@ class MasterServer:
                         
             except Exception as e:
                 self.logger.error(f"Error in replication thread: {e}")
-                
-            time.sleep(10)  # Wait before next replication attempt
+
+            with self._replication_ready:
+                for entry in settled:
+                    self.replication_queue.pop(entry, None)
+                if self._replication_queued:
+                    backoff = REPLICATION_RETRY_BASE
+                elif self.replication_queue:
+                    # Wakes early if new work is queued meanwhile
+                    self._replication_ready.wait(backoff * random.uniform(0.5, 1.5))
+                    backoff = min(REPLICATION_RETRY_CAP, backoff * 2)
+                else:
+                    backoff = REPLICATION_RETRY_BASE
 
     def _replicate_to_new_servers(self, file_path: str, chunk_id: str, 
                                 current_locations: Set[str], 
-                                available_servers: Set[str],
                                 needed_replicas: int):
         """Attempt to replicate a chunk to new servers."""
         # Select a source server
@@ -599,57 +1165,42 @@ class MasterServer:
             self.logger.error(f"No source locations for chunk {chunk_id}")
             return
             
-        source_server = random.choice(list(current_locations))
+        source_server = random.choice(tuple(current_locations))
         
-        # Select target servers
-        target_servers = random.sample(
-            list(available_servers),
-            min(needed_replicas, len(available_servers))
-        )
+        # Select target servers among live ones not holding the chunk yet
+        target_servers = sample_excluding(self._server_roster, needed_replicas, current_locations)
+        if not target_servers:
+            return  # No new servers available
+        
+        # Each target pulls the chunk from the source itself; only this small
+        # control message passes through the master. Targets copy in parallel,
+        # so a chunk short of several replicas takes one transfer, not several
+        command = encode_message({
+            'command': 'replicate_from',
+            'chunk_id': chunk_id,
+            'file_path': file_path,
+            'source': source_server
+        })
+        replies = [
+            (target_server, self._replication_executor.submit(self._pool.rpc, target_server, command))
+            for target_server in target_servers
+        ]
         
-        for target_server in target_servers:
+        locations = set(current_locations)
+        for target_server, reply in replies:
             try:
-                # Connect to source server
-                host, port = source_server.split(':')
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as source_sock:
-                    source_sock.connect((host, int(port)))
-                    
-                    # Request chunk data
-                    send_message(source_sock, {
-                        'command': 'retrieve_chunk',
-                        'chunk_id': chunk_id
-                    })
-                    
-                    response = receive_message(source_sock)
-                    if response['status'] != 'ok':
-                        continue
-                        
-                    chunk_data = response['data']
-                    
-                    # Send to target server
-                    host, port = target_server.split(':')
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as target_sock:
-                        target_sock.connect((host, int(port)))
-                        
-                        send_message(target_sock, {
-                            'command': 'store_chunk',
-                            'chunk_id': chunk_id,
-                            'file_path': file_path,
-                            'data': chunk_data,
-                            'replica_servers': True
-                        })
-                        
-                        response = receive_message(target_sock)
-                        if response['status'] == 'ok':
-                            # Update locations
-                            self.file_manager.update_chunk_locations(
-                                file_path,
-                                chunk_id,
-                                list(current_locations | {target_server})
-                            )
+                response = reply.result()
+                if response and response['status'] == 'ok':
+                    locations.add(target_server)
+                else:
+                    reason = response.get('message') if response else 'connection closed'
+                    self.logger.error(f"Failed to replicate to {target_server}: {reason}")
                             
             except Exception as e:
                 self.logger.error(f"Failed to replicate to {target_server}: {e}")
+        
+        if len(locations) > len(current_locations):
+            self.file_manager.update_chunk_locations(file_path, chunk_id, list(locations))
 
     def _handle_update_file_metadata(self, client_socket: socket.socket, message: Dict):
         """Handle updating file metadata after successful chunk storage."""
@@ -660,47 +1211,25 @@ class MasterServer:
             chunk_size = message.get('chunk_size', 0)
             pending_replication = message.get('pending_replication', False)
 
-            self.logger.debug(f"Updating metadata for file {file_path}, chunk {chunk_id}")
-
-            # Get existing metadata or create new
-            metadata = self.file_manager.get_file_metadata(file_path)
-            if metadata:
-                # Update existing file metadata
-                if chunk_id not in metadata.chunk_ids:
-                    metadata.chunk_ids.append(chunk_id)
-                metadata.chunk_locations[chunk_id] = chunk_locations
-                metadata.total_size += chunk_size
-                metadata.last_chunk_id = chunk_id
-                metadata.last_chunk_offset = chunk_size
-                
-                # Handle pending replication
-                if pending_replication:
-                    needed_replicas = self.config['master']['replication_factor'] - len(chunk_locations)
-                    if needed_replicas > 0:
-                        metadata.pending_replication[chunk_id] = needed_replicas
-                        with self.replication_queue_lock:
-                            self.replication_queue.add((file_path, chunk_id))
-            else:
-                # Create new file metadata
-                self.file_manager.add_file(
-                    file_path=file_path,
-                    total_size=chunk_size,
-                    chunk_ids=[chunk_id]
-                )
-                # Update chunk locations
-                self.file_manager.update_chunk_locations(file_path, chunk_id, chunk_locations)
-                
-                # Handle pending replication for new file
-                if pending_replication:
-                    needed_replicas = self.config['master']['replication_factor'] - len(chunk_locations)
-                    if needed_replicas > 0:
-                        metadata = self.file_manager.get_file_metadata(file_path)
-                        metadata.pending_replication[chunk_id] = needed_replicas
-                        with self.replication_queue_lock:
-                            self.replication_queue.add((file_path, chunk_id))
+            self.logger.debug("Updating metadata for file %s, chunk %s", file_path, chunk_id)
+
+            needed_replicas = self.replication_factor - len(chunk_locations) if pending_replication else 0
 
-            self.logger.info(f"Successfully updated metadata for {file_path}")
-            send_message(client_socket, {'status': 'ok'})
+            # Place the chunk at its index (parallel uploads report chunks out of
+            # order) and note any missing replicas, all in one metadata update
+            self.file_manager.record_chunk(
+                file_path, chunk_id, message.get('chunk_index'), chunk_locations, chunk_size,
+                needed_replicas
+            )
+
+            if needed_replicas > 0:
+                with self._replication_ready:
+                    self.replication_queue[(file_path, chunk_id)] = needed_replicas
+                    self._replication_queued = True
+                    self._replication_ready.notify()
+
+            self.logger.info("Successfully updated metadata for %s", file_path)
+            send_raw(client_socket, OK_FRAME)
 
         except Exception as e:
             self.logger.error(f"Failed to update file metadata: {e}")
@@ -713,19 +1242,19 @@ class MasterServer:
         """Handle request for graph visualization data."""
         try:
             client_id = message.get('client_id')
-            graph_data = self.location_graph.get_graph_data()
+            # The graph is encoded once per change and shared by every poller
+            graph_json = self.location_graph.get_graph_json()
             
-            # Add client-specific priority information
+            # Add client-specific priority information, spliced into the
+            # shared graph object as its last key
             if client_id:
-                # Get priorities from MasterServer's client_priorities
-                graph_data['client_priorities'] = {
+                priorities = orjson.dumps({
                     client_id: self.client_priorities.get_priority_servers(client_id)
-                }
+                })
+                graph_json = b'%s,"client_priorities":%s}' % (graph_json[:-1], priorities)
             
-            send_message(client_socket, {
-                'status': 'ok',
-                'graph_data': graph_data
-            })
+            send_raw(client_socket, frame_encoded_header(
+                b'{"status":"ok","graph_data":%s}' % graph_json, compress_over=self._compress_over))
         except Exception as e:
             self.logger.error(f"Failed to get graph data: {e}")
             send_message(client_socket, {
@@ -734,25 +1263,28 @@ class MasterServer:
             })
 
     def run(self):
-        """Run the master server."""
+        """Run the master server.
+
+        Each listener has a reactor watching the idle connections accepted on
+        it; the first runs on this thread, any others on their own.
+        """
         self.logger.info(f"Master server running on {self.host}:{self.port}")
+        reactors = [Reactor(self, listener) for listener in self.listeners]
+        for reactor in reactors[1:]:
+            threading.Thread(target=reactor.run, name='gfs-reactor', daemon=True).start()
         try:
-            while True:
-                client_socket, address = self.server_socket.accept()
-                self.logger.info(f"Accepted connection from {address}")
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
-                self.logger.debug(f"Started client handler thread for {address}")
+            reactors[0].run()
         except KeyboardInterrupt:
             self.logger.info("Shutting down master server...")
-            self.server_socket.close()
         except Exception as e:
             self.logger.error(f"Unexpected error in master server: {e}", exc_info=True)
-            self.server_socket.close()
+        finally:
+            for reactor in reactors:
+                reactor.close()
+            self._pool.close()
+            self.executor.shutdown(wait=False)
+            self._replication_executor.shutdown(wait=False)
+            self.file_manager.close()
 
 if __name__ == "__main__":
     master = MasterServer("configs/config.toml")
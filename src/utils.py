@@ -1,19 +1,54 @@
+import functools
 import hashlib
+import itertools
+import logging
+import os
+import queue
 import socket
 import random
+import select
 import struct
-import pickle
-from typing import Any, Dict, List, Tuple
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+import crc32c
+import orjson
 from .logger import GFSLogger
 
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None  # Configs are parsed with the toml package instead
+
 logger = GFSLogger.get_logger('utils')
 
+_sha256 = hashlib.sha256
+
 def get_chunk_hash(data: bytes) -> str:
     """Generate a unique hash for chunk data."""
-    logger.debug(f"Generating hash for chunk of size {len(data)} bytes")
-    hash_value = hashlib.sha256(data).hexdigest()
-    logger.debug(f"Generated hash: {hash_value}")
-    return hash_value
+    # Called for every chunk written, so no per-call logging; hashlib drops
+    # the GIL while it hashes a large buffer
+    return _sha256(data).hexdigest()
+
+# Transaction IDs are a per-process random prefix plus a counter, unique
+# across bursts and processes without reading the clock
+_TRANSACTION_PREFIX = uuid.uuid4().hex[:8]
+_transaction_counter = itertools.count(1)
+
+def new_transaction_id() -> str:
+    """Return a transaction ID unique to this process and across processes."""
+    return f"{_TRANSACTION_PREFIX}-{next(_transaction_counter)}"
+
+def payload_crc32c(data) -> int:
+    """CRC32C of a chunk payload, computed with the CPU's CRC32 instruction where available."""
+    return crc32c.crc32c(data)
+
+def payload_intact(message: Dict) -> bool:
+    """Check a message's 'data' against the 'crc32c' its sender attached, if any."""
+    expected = message.get('crc32c')
+    return expected is None or payload_crc32c(message['data']) == expected
 
 def find_free_port() -> int:
     """Find a free port to use for a new chunk server."""
@@ -25,41 +60,533 @@ def find_free_port() -> int:
     logger.debug(f"Found free port: {port}")
     return port
 
+def sample_excluding(population: Sequence, k: int, exclude: Collection = ()) -> List[Any]:
+    """Pick up to k random items of a sequence that are not in exclude, without copying the sequence."""
+    # random.sample draws indices rather than copying a sequence much larger
+    # than k; draw enough extra to make up for any excluded ones
+    picked = random.sample(population, min(len(population), k + len(exclude)))
+    return [item for item in picked if item not in exclude][:k]
+
+def load_config(config_path: str) -> Dict:
+    """Parse a TOML config file, with the standard library's tomllib where available."""
+    if tomllib is None:
+        import toml
+        return toml.load(config_path)
+    with open(config_path, 'rb') as f:
+        return tomllib.load(f)
+
+# Kernel send/receive buffer for data-plane sockets, sized for chunk bursts
+SOCKET_BUFFER_SIZE = 4 << 20
+# Kernel send/receive buffer for master connections, which only carry control
+# messages; still room for a large listing or graph reply in one window
+CONTROL_SOCKET_BUFFER_SIZE = 1 << 20
+# Seconds a pooled socket waits on a silent peer before an RPC fails, so one
+# hung server can't block its caller forever
+RPC_TIMEOUT = 30.0
+
+def tune_socket(sock: socket.socket, sndbuf: int = SOCKET_BUFFER_SIZE, rcvbuf: int = SOCKET_BUFFER_SIZE):
+    """Disable Nagle and enlarge the kernel buffers of a TCP socket.
+
+    Call before connect() or listen() so the larger receive window is
+    negotiated; accepted sockets inherit the listener's settings.
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+def socket_buffer_sizes(section: Dict, default: int = SOCKET_BUFFER_SIZE) -> Tuple[int, int]:
+    """Read (sndbuf, rcvbuf) in bytes from a config section's sndbuf_mb/rcvbuf_mb keys."""
+    default_mb = default / (1 << 20)
+    return (int(section.get('sndbuf_mb', default_mb) * (1 << 20)),
+            int(section.get('rcvbuf_mb', default_mb) * (1 << 20)))
+
+@functools.lru_cache(maxsize=4096)
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split a "host:port" string into (host, port); memoised, as the same few servers are dialled over and over."""
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def connect_tuned(address, sndbuf: int = SOCKET_BUFFER_SIZE, rcvbuf: int = SOCKET_BUFFER_SIZE) -> socket.socket:
+    """Open a tuned TCP connection to a (host, port) tuple or "host:port" string."""
+    if isinstance(address, str):
+        address = parse_address(address)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        tune_socket(sock, sndbuf, rcvbuf)
+        sock.connect(address)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+# Frame header: encoded-header length, raw payload length
+_FRAME_HEADER = struct.Struct('!II')
+_FRAME_HEADER_SIZE = _FRAME_HEADER.size
+# Payload length marking a message that carries no 'data' payload at all
+_NO_PAYLOAD = 0xFFFFFFFF
+
+def _json_default(obj: Any) -> Any:
+    """Encode the containers orjson has no native form for: sets go as arrays."""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError
+
+def _encode_header(header: Any) -> bytes:
+    """Encode a frame's header; the payload never goes through the codec.
+
+    Headers are plain data (str-keyed dicts, lists, strings, numbers)
+    encoded with orjson; tuples and sets arrive as lists and dataclasses
+    as dicts. Anything JSON can't carry, such as bytes or non-string keys,
+    raises TypeError: bulk bytes belong in the payload.
+    """
+    return orjson.dumps(header, default=_json_default)
+
+# First byte of a zlib stream (deflate, 32 KiB window), which marks a
+# compressed header; JSON headers are objects and start with '{'
+_ZLIB_MAGIC = b'\x78'
+
+def _decode_header(buf) -> Any:
+    """Decode a frame's header, decompressing it first if it was compressed.
+
+    Only JSON is ever parsed, so nothing a peer sends can make the receiver
+    build arbitrary objects or run code.
+    """
+    if buf[:1] == _ZLIB_MAGIC:
+        buf = zlib.decompress(buf)
+    return orjson.loads(buf)
+
+# Most buffers one sendmsg call may gather; the kernel rejects more
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+def _sendmsg_all(sock: socket.socket, buffers: List[Any]):
+    """Gather-write all buffers with sendmsg, resuming after partial sends.
+
+    A frame of more than IOV_MAX buffers (a large chunk batch) goes out
+    IOV_MAX at a time. Without sendmsg (Windows) each buffer is sent in
+    turn, still without joining them.
+    """
+    views = [memoryview(buf).cast('B') for buf in buffers if len(buf)]
+    if not hasattr(sock, 'sendmsg'):
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        sent = sock.sendmsg(views[:_IOV_MAX])
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+# Frame headers are received into a per-thread buffer reused across messages;
+# one grown past the keep limit by a rare huge header is not held on to
+_HEADER_BUFFER_SIZE = 64 << 10
+_HEADER_BUFFER_KEEP = 1 << 20
+_header_buffers = threading.local()
+
+def _header_buffer(length: int) -> bytearray:
+    """Return this thread's header receive buffer, at least length bytes long."""
+    buf = getattr(_header_buffers, 'buf', None)
+    if buf is None:
+        buf = _header_buffers.buf = bytearray(_HEADER_BUFFER_SIZE)
+    if len(buf) < length:
+        buf = bytearray(length)
+        if length <= _HEADER_BUFFER_KEEP:
+            _header_buffers.buf = buf
+    return buf
+
+# On a blocking socket the kernel then fills the whole request in one call;
+# sockets with a timeout are non-blocking underneath and return what's there,
+# so the loop in _recv_into_exact still finishes short reads
+_RECV_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
+
+def _recv_into_exact(sock: socket.socket, length: int, buf: bytearray = None):
+    """Receive exactly length bytes into a single buffer, preallocated unless given."""
+    if buf is None:
+        buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
+        n = sock.recv_into(view[received:], length - received, _RECV_WAITALL)
+        if not n:
+            return None
+        received += n
+    return buf
+
+def encode_frame(header: Dict, payload: Any = None, compress_over: Optional[int] = None) -> List[Any]:
+    """Encode a header dict plus an optional raw payload into a frame's buffers.
+
+    The frame is the two lengths, the encoded header, then the payload bytes
+    untouched. A list of buffers is gathered into one payload without joining
+    them. The receiver gets the payload back under the header's 'data' key.
+    An encoded header longer than compress_over bytes is zlib-compressed
+    (level 1); receivers recognise it either way.
+    """
+    return frame_encoded_header(_encode_header(header), payload, compress_over)
+
+def frame_encoded_header(data: bytes, payload: Any = None, compress_over: Optional[int] = None) -> List[Any]:
+    """Like encode_frame, for a header already encoded as JSON bytes."""
+    if compress_over is not None and len(data) > compress_over:
+        data = zlib.compress(data, 1)
+    segments = [] if payload is None else payload if isinstance(payload, list) else [payload]
+    payload_length = _NO_PAYLOAD if payload is None else sum(len(segment) for segment in segments)
+    return [_FRAME_HEADER.pack(len(data), payload_length), data] + segments
+
+def encode_message(message: Any, compress_over: Optional[int] = None) -> List[Any]:
+    """Encode a message into frame buffers, splitting bulk 'data' bytes off as the raw payload.
+
+    The result can be sent any number of times with send_raw, so a request
+    fanned out to several servers is only encoded once. compress_over is as
+    for encode_frame.
+    """
+    payload = None
+    if isinstance(message, dict) and isinstance(message.get('data'), (bytes, bytearray, memoryview)):
+        message = dict(message)
+        payload = message.pop('data')
+    return encode_frame(message, payload, compress_over)
+
+# The bare acknowledgement is the most common reply, so it is encoded once
+OK_FRAME = encode_message({'status': 'ok'})
+
+def send_raw(sock: socket.socket, frame: List[Any]):
+    """Send an already encoded frame with a single sendmsg call."""
+    _sendmsg_all(sock, frame)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Sent {len(frame[1])} header bytes and {sum(len(buf) for buf in frame[2:])} payload bytes")
+
+def send_batch(sock: socket.socket, frames: List[List[Any]]):
+    """Pipeline several encoded frames in one sendmsg call; the peer replies to each in order."""
+    _sendmsg_all(sock, [buf for frame in frames for buf in frame])
+
+def send_framed(sock: socket.socket, header: Dict, payload: Any = None):
+    """Send a header dict plus an optional raw payload as one length-prefixed frame."""
+    send_raw(sock, encode_frame(header, payload))
+
 def send_message(sock: socket.socket, message: Any):
-    """Send a pickled message over a socket with length prefix."""
-    logger.debug(f"Sending message to {sock.getpeername()}")
-    data = pickle.dumps(message)
-    length = struct.pack('!I', len(data))
-    sock.sendall(length + data)
-    logger.debug(f"Sent {len(data)} bytes of data")
-
-def receive_message(sock: socket.socket) -> Any:
-    """Receive a pickled message from a socket with length prefix."""
+    """Send a message over a socket with length prefix.
+
+    Bulk bytes under a message's 'data' key are split off and sent as the
+    frame's raw payload rather than being encoded along with the header.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Sending message to {sock.getpeername()}")
+    send_raw(sock, encode_message(message))
+
+def send_file_message(sock: socket.socket, message: Any, path: str, offset: int = 0, count: int = None):
+    """Send a message whose 'data' payload is streamed from a file.
+
+    The payload goes out through socket.sendfile, so the kernel copies it
+    straight from the page cache; the receiver sees an ordinary message.
+    """
+    if count is None:
+        count = os.path.getsize(path) - offset
+    send_file_ranges(sock, message, path, [(offset, count)])
+
+def send_file_ranges(sock: socket.socket, message: Any, path: str, ranges: List[Tuple[int, int]]):
+    """Send a message whose 'data' payload is several (offset, count) ranges of a file, back to back."""
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug(f"Sending file-backed message to {sock.getpeername()} from {path}")
+    total = sum(count for _, count in ranges)
+    with open(path, 'rb') as f:
+        data = _encode_header(message)
+        # Cork so the header and the payload ranges leave in full segments
+        cork = getattr(socket, 'TCP_CORK', None)
+        if cork is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, cork, 1)
+        try:
+            _sendmsg_all(sock, [_FRAME_HEADER.pack(len(data), total), data])
+            for offset, count in ranges:
+                sent = sock.sendfile(f, offset, count) if count else 0
+                if sent != count:
+                    raise ConnectionError(f"Short sendfile from {path}: sent {sent} of {count} bytes")
+        finally:
+            if cork is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, cork, 0)
+    if debug:
+        logger.debug(f"Sent {len(data)} header bytes and {total} payload bytes")
+
+def decode_frame(buf: bytearray) -> Tuple[Any, int]:
+    """Decode the first frame in buf, returning (message, frame length), or (None, 0) if it hasn't all arrived.
+
+    For readers that gather bytes off a non-blocking socket themselves;
+    the payload comes back as a copy under 'data', as with receive_message.
+    """
+    if len(buf) < _FRAME_HEADER_SIZE:
+        return None, 0
+    length, payload_length = _FRAME_HEADER.unpack_from(buf)
+    end = _FRAME_HEADER_SIZE + length
+    total = end if payload_length == _NO_PAYLOAD else end + payload_length
+    if len(buf) < total:
+        return None, 0
+    message = _decode_header(buf[_FRAME_HEADER_SIZE:end])
+    if payload_length != _NO_PAYLOAD:
+        message['data'] = buf[end:total]
+    return message, total
+
+def receive_message(sock: socket.socket, buffers: 'BufferPool' = None, receiver: Any = None,
+                    raise_errors: bool = False) -> Any:
+    """Receive a framed message from a socket with length prefix.
+
+    With a BufferPool, a payload that fits lands in a pooled buffer and
+    'data' is a memoryview onto it; hand it back with buffers.release().
+    A receiver (see io_uring_backend.UringReceiver) takes over landing the
+    payload, receiving it with one recv_exact call.
+
+    Any failure returns None, unless raise_errors is set: then only a clean
+    close before the message returns None, and a timeout, a close partway
+    through or a bad frame raises.
+    """
     try:
-        peer = sock.getpeername()
-        logger.debug(f"Receiving message from {peer}")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"Receiving message from {sock.getpeername()}")
         
-        length_data = sock.recv(4)
-        if not length_data:
-            logger.warning("Received empty length data")
+        # The lengths and then the header land in this thread's reusable
+        # buffer, and the header is decoded straight from it
+        buf = _header_buffer(_FRAME_HEADER_SIZE)
+        if _recv_into_exact(sock, _FRAME_HEADER_SIZE, buf) is None:
+            # Usually the peer closing between messages; callers log that
+            logger.debug("Received empty length data")
             return None
         
-        length = struct.unpack('!I', length_data)[0]
-        logger.debug(f"Expecting message of length {length} bytes")
+        length, payload_length = _FRAME_HEADER.unpack_from(buf)
+        if debug:
+            logger.debug(f"Expecting message of length {length} bytes")
         
-        chunks = []
-        bytes_received = 0
+        buf = _header_buffer(length)
+        if _recv_into_exact(sock, length, buf) is None:
+            if raise_errors:
+                raise ConnectionError("Connection closed before receiving complete message")
+            logger.warning("Connection closed before receiving complete message")
+            return None
         
-        while bytes_received < length:
-            chunk = sock.recv(min(length - bytes_received, 4096))
-            if not chunk:
-                logger.warning("Connection closed before receiving complete message")
+        if debug:
+            logger.debug(f"Received complete message ({length} bytes)")
+        message = _decode_header(memoryview(buf)[:length])
+
+        if payload_length != _NO_PAYLOAD:
+            # Land the raw payload directly in one buffer, no join copies
+            buf = buffers.acquire(payload_length) if buffers is not None else None
+            if receiver is not None:
+                payload = receiver.recv_exact(sock, payload_length, buf)
+            else:
+                payload = _recv_into_exact(sock, payload_length, buf)
+            if buf is not None and payload is not buf:
+                buffers.release(memoryview(buf))
+                buf = None
+            if payload is None:
+                if raise_errors:
+                    raise ConnectionError("Connection closed before receiving complete payload")
+                logger.warning("Connection closed before receiving complete payload")
                 return None
-            chunks.append(chunk)
-            bytes_received += len(chunk)
-        
-        logger.debug(f"Received complete message ({bytes_received} bytes)")
-        return pickle.loads(b''.join(chunks))
+            message['data'] = payload if buf is None else memoryview(buf)[:payload_length]
+        return message
+    except socket.timeout:
+        if raise_errors:
+            raise
+        logger.debug("Timed out waiting for a message")
+        return None
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Error receiving message: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        return None
+
+
+class BufferPool:
+    """Reusable payload buffers, so bulk receives don't allocate a fresh chunk-sized buffer each time."""
+
+    def __init__(self, buffer_size: int, max_buffers: int = 16):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, length: int):
+        """Return a pooled buffer for a chunk-sized payload, or None for anything much smaller or larger."""
+        if not self.buffer_size // 2 <= length <= self.buffer_size:
+            return None
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, data):
+        """Return the buffer behind a payload memoryview to the pool; anything else is ignored."""
+        if not isinstance(data, memoryview):
+            return
+        buf = data.obj
+        data.release()
+        if not isinstance(buf, bytearray) or len(buf) != self.buffer_size:
+            return
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(buf)
+
+
+class RearmQueue:
+    """Connections worker threads hand back to a reactor thread to watch again.
+
+    Selectors and rings aren't safe to mutate from other threads, so workers
+    queue connections here and the reactor, watching the wakeup socket,
+    collects them. Only the first hand-back since the last drain sends a
+    wakeup byte; a burst of finished requests costs one send and one recv,
+    not one each.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._wakeup_pending = False
+        self.wakeup, self._wakeup_w = socket.socketpair()
+        self.wakeup.setblocking(False)
+
+    def put(self, client_socket: socket.socket, address: Any):
+        """Hand a connection back; called from workers."""
+        self._queue.put((client_socket, address))
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            self._wakeup_w.send(b'\0')
+
+    def drain(self) -> List[Tuple[socket.socket, Any]]:
+        """Clear the wakeup socket and return the connections handed back; called from the reactor."""
+        try:
+            self.wakeup.recv(4096)
+        except BlockingIOError:
+            pass
+        # Cleared after the byte is consumed but before the queue is read, so
+        # a connection handed back from here on sends a wakeup that stays
+        # pending rather than being swallowed
+        self._wakeup_pending = False
+        rearmed = []
+        while not self._queue.empty():
+            rearmed.append(self._queue.get())
+        return rearmed
+
+    def close(self):
+        self.wakeup.close()
+        self._wakeup_w.close()
+
+
+def _idle_socket_usable(sock: socket.socket) -> bool:
+    """Whether an idle pooled socket can carry a request.
+
+    Nothing is owed on an idle socket, so if it is readable the peer closed
+    it (or broke protocol) while it sat in the pool.
+    """
+    try:
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            return not poller.poll(0)
+        return not select.select([sock], [], [], 0)[0]
+    except (OSError, ValueError):
+        return False
+
+
+class ConnectionPool:
+    """Idle sockets kept per server address so repeated RPCs skip the TCP handshake.
+
+    Addresses are either (host, port) tuples or "host:port" strings. Every
+    message sent over a pooled socket must get exactly one reply, otherwise
+    the next caller would read a stale response.
+    """
+
+    def __init__(self, max_idle_per_address: int = 8, sndbuf: int = SOCKET_BUFFER_SIZE,
+                 rcvbuf: int = SOCKET_BUFFER_SIZE, receiver: Any = None,
+                 timeout: Optional[float] = RPC_TIMEOUT):
+        self.max_idle_per_address = max_idle_per_address
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.timeout = timeout
+        # Optional payload receiver handed to receive_message for every reply
+        self.receiver = receiver
+        self._idle: Dict[Any, List[socket.socket]] = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, address) -> Tuple[socket.socket, bool]:
+        """Return an idle socket for address (and True) or a fresh one (and False)."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(address)
+                sock = idle.pop() if idle else None
+            if sock is None:
+                break
+            if _idle_socket_usable(sock):
+                return sock, True
+            sock.close()
+        sock = connect_tuned(address, self.sndbuf, self.rcvbuf)
+        sock.settimeout(self.timeout)
+        # Pooled sockets sit idle between RPCs; let the kernel notice dead peers
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return sock, False
+
+    def _checkin(self, address, sock: socket.socket):
+        with self._lock:
+            idle = self._idle.setdefault(address, [])
+            if len(idle) < self.max_idle_per_address:
+                idle.append(sock)
+                return
+        sock.close()
+
+    @contextmanager
+    def connection(self, address):
+        """Borrow a socket; it goes back to the pool unless the block raises."""
+        sock, _ = self._checkout(address)
+        try:
+            yield sock
+        except BaseException:
+            sock.close()
+            raise
+        self._checkin(address, sock)
+
+    def rpc(self, address, message: Any, buffers: 'BufferPool' = None) -> Any:
+        """Send a request and return its reply, reconnecting if a pooled socket turns out dead on send.
+
+        The request is a message dict or a frame already built by encode_message.
+        It is only ever resent when sending it failed, as a request that went
+        out may have been carried out even if no reply comes back.
+        """
+        frame = message if isinstance(message, list) else encode_message(message)
+        while True:
+            sock, reused = self._checkout(address)
+            try:
+                send_raw(sock, frame)
+            except (BrokenPipeError, ConnectionResetError):
+                sock.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                sock.close()
+                raise
+            try:
+                response = receive_message(sock, buffers, self.receiver, raise_errors=True)
+            except BaseException:
+                sock.close()
+                raise
+            if response is None:
+                sock.close()
+                raise ConnectionError(f"Connection to {address} closed without a reply")
+            self._checkin(address, sock)
+            return response
+
+    def discard(self, address):
+        """Close the idle sockets to one address, e.g. a server that went away."""
+        with self._lock:
+            idle = self._idle.pop(address, [])
+        for sock in idle:
+            sock.close()
+
+    def close(self):
+        """Close every idle socket."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for socks in idle.values():
+            for sock in socks:
+                sock.close()